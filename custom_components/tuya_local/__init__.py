@@ -14,36 +14,96 @@ from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_registry import async_migrate_entries
 
 from .const import (
+    CONF_CID,
     CONF_DEVICE_ID,
+    CONF_DIAGNOSTICS,
     CONF_LIGHT,
     CONF_LOCAL_KEY,
     CONF_LOCK,
     CONF_TYPE,
     DOMAIN,
 )
-from .device import setup_device, delete_device
-from .helpers.device_config import get_config
+from .device import (
+    async_detect_types,
+    async_load_protocol_versions,
+    delete_device,
+    setup_device,
+)
+from .discovery import async_start_discovery, stop_discovery
+from .gateway import setup_sub_device
+from .helpers.device_config import async_load_config_index, get_config
 
 _LOGGER = logging.getLogger(__name__)
 
+CONF_TYPE_AUTO = "auto"
+# hass.data key for detection results shared between entry migrations
+DATA_DETECTION = f"{DOMAIN}_detection"
+
+
+def _needs_detection(entry: ConfigEntry):
+    """Return True if migrating entry will require its type to be detected."""
+    if entry.version > 3:
+        return False
+    config = {**entry.data, **entry.options}
+    conf_type = config.get(CONF_TYPE, CONF_TYPE_AUTO)
+    if conf_type == CONF_TYPE_AUTO:
+        return True
+    cfg = get_config(conf_type)
+    return cfg is not None and cfg.config_type == "smartplugv1"
+
+
+async def _async_detect_type(hass: HomeAssistant, config: dict):
+    """
+    Detect the type of a device while migrating its config entry.
+
+    Entries are migrated one at a time, so to avoid polling each device in
+    turn, the first detection also detects every other entry that will
+    need it, concurrently.  Later migrations pick up their results.
+    """
+    pending = hass.data.setdefault(DATA_DETECTION, {})
+    dev_id = config[CONF_DEVICE_ID]
+    task = pending.get(dev_id)
+    if task is None:
+        devices = {dev_id: config}
+        for entry in hass.config_entries.async_entries(DOMAIN):
+            if _needs_detection(entry):
+                cfg = {**entry.data, **entry.options}
+                devices.setdefault(cfg[CONF_DEVICE_ID], cfg)
+        task = hass.async_create_task(
+            async_detect_types(
+                hass,
+                [
+                    (id, cfg[CONF_HOST], cfg[CONF_LOCAL_KEY])
+                    for id, cfg in devices.items()
+                ],
+            )
+        )
+        for id in devices:
+            pending[id] = task
+
+    results = await task
+    pending.pop(dev_id, None)
+    result = results.get(dev_id)
+    return None if result is None else result["type"]
+
 
 async def async_migrate_entry(hass, entry: ConfigEntry):
     """Migrate to latest config format."""
 
-    CONF_TYPE_AUTO = "auto"
     CONF_DISPLAY_LIGHT = "display_light"
     CONF_CHILD_LOCK = "child_lock"
 
+    await async_load_config_index(hass)
+
     if entry.version == 1:
         # Removal of Auto detection.
         config = {**entry.data, **entry.options, "name": entry.title}
         opts = {**entry.options}
         if config[CONF_TYPE] == CONF_TYPE_AUTO:
-            device = setup_device(hass, config)
-            config[CONF_TYPE] = await device.async_inferred_type()
+            config[CONF_TYPE] = await _async_detect_type(hass, config)
             if config[CONF_TYPE] is None:
                 _LOGGER.error(
-                    f"Unable to determine type for device {config[CONF_DEVICE_ID]}."
+                    "Unable to determine type for device %s.", config[CONF_DEVICE_ID]
                 )
                 return False
 
@@ -70,11 +130,10 @@ async def async_migrate_entry(hass, entry: ConfigEntry):
         # suggest it was removed completely.  But that is probably due to
         # overwriting options without CONF_TYPE.
         if config.get(CONF_TYPE, CONF_TYPE_AUTO) == CONF_TYPE_AUTO:
-            device = setup_device(hass, config)
-            config[CONF_TYPE] = await device.async_inferred_type()
+            config[CONF_TYPE] = await _async_detect_type(hass, config)
             if config[CONF_TYPE] is None:
                 _LOGGER.error(
-                    f"Unable to determine type for device {config[CONF_DEVICE_ID]}."
+                    "Unable to determine type for device %s.", config[CONF_DEVICE_ID]
                 )
                 return False
         entry.data = {
@@ -95,8 +154,7 @@ async def async_migrate_entry(hass, entry: ConfigEntry):
 
         # Special case for kogan_switch.  Consider also v2.
         if config_type == "smartplugv1":
-            device = setup_device(hass, config)
-            config_type = await device.async_inferred_type()
+            config_type = await _async_detect_type(hass, config)
             if config_type != "smartplugv2":
                 config_type = "smartplugv1"
 
@@ -139,7 +197,7 @@ async def async_migrate_entry(hass, entry: ConfigEntry):
         old_id = entry.unique_id
         conf_file = get_config(entry.data[CONF_TYPE])
         if conf_file is None:
-            _LOGGER.error(f"Configuration file for {entry.data[CONF_TYPE]} not found.")
+            _LOGGER.error("Configuration file for %s not found.", entry.data[CONF_TYPE])
             return False
 
         @callback
@@ -154,7 +212,7 @@ async def async_migrate_entry(hass, entry: ConfigEntry):
                 new_id = e.unique_id(old_id)
                 if new_id != old_id:
                     _LOGGER.info(
-                        f"Migrating {e.entity} unique_id {old_id} to {new_id}."
+                        "Migrating %s unique_id %s to %s.", e.entity, old_id, new_id
                     )
                     return {
                         "new_unique_id": entity_entry.unique_id.replace(old_id, new_id)
@@ -191,12 +249,18 @@ async def async_migrate_entry(hass, entry: ConfigEntry):
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
-    _LOGGER.debug(f"Setting up entry for device: {entry.data[CONF_DEVICE_ID]}")
+    _LOGGER.debug("Setting up entry for device: %s", entry.data[CONF_DEVICE_ID])
     config = {**entry.data, **entry.options, "name": entry.title}
-    setup_device(hass, config)
+    await async_load_config_index(hass)
+    await async_load_protocol_versions(hass)
+    await async_start_discovery(hass)
+    if config.get(CONF_CID):
+        setup_sub_device(hass, config)
+    else:
+        setup_device(hass, config)
     device_conf = get_config(entry.data[CONF_TYPE])
     if device_conf is None:
-        _LOGGER.error(f"Configuration file for {config[CONF_TYPE]} not found.")
+        _LOGGER.error("Configuration file for %s not found.", config[CONF_TYPE])
         return False
 
     entities = {}
@@ -206,6 +270,8 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     for e in device_conf.secondary_entities():
         if config.get(e.config_id, False):
             entities[e.entity] = True
+    if config.get(CONF_DIAGNOSTICS, False):
+        entities["sensor"] = True
 
     for e in entities:
         hass.async_create_task(hass.config_entries.async_forward_entry_setup(entry, e))
@@ -216,12 +282,12 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
-    _LOGGER.debug(f"Unloading entry for device: {entry.data[CONF_DEVICE_ID]}")
+    _LOGGER.debug("Unloading entry for device: %s", entry.data[CONF_DEVICE_ID])
     config = entry.data
     data = hass.data[DOMAIN][config[CONF_DEVICE_ID]]
     device_conf = get_config(config[CONF_TYPE])
     if device_conf is None:
-        _LOGGER.error(f"Configuration file for {config[CONF_TYPE]} not found.")
+        _LOGGER.error("Configuration file for %s not found.", config[CONF_TYPE])
         return False
 
     entities = {}
@@ -231,17 +297,21 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     for e in device_conf.secondary_entities():
         if e.config_id in data:
             entities[e.entity] = True
+    if CONF_DIAGNOSTICS in data:
+        entities["sensor"] = True
 
     for e in entities:
         await hass.config_entries.async_forward_entry_unload(entry, e)
 
     delete_device(hass, config)
     del hass.data[DOMAIN][config[CONF_DEVICE_ID]]
+    if not hass.data[DOMAIN]:
+        stop_discovery(hass)
 
     return True
 
 
 async def async_update_entry(hass: HomeAssistant, entry: ConfigEntry):
-    _LOGGER.debug(f"Updating entry for device: {entry.data[CONF_DEVICE_ID]}")
+    _LOGGER.debug("Updating entry for device: %s", entry.data[CONF_DEVICE_ID])
     await async_unload_entry(hass, entry)
     await async_setup_entry(hass, entry)
@@ -0,0 +1,105 @@
+"""
+Circuit breaking for unreachable Tuya Local devices.
+"""
+
+import logging
+from random import uniform
+from time import monotonic
+
+from .const import BACKOFF_JITTER, MAX_UNREACHABLE_BACKOFF, MIN_UNREACHABLE_BACKOFF
+
+_LOGGER = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Stops requests being made to a device that is not responding.
+
+    While the breaker is closed, requests are made as normal.  When they
+    fail, the breaker opens, and requests are refused without contacting
+    the device until a backoff period has passed.  The breaker is then
+    half-open, and a single probe is allowed through to check whether the
+    device is reachable again.  If the probe succeeds the breaker closes,
+    otherwise it opens again and the backoff period is doubled, up to
+    max_backoff.  Each period is moved randomly by up to BACKOFF_JITTER,
+    so that devices that failed together are not all probed together.
+    """
+
+    def __init__(
+        self,
+        name,
+        min_backoff=MIN_UNREACHABLE_BACKOFF,
+        max_backoff=MAX_UNREACHABLE_BACKOFF,
+    ):
+        """
+        Args:
+            name (str): The device name, for logging.
+            min_backoff (timedelta): The first backoff period.
+            max_backoff (timedelta): The longest backoff period.
+        """
+        self._name = name
+        self._min = min_backoff.total_seconds()
+        self._max = max(max_backoff.total_seconds(), self._min)
+        self._state = CLOSED
+        self._backoff = 0
+        self._retry_at = 0
+
+    @property
+    def state(self):
+        """
+        Return the breaker state, one of CLOSED, OPEN or HALF_OPEN while
+        a probe is being made.
+        """
+        return self._state
+
+    @property
+    def closed(self):
+        """Return True if requests are being made to the device."""
+        return self._state == CLOSED
+
+    @property
+    def backoff(self):
+        """Return the current backoff period in seconds, 0 when closed."""
+        return self._backoff
+
+    def allow_probe(self):
+        """
+        Return True if the backoff period has passed and a probe should be
+        made.  Only one caller is allowed to probe until it is recorded as
+        a success or failure.
+        """
+        if self._state != OPEN or monotonic() < self._retry_at:
+            return False
+        self._state = HALF_OPEN
+        return True
+
+    def retry_now(self):
+        """End the backoff period early, such as when the device has moved."""
+        if self._state == OPEN:
+            self._retry_at = 0
+
+    def record_success(self):
+        """Close the breaker after the device has responded."""
+        if self._state != CLOSED:
+            _LOGGER.info("%s is reachable again", self._name)
+        self._state = CLOSED
+        self._backoff = 0
+        self._retry_at = 0
+
+    def record_failure(self):
+        """Open the breaker after the device has failed to respond."""
+        if self._state == CLOSED:
+            self._backoff = self._min
+            _LOGGER.warning(
+                "%s is unreachable, retrying in %.0fs", self._name, self._backoff
+            )
+        else:
+            self._backoff = min(self._backoff * 2, self._max)
+            _LOGGER.debug("%s: still unreachable", self._name)
+        self._state = OPEN
+        jitter = uniform(-BACKOFF_JITTER, BACKOFF_JITTER) * self._backoff
+        self._retry_at = monotonic() + self._backoff + jitter
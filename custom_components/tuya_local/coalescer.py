@@ -0,0 +1,107 @@
+"""
+Coalescing of commands sent to Tuya Local devices.
+"""
+
+import logging
+from time import monotonic
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import WRITE_WINDOW
+
+_LOGGER = logging.getLogger(__name__)
+
+# Delay before sending a command when no other command was sent recently,
+# so that commands made together in one event loop iteration are merged.
+_IDLE_DELAY = 0.001
+
+
+class WriteCoalescer:
+    """
+    Merges commands to a device made within a short window into one.
+
+    Each command adds its dps to a batch, and gets a future that resolves
+    once the batch has been sent.  When no command has been sent for a
+    while, the batch is sent almost immediately.  Otherwise it is sent one
+    window after the first command added to it, so that a burst of commands
+    results in one message to the device rather than one each.
+
+    Everything runs in the event loop, so no locking is needed.  The
+    number of commands that were merged into another is kept in coalesced.
+    """
+
+    def __init__(self, hass: HomeAssistant, name, send, window=WRITE_WINDOW):
+        """
+        Args:
+            name (str): The device name, for logging.
+            send (coroutine function): Sends a dict of dps to the device,
+                returning True once it has been acknowledged, or False if
+                it could not be sent.
+            window (timedelta): How long commands are collected for.
+        """
+        self._hass = hass
+        self._name = name
+        self._send = send
+        self._window = window.total_seconds()
+        self._batch = {}
+        self._futures = []
+        self._handle = None
+        self._last_sent = -self._window
+        self.coalesced = 0
+
+    @property
+    def pending(self):
+        """Return the dps waiting to be sent."""
+        return dict(self._batch)
+
+    @callback
+    def add(self, dps):
+        """
+        Add dps to the next command sent to the device.
+
+        Returns a future that resolves to True once the device has
+        acknowledged the command, or False if it could not be sent.
+        """
+        self._batch.update(dps)
+        future = self._hass.loop.create_future()
+        self._futures.append(future)
+        if self._handle is None:
+            since = monotonic() - self._last_sent
+            delay = self._window if since < self._window else _IDLE_DELAY
+            # Set now, so that commands following this one are batched.
+            self._last_sent = monotonic()
+            self._handle = self._hass.loop.call_later(delay, self._flush)
+        return future
+
+    @callback
+    def cancel(self):
+        """Drop any dps waiting to be sent."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        for future in self._futures:
+            future.cancel()
+        self._batch = {}
+        self._futures = []
+
+    @callback
+    def _flush(self):
+        self._handle = None
+        batch, futures = self._batch, self._futures
+        self._batch = {}
+        self._futures = []
+        self.coalesced += len(futures) - 1
+        self._hass.async_create_task(self._async_send(batch, futures))
+
+    async def _async_send(self, batch, futures):
+        _LOGGER.debug(
+            "%s: sending %d dps for %d commands", self._name, len(batch), len(futures)
+        )
+        result = False
+        try:
+            result = await self._send(batch)
+        finally:
+            self._last_sent = monotonic()
+            for future in futures:
+                if not future.done():
+                    future.set_result(result)
@@ -7,8 +7,17 @@ from homeassistant.core import HomeAssistant, callback
 
 from . import DOMAIN
 from .device import TuyaLocalDevice
-from .const import CONF_DEVICE_ID, CONF_LOCAL_KEY, CONF_TYPE
-from .helpers.device_config import get_config
+from .const import (
+    CONF_CID,
+    CONF_DEVICE_ID,
+    CONF_DIAGNOSTICS,
+    CONF_GATEWAY_ID,
+    CONF_LOCAL_KEY,
+    CONF_PERSIST,
+    CONF_TYPE,
+)
+from .gateway import TuyaLocalGateway, TuyaLocalSubDevice
+from .helpers.device_config import async_load_config_index, get_config
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -24,20 +33,29 @@ class ConfigFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
         devid_opts = {}
         host_opts = {}
         key_opts = {}
+        gateway_opts = {}
+        cid_opts = {}
 
         if user_input is not None:
             await self.async_set_unique_id(user_input[CONF_DEVICE_ID])
             self._abort_if_unique_id_configured()
 
-            self.device = await async_test_connection(user_input, self.hass)
-            if self.device:
-                self.data = user_input
-                return await self.async_step_select_type()
+            if user_input.get(CONF_CID) and not user_input.get(CONF_GATEWAY_ID):
+                errors[CONF_GATEWAY_ID] = "gateway_id"
             else:
+                self.device = await async_test_connection(user_input, self.hass)
+                if self.device:
+                    self.data = user_input
+                    return await self.async_step_select_type()
                 errors["base"] = "connection"
-                devid_opts["default"] = user_input[CONF_DEVICE_ID]
-                host_opts["default"] = user_input[CONF_HOST]
-                key_opts["default"] = user_input[CONF_LOCAL_KEY]
+
+            devid_opts["default"] = user_input[CONF_DEVICE_ID]
+            host_opts["default"] = user_input[CONF_HOST]
+            key_opts["default"] = user_input[CONF_LOCAL_KEY]
+            if CONF_GATEWAY_ID in user_input:
+                gateway_opts["default"] = user_input[CONF_GATEWAY_ID]
+            if CONF_CID in user_input:
+                cid_opts["default"] = user_input[CONF_CID]
 
         return self.async_show_form(
             step_id="user",
@@ -46,6 +64,8 @@ class ConfigFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
                     vol.Required(CONF_DEVICE_ID, **devid_opts): str,
                     vol.Required(CONF_HOST, **host_opts): str,
                     vol.Required(CONF_LOCAL_KEY, **key_opts): str,
+                    vol.Optional(CONF_GATEWAY_ID, **gateway_opts): str,
+                    vol.Optional(CONF_CID, **cid_opts): str,
                 }
             ),
             errors=errors,
@@ -56,20 +76,18 @@ class ConfigFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
             self.data[CONF_TYPE] = user_input[CONF_TYPE]
             return await self.async_step_choose_entities()
 
-        types = []
+        await async_load_config_index(self.hass)
+        ranked = await self.device.async_ranked_types()
+        types = [type.config_type for type, _ in ranked]
         best_match = 0
         best_matching_type = None
-
-        async for type in self.device.async_possible_types():
-            types.append(type.config_type)
-            q = type.match_quality(self.device._get_cached_state())
-            if q > best_match:
-                best_match = q
-                best_matching_type = type.config_type
+        if ranked and ranked[0][1] > 0:
+            best_matching_type = ranked[0][0].config_type
+            best_match = ranked[0][1]
 
         if best_match < 100:
             best_match = int(best_match)
-            dps = self.device._get_cached_state()
+            dps = dict(self.device._get_cached_state())
             _LOGGER.warning(
                 f"Device matches {best_matching_type} with quality of {best_match}%. DPS: {dps}"
             )
@@ -100,6 +118,8 @@ class ConfigFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
         schema[vol.Optional(e.config_id, default=True)] = bool
         for e in config.secondary_entities():
             schema[vol.Optional(e.config_id, default=not e.deprecated)] = bool
+        schema[vol.Optional(CONF_PERSIST, default=False)] = bool
+        schema[vol.Optional(CONF_DIAGNOSTICS, default=False)] = bool
 
         return self.async_show_form(
             step_id="choose_entities",
@@ -146,6 +166,12 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
             schema[
                 vol.Optional(e.config_id, default=config.get(e.config_id, False))
             ] = bool
+        schema[
+            vol.Optional(CONF_PERSIST, default=config.get(CONF_PERSIST, False))
+        ] = bool
+        schema[
+            vol.Optional(CONF_DIAGNOSTICS, default=config.get(CONF_DIAGNOSTICS, False))
+        ] = bool
         return self.async_show_form(
             step_id="user",
             data_schema=vol.Schema(schema),
@@ -154,8 +180,27 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
 
 
 async def async_test_connection(config: dict, hass: HomeAssistant):
-    device = TuyaLocalDevice(
-        "Test", config[CONF_DEVICE_ID], config[CONF_HOST], config[CONF_LOCAL_KEY], hass
-    )
+    if config.get(CONF_CID):
+        # Sub-devices are reached through their gateway, using its address
+        # and local key.
+        gateway = TuyaLocalGateway(
+            hass,
+            "Test gateway",
+            config[CONF_GATEWAY_ID],
+            config[CONF_HOST],
+            config[CONF_LOCAL_KEY],
+            persist=False,
+        )
+        device = TuyaLocalSubDevice(
+            "Test", config[CONF_DEVICE_ID], gateway, config[CONF_CID], hass
+        )
+    else:
+        device = TuyaLocalDevice(
+            "Test",
+            config[CONF_DEVICE_ID],
+            config[CONF_HOST],
+            config[CONF_LOCAL_KEY],
+            hass,
+        )
     await device.async_refresh()
     return device if device.has_returned_state else None
@@ -0,0 +1,338 @@
+"""
+Asyncio connection to Tuya Local devices.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from time import time
+
+from .protocol import (
+    CONTROL,
+    DP_QUERY,
+    END_SIZE,
+    HEADER_SIZE,
+    HEART_BEAT,
+    STATUS,
+    UPDATEDPS,
+    TuyaProtocolError,
+    parse_header,
+    unpack_message,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+TUYA_PORT = 6668
+HEARTBEAT_INTERVAL = 10
+RESPONSE_TIMEOUT = 5
+CONNECT_TIMEOUT = 5
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+# Sanity limit on message length, to detect a corrupted stream.
+MAX_MESSAGE_SIZE = 0x10000
+
+
+class TuyaConnection:
+    """
+    A connection to a Tuya device, implemented with asyncio streams.
+
+    By default a new socket is opened for each request, and closed again
+    once the response has been received.  When persist is set, a single
+    long-lived socket is kept open instead, and status queries, commands
+    and heartbeats are multiplexed over it, with responses matched to
+    their requests by command.  Heartbeats are used to detect a dead
+    persistent connection, and reconnection is attempted with an
+    exponential backoff.
+
+    Refreshes of selected dps are answered with a status message rather
+    than a response to the request, so are matched to the next status
+    message received.
+
+    Status messages pushed by the device without being requested are
+    passed to the on_status callback, if one is given, with the dps and
+    the cid of the sub-device they came from, or None if they came from
+    the device itself.
+
+    Requests to the sub-devices of a gateway are made by passing their
+    cid, and their responses are matched by cid as well as command, so
+    that requests to many sub-devices can share one connection.
+
+    The bytes sent and received over all sockets are counted in
+    bytes_sent and bytes_received.
+    """
+
+    def __init__(self, codec, host, name, persist=False, on_status=None):
+        self._codec = codec
+        self.host = host
+        self.port = TUYA_PORT
+        self._name = name
+        self._persist = persist
+        self._on_status = on_status
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._keepalive_task = None
+        self._connect_lock = asyncio.Lock()
+        self._request_lock = asyncio.Lock()
+        self._waiters = {}
+        self._backoff = 0
+        self._next_attempt = 0
+        self._closed = False
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    @property
+    def connected(self):
+        """Return True if the socket is currently open."""
+        return self._writer is not None and not self._writer.is_closing()
+
+    @property
+    def persistent(self):
+        """Return True if the connection is kept open between requests."""
+        return self._persist
+
+    async def async_status(self, cid=None):
+        """Query the device, or one of its sub-devices, for its status."""
+        dev_type = self._codec.dev_type
+        result = await self._async_request(DP_QUERY, require_data=True, cid=cid)
+        if dev_type != self._codec.dev_type:
+            # Device22 detected by the payload decoder, resend with the
+            # updated payload format.
+            _LOGGER.debug("%s: resending status query for device22", self._name)
+            result = await self._async_request(DP_QUERY, require_data=True, cid=cid)
+        return result
+
+    async def async_control(self, dps, cid=None):
+        """
+        Send a command to set the given dps on the device, or one of its
+        sub-devices.
+
+        Not all devices acknowledge commands, so a missing response is
+        not treated as an error.
+        """
+        try:
+            return await self._async_request(CONTROL, dps, cid=cid)
+        except asyncio.TimeoutError:
+            _LOGGER.debug("%s: command was not acknowledged", self._name)
+            return None
+
+    async def async_update_dps(self, dps_ids, cid=None):
+        """
+        Ask the device, or one of its sub-devices, to report just the given
+        dps.  The device answers with a status message containing them,
+        which is returned.
+        """
+        return await self._async_request(
+            UPDATEDPS, [int(d) for d in dps_ids], True, cid=cid, response=STATUS
+        )
+
+    async def async_probe(self):
+        """
+        Check that the device is accepting connections, raising an
+        exception if it is not.  This does not depend on the protocol
+        version, and is cheaper than a status query.
+        """
+        if self.connected:
+            return
+        async with self._request_lock:
+            try:
+                _, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), CONNECT_TIMEOUT
+                )
+            except (OSError, asyncio.TimeoutError) as e:
+                raise ConnectionError(f"Unable to connect to {self._name}") from e
+            writer.close()
+
+    async def async_heartbeat(self):
+        """Send a heartbeat, raising an exception if it is not answered."""
+        return await self._async_request(HEART_BEAT, drop_on_timeout=True)
+
+    def update_host(self, host):
+        """Connect to the device at a new address from now on."""
+        if host == self.host:
+            return
+        self.host = host
+        self._backoff = 0
+        self._next_attempt = 0
+        self._disconnect(ConnectionError(f"{self._name} moved to {host}"))
+
+    def close(self):
+        """Close the connection and stop reconnecting."""
+        self._closed = True
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        self._disconnect(ConnectionError(f"Connection to {self._name} closed"))
+
+    async def _async_request(
+        self,
+        cmd,
+        data=None,
+        require_data=False,
+        drop_on_timeout=False,
+        cid=None,
+        response=None,
+    ):
+        if self._persist:
+            return await self._async_send_request(
+                cmd, data, require_data, drop_on_timeout, cid, response
+            )
+
+        async with self._request_lock:
+            try:
+                return await self._async_send_request(
+                    cmd, data, require_data, cid=cid, response=response
+                )
+            finally:
+                self._disconnect(ConnectionError(f"Request to {self._name} done"))
+
+    async def _async_send_request(
+        self, cmd, data, require_data, drop_on_timeout=False, cid=None, response=None
+    ):
+        await self._async_ensure_connected()
+        cmd, message = self._codec.encode(cmd, data, cid)
+        # Responses normally come back with the command of the request, but
+        # some requests are answered with a different one.
+        if response is not None:
+            cmd = response
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, require_data, cid)
+        self._waiters.setdefault(cmd, deque()).append(waiter)
+        try:
+            self._writer.write(message)
+            self.bytes_sent += len(message)
+            await self._writer.drain()
+            return await asyncio.wait_for(future, RESPONSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            if require_data or drop_on_timeout:
+                self._disconnect(ConnectionError(f"Timeout waiting for {self._name}"))
+            raise
+        except OSError as e:
+            self._disconnect(e)
+            raise
+        finally:
+            waiters = self._waiters.get(cmd)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+
+    async def _async_ensure_connected(self):
+        if self.connected:
+            return
+        if self._closed:
+            raise ConnectionError(f"Connection to {self._name} closed")
+
+        async with self._connect_lock:
+            if self.connected:
+                return
+            if time() < self._next_attempt:
+                raise ConnectionError(
+                    f"Waiting {self._backoff}s before reconnecting to {self._name}"
+                )
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port),
+                    CONNECT_TIMEOUT,
+                )
+            except (OSError, asyncio.TimeoutError) as e:
+                if self._persist:
+                    self._backoff = min(
+                        max(self._backoff * 2, RECONNECT_MIN_DELAY),
+                        RECONNECT_MAX_DELAY,
+                    )
+                    self._next_attempt = time() + self._backoff
+                raise ConnectionError(f"Unable to connect to {self._name}") from e
+
+            _LOGGER.debug("%s: connection established", self._name)
+            self._backoff = 0
+            self._next_attempt = 0
+            self._read_task = asyncio.create_task(self._async_read_loop())
+            if self._persist and self._keepalive_task is None:
+                self._keepalive_task = asyncio.create_task(self._async_keepalive())
+
+    async def _async_read_loop(self):
+        reader = self._reader
+        try:
+            while True:
+                header = await reader.readexactly(HEADER_SIZE)
+                _, cmd, length = parse_header(header)
+                if length < END_SIZE or length > MAX_MESSAGE_SIZE:
+                    raise TuyaProtocolError(f"Bad message length {length}")
+                body = await reader.readexactly(length)
+                self.bytes_received += HEADER_SIZE + length
+                self._handle_message(cmd, unpack_message(header + body))
+        except asyncio.CancelledError:
+            raise
+        except (OSError, asyncio.IncompleteReadError, TuyaProtocolError) as e:
+            _LOGGER.debug("%s: connection lost: %s", self._name, e)
+            if isinstance(e, TuyaProtocolError):
+                error = e
+            else:
+                error = ConnectionError(f"Connection to {self._name} lost")
+            self._disconnect(error)
+
+    def _handle_message(self, cmd, msg):
+        dev_type = self._codec.dev_type
+        try:
+            result = self._codec.decode(msg.payload)
+            error = None
+        except TuyaProtocolError as e:
+            result = None
+            error = e
+        switched = dev_type != self._codec.dev_type
+        cid = result.get("cid") if isinstance(result, dict) else None
+
+        for waiter in self._waiters.get(cmd, ()):
+            future, require_data, waiter_cid = waiter
+            if future.done():
+                continue
+            if cid is not None and waiter_cid is not None and cid != waiter_cid:
+                continue
+            if error is not None:
+                future.set_exception(error)
+            elif require_data and result is None and not switched:
+                continue
+            else:
+                future.set_result(result)
+            self._waiters[cmd].remove(waiter)
+            return
+
+        if error is not None:
+            _LOGGER.debug("%s: undecodable message %d: %s", self._name, cmd, error)
+            return
+        _LOGGER.debug("%s: unsolicited message %d: %s", self._name, cmd, result)
+        if (
+            cmd == STATUS
+            and self._on_status
+            and isinstance(result, dict)
+            and isinstance(result.get("dps"), dict)
+        ):
+            self._on_status(result["dps"], cid)
+
+    def _disconnect(self, error):
+        if self._read_task is not None:
+            if self._read_task is not asyncio.current_task():
+                self._read_task.cancel()
+            self._read_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._reader = None
+        waiters = self._waiters
+        self._waiters = {}
+        for queue in waiters.values():
+            for future, *_ in queue:
+                if not future.done():
+                    future.set_exception(error)
+
+    async def _async_keepalive(self):
+        while not self._closed:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                if self.connected:
+                    await self.async_heartbeat()
+                else:
+                    await self._async_ensure_connected()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                _LOGGER.debug("%s: keepalive failed: %s", self._name, e)
@@ -11,5 +11,35 @@ CONF_LIGHT = "light"
 CONF_LOCK = "lock"
 CONF_SWITCH = "switch"
 CONF_HUMIDIFIER = "humidifier"
+CONF_PERSIST = "persistent_connection"
+CONF_DIAGNOSTICS = "diagnostic_sensors"
+CONF_GATEWAY_ID = "gateway_id"
+CONF_CID = "cid"
 API_PROTOCOL_VERSIONS = [3.3, 3.1]
 SCAN_INTERVAL = timedelta(seconds=30)
+# Limits on the adaptive poll interval, unless overridden by the device config.
+MIN_POLL_INTERVAL = timedelta(seconds=10)
+MAX_POLL_INTERVAL = timedelta(minutes=2)
+# Fraction of the poll interval that polls are randomly moved by.
+POLL_JITTER = 0.1
+PUSH_SAFETY_INTERVAL = timedelta(minutes=5)
+# Default interval between refreshes of dps marked as fast-changing.
+FAST_POLL_INTERVAL = timedelta(seconds=5)
+# Fast-changing readings are summarised, and their entities updated, over
+# windows of this length.
+METERING_WINDOW = timedelta(seconds=30)
+# Power readings further apart than this are not integrated into energy.
+METERING_MAX_GAP = timedelta(minutes=1)
+# State younger than this is reused rather than polling the device again.
+REFRESH_WINDOW = timedelta(seconds=20)
+# Commands to a device made within this window are sent together.
+WRITE_WINDOW = timedelta(seconds=1)
+# Maximum number of devices polled at once when detecting types in bulk.
+DETECTION_CONCURRENCY = 10
+# Maximum number of sub-devices queried at once through a gateway.
+GATEWAY_CONCURRENCY = 4
+# Limits on the backoff before an unreachable device is tried again.
+MIN_UNREACHABLE_BACKOFF = timedelta(seconds=30)
+MAX_UNREACHABLE_BACKOFF = timedelta(minutes=15)
+# Fraction of the backoff that retries are randomly moved by.
+BACKOFF_JITTER = 0.2
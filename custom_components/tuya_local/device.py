@@ -2,30 +2,79 @@
 API for Tuya Local devices.
 """
 
+import asyncio
 import json
 import logging
-import tinytuya
-from threading import Lock, Timer
-from time import time
-
+from math import inf
+from time import monotonic, perf_counter, time
+from types import MappingProxyType
 
 from homeassistant.const import CONF_HOST, CONF_NAME, TEMP_CELSIUS
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 
+from .breaker import CircuitBreaker
+from .coalescer import WriteCoalescer
+from .connection import TuyaConnection
 from .const import (
     API_PROTOCOL_VERSIONS,
     CONF_DEVICE_ID,
     CONF_LOCAL_KEY,
+    CONF_PERSIST,
+    CONF_TYPE,
+    DETECTION_CONCURRENCY,
     DOMAIN,
+    FAST_POLL_INTERVAL,
+    MAX_POLL_INTERVAL,
+    METERING_MAX_GAP,
+    METERING_WINDOW,
+    MIN_POLL_INTERVAL,
+    PUSH_SAFETY_INTERVAL,
+    REFRESH_WINDOW,
+    WRITE_WINDOW,
+)
+from .discovery import DATA_DISCOVERY
+from .helpers.device_config import (
+    async_load_config_index,
+    get_config,
+    possible_matches,
+    ranked_matches,
 )
-from .helpers.device_config import possible_matches
+from .metering import DpsMeter
+from .protocol import TuyaCodec, TuyaProtocolError
+from .scheduler import PollScheduler
+from .stats import DeviceStats
 
 
 _LOGGER = logging.getLogger(__name__)
 
+PROTOCOL_VERSIONS_FILE = f"{DOMAIN}.protocol_versions"
+_PROTOCOL_VERSIONS_STORE_VERSION = 1
+# Delay in seconds before newly negotiated versions are saved.
+_PROTOCOL_VERSIONS_SAVE_DELAY = 10
+# hass.data key for the store of negotiated protocol versions
+DATA_PROTOCOL_VERSIONS = f"{DOMAIN}_protocol_versions"
+
 
 class TuyaLocalDevice(object):
-    def __init__(self, name, dev_id, address, local_key, hass: HomeAssistant):
+    def __init__(
+        self,
+        name,
+        dev_id,
+        address,
+        local_key,
+        hass: HomeAssistant,
+        persist=False,
+        refresh_window=REFRESH_WINDOW,
+        poll_interval=(MIN_POLL_INTERVAL, MAX_POLL_INTERVAL),
+        write_window=WRITE_WINDOW,
+        protocol_version=None,
+        on_protocol_version=None,
+        fast_dps=(),
+        fast_poll_interval=FAST_POLL_INTERVAL,
+        energy_dps=(),
+    ):
         """
         Represents a Tuya-based device.
 
@@ -33,14 +82,72 @@ class TuyaLocalDevice(object):
             dev_id (str): The device id.
             address (str): The network address.
             local_key (str): The encryption key.
+            persist (bool): Keep a persistent connection open to the device.
+            refresh_window (timedelta): How long state is reused for before
+                the device is polled again.
+            poll_interval (tuple): The minimum and maximum timedelta between
+                scheduled polls.
+            write_window (timedelta): How long commands are collected for
+                before they are sent together.
+            protocol_version (float): The protocol version previously
+                negotiated with the device, if known.
+            on_protocol_version (callable): Called with the protocol version
+                when a different one is negotiated with the device.
+            fast_dps (iterable): The ids of dps that change often enough to
+                be refreshed on their own, between full polls.
+            fast_poll_interval (timedelta): The shortest time between
+                refreshes of the fast-changing dps.
+            energy_dps (iterable): The ids of fast-changing power dps to
+                integrate into the energy used.
         """
         self._name = name
+        # A logger per device, so that debug logging can be enabled for
+        # one device at a time.
+        self._log = _LOGGER.getChild(dev_id)
         self._api_protocol_version_index = None
         self._api_protocol_working = False
-        self._api = tinytuya.Device(dev_id, address, local_key)
+        self._api_protocol_negotiated = protocol_version
+        self._on_protocol_version = on_protocol_version
+        self._dev_id = dev_id
+        self._codec, self._connection = self._create_connection(
+            address, local_key, persist
+        )
+        self._breaker = CircuitBreaker(name)
+        self._stats = DeviceStats()
         self._refresh_task = None
-        self._rotate_api_protocol_version()
-
+        self._refresh_window = refresh_window.total_seconds()
+        self._refresh_stats = {"requested": 0, "polled": 0, "coalesced": 0}
+        self._entities = []
+        self._safety_poll = None
+        self._scheduler = PollScheduler(
+            hass, name, self._async_scheduled_poll, *poll_interval
+        )
+        self._writer = WriteCoalescer(
+            hass, name, self._async_send_properties, write_window
+        )
+        self._fast_dps = frozenset(fast_dps)
+        self._fast_scheduler = PollScheduler(
+            hass, name, self._async_fast_poll, fast_poll_interval, poll_interval[0]
+        )
+        self._partial_refresh = True
+        self._meters = {
+            dps_id: DpsMeter(METERING_WINDOW, METERING_MAX_GAP, dps_id in energy_dps)
+            for dps_id in self._fast_dps
+        }
+        if protocol_version in API_PROTOCOL_VERSIONS:
+            self._api_protocol_version_index = API_PROTOCOL_VERSIONS.index(
+                protocol_version
+            )
+            self._codec.version = protocol_version
+        else:
+            self._api_protocol_negotiated = None
+            self._rotate_api_protocol_version()
+
+        self._snapshot = None
+        self._snapshot_expiry = inf
+        self._state_version = 0
+        # The values of dps when entities depending on them were last written.
+        self._notified = {}
         self._reset_cached_state()
 
         self._TEMPERATURE_UNIT = TEMP_CELSIUS
@@ -54,9 +161,15 @@ class TuyaLocalDevice(object):
         # we can overlay onto the state while we wait for the board to update
         # its switches.
         self._FAKE_IT_TIL_YOU_MAKE_IT_TIMEOUT = 10
-        self._CACHE_TIMEOUT = 20
         self._CONNECTION_ATTEMPTS = 4
-        self._lock = Lock()
+
+    def _create_connection(self, address, local_key, persist):
+        """Return the codec and connection used to talk to the device."""
+        codec = TuyaCodec(self._dev_id, local_key)
+        connection = TuyaConnection(
+            codec, address, self._name, persist, self._handle_pushed_status
+        )
+        return codec, connection
 
     @property
     def name(self):
@@ -65,7 +178,7 @@ class TuyaLocalDevice(object):
     @property
     def unique_id(self):
         """Return the unique id for this device (the dev_id)."""
-        return self._api.id
+        return self._dev_id
 
     @property
     def device_info(self):
@@ -81,74 +194,379 @@ class TuyaLocalDevice(object):
         """Return True if the device has returned some state."""
         return len(self._get_cached_state()) > 1
 
+    @property
+    def available(self):
+        """
+        Return True if the device is reachable and has returned some state.
+        """
+        return self._breaker.closed and self.has_returned_state
+
     @property
     def temperature_unit(self):
         return self._TEMPERATURE_UNIT
 
-    async def async_possible_types(self):
+    @property
+    def state_version(self):
+        """
+        Return a number that changes whenever the state returned by
+        get_property may have changed.
+        """
+        self._get_cached_state()
+        return self._state_version
+
+    @property
+    def refresh_stats(self):
+        """
+        Return counts of refreshes requested by entities, how many of them
+        resulted in polling the device and how many were coalesced.
+        """
+        return dict(self._refresh_stats)
+
+    @property
+    def protocol_version(self):
+        """Return the protocol version currently used with the device."""
+        return self._codec.version
+
+    @property
+    def stats(self):
+        """
+        Return the statistics kept for the device: latencies, retries,
+        failures, traffic and how it is connected.
+        """
+        return {
+            **self._stats.as_dict(),
+            "bytes_sent": self._connection.bytes_sent,
+            "bytes_received": self._connection.bytes_received,
+            "coalesced_writes": self._writer.coalesced,
+            "refreshes": self.refresh_stats,
+            "protocol_version": self.protocol_version,
+            "address": self._connection.host,
+            "circuit": self._breaker.state,
+            "poll_interval": self.poll_interval,
+        }
+
+    @property
+    def push_enabled(self):
+        """Return True if the device pushes state changes to us."""
+        return self._connection.persistent
+
+    @property
+    def poll_interval(self):
+        """Return the current interval between scheduled polls in seconds."""
+        return self._scheduler.interval
+
+    @callback
+    def update_from_discovery(self, address, version):
+        """Use the address and protocol version the device broadcast."""
+        if address != self._connection.host:
+            self._log.info("%s has moved to %s", self.name, address)
+            self._connection.update_host(address)
+            self._breaker.retry_now()
+        if version in API_PROTOCOL_VERSIONS and version != self._codec.version:
+            self._api_protocol_version_index = API_PROTOCOL_VERSIONS.index(version)
+            self._codec.version = version
+            self._record_api_protocol_version()
+
+    @callback
+    def register_entity(self, entity):
+        """Register an entity to be updated when the state changes."""
+        self._entities.append(entity)
+        if not self.push_enabled:
+            self._scheduler.start()
+        elif self._safety_poll is None:
+            self._safety_poll = async_track_time_interval(
+                self._hass, self._async_safety_poll, PUSH_SAFETY_INTERVAL
+            )
+            self._hass.async_create_task(self._async_safety_poll())
+        self._update_fast_polling()
+
+    @callback
+    def unregister_entity(self, entity):
+        """Stop updating an entity when the state changes."""
+        if entity in self._entities:
+            self._entities.remove(entity)
+        if not self._entities:
+            self._scheduler.stop()
+            self._stop_safety_poll()
+        self._update_fast_polling()
+
+    @property
+    def fast_dps_in_use(self):
+        """Return the ids of fast-changing dps used by registered entities."""
+        used = set()
+        for entity in self._entities:
+            if entity.dps_ids is not None:
+                used.update(entity.dps_ids)
+        return self._fast_dps.intersection(used)
+
+    def meter(self, dps_id):
+        """Return the meter of a fast-changing dps, or None for other dps."""
+        return self._meters.get(dps_id)
+
+    @callback
+    def _update_fast_polling(self):
+        """Refresh fast-changing dps only while an entity uses them."""
+        if self.fast_dps_in_use:
+            self._fast_scheduler.start()
+        else:
+            self._fast_scheduler.stop()
+
+    async def _async_detection_state(self):
         cached_state = self._get_cached_state()
         if len(cached_state) <= 1:
             await self.async_refresh()
             cached_state = self._get_cached_state()
+        return cached_state
 
-        for match in possible_matches(cached_state):
+    async def async_possible_types(self):
+        for match in possible_matches(await self._async_detection_state()):
             yield match
 
+    async def async_ranked_types(self):
+        """
+        Return (config, match_quality) for each config that matches the
+        device, best match first.
+        """
+        return ranked_matches(await self._async_detection_state())
+
     async def async_inferred_type(self):
         best_match = None
-        best_quality = 0
-        cached_state = {}
-        async for config in self.async_possible_types():
-            cached_state = self._get_cached_state()
-            quality = config.match_quality(cached_state)
-            _LOGGER.info(
-                f"{self.name} considering {config.name} with quality {quality}"
+        cached_state = await self._async_detection_state()
+        for config, quality in await self.async_ranked_types():
+            self._log.info(
+                "%s considering %s with quality %s", self.name, config.name, quality
             )
-            if quality > best_quality:
-                best_quality = quality
+            if best_match is None and quality > 0:
                 best_match = config
 
         if best_match is None:
-            _LOGGER.warning(f"Detection for {self.name} with dps {cached_state} failed")
+            self._log.warning(
+                "Detection for %s with dps %s failed", self.name, dict(cached_state)
+            )
             return None
 
         return best_match.config_type
 
-    async def async_refresh(self):
-        cache = self._get_cached_state()
-        if "updated_at" in cache:
-            last_updated = self._get_cached_state()["updated_at"]
+    async def async_refresh(self, max_age=None):
+        """
+        Refresh the device state, sharing a single request between callers.
+
+        Callers that arrive while a refresh is in progress wait for it rather
+        than starting another, and state updated within max_age seconds,
+        by default the refresh window, is reused without polling the device.
+        """
+        if max_age is None:
+            max_age = self._refresh_window
+        self._refresh_stats["requested"] += 1
+        task = self._refresh_task
+        age = time() - self._cached_state.get("updated_at", 0)
+        if task is None or (task.done() and age >= max_age):
+            self._refresh_stats["polled"] += 1
+            self._refresh_task = task = self._hass.async_create_task(
+                self.async_refresh_now()
+            )
         else:
-            last_updated = 0
+            self._refresh_stats["coalesced"] += 1
 
-        if self._refresh_task is None or time() - last_updated >= self._CACHE_TIMEOUT:
-            self._cached_state["updated_at"] = time()
-            self._refresh_task = self._hass.async_add_executor_job(self.refresh)
+        # Shielded so that one cancelled caller does not cancel the refresh
+        # for the others.
+        await asyncio.shield(task)
 
-        await self._refresh_task
+    async def async_refresh_dps(self, dps_ids):
+        """
+        Refresh only the given dps, merging them into the cached state.
 
-    def refresh(self):
-        _LOGGER.debug(f"Refreshing device state for {self.name}.")
-        self._retry_on_failed_connection(
-            lambda: self._refresh_cached_state(),
-            f"Failed to refresh device state for {self.name}.",
+        This uses smaller messages than a full refresh, but the state is
+        refreshed in full instead while the device is unavailable, and
+        from then on if the device does not answer requests for selected
+        dps.
+        """
+        if not self._partial_refresh or not self.available:
+            await self.async_refresh()
+            return
+        try:
+            await self._async_refresh_dps(dps_ids)
+        except Exception as e:
+            self._log.debug("Refresh of dps %s failed: %s", sorted(dps_ids), e)
+            if isinstance(e, asyncio.TimeoutError):
+                self._log.info("%s does not support refreshing selected dps", self.name)
+                self._partial_refresh = False
+            await self.async_refresh(max_age=0)
+
+    async def async_refresh_now(self):
+        self._log.debug("Refreshing device state for %s", self.name)
+        await self._async_retry_on_failed_connection(
+            self._async_refresh_cached_state,
+            "Failed to refresh device state for %s.",
+            self.name,
         )
 
     def get_property(self, dps_id):
-        cached_state = self._get_cached_state()
-        if dps_id in cached_state:
-            return cached_state[dps_id]
-        else:
-            return None
-
-    def set_property(self, dps_id, value):
-        self._set_properties({dps_id: value})
+        return self._get_cached_state().get(dps_id)
 
     async def async_set_property(self, dps_id, value):
-        await self._hass.async_add_executor_job(self.set_property, dps_id, value)
+        return await self.async_set_properties({dps_id: value})
 
     async def async_set_properties(self, dps_map):
-        await self._hass.async_add_executor_job(self._set_properties, dps_map)
+        """
+        Set dps on the device.
+
+        The new values are reflected in the state straight away, and
+        commands made within the write window are sent to the device
+        together.  Returns a future that resolves to True once the device
+        has acknowledged the command, or False if it could not be sent.
+        """
+        if len(dps_map) == 0:
+            future = self._hass.loop.create_future()
+            future.set_result(True)
+            return future
+
+        self._add_properties_to_pending_updates(dps_map)
+        # HA does not write the state of entities that are not polled after
+        # a service call, so the new values are shown from here.
+        self._notify_entities(set(dps_map))
+        return self._writer.add(dps_map)
+
+    def close(self):
+        """Close the connection to the device."""
+        self._scheduler.stop()
+        self._fast_scheduler.stop()
+        self._stop_safety_poll()
+        self._writer.cancel()
+        self._connection.close()
+
+    def _stop_safety_poll(self):
+        if self._safety_poll is not None:
+            self._safety_poll()
+            self._safety_poll = None
+
+    async def _async_safety_poll(self, now=None):
+        """Poll the device occasionally in case a pushed update was missed."""
+        before = self._get_cached_state()
+        was_available = self.available
+        await self.async_refresh()
+        self._notify_changes(before, was_available)
+
+    async def _async_scheduled_poll(self):
+        """Poll the device, returning True if its state changed."""
+        before = self._get_cached_state()
+        was_available = self.available
+        await self.async_refresh(max_age=0)
+        # Each full poll is a sample too, as without refreshes of selected
+        # dps it is the only one.
+        completed = self._sample_meters(self.fast_dps_in_use)
+        changed = self._notify_changes(before, was_available, completed)
+        # A failed poll leaves no state, and is not counted as a change.
+        return self.has_returned_state and bool(changed)
+
+    async def _async_fast_poll(self):
+        """
+        Refresh the fast-changing dps, returning True if any changed.
+
+        Each refresh is a sample for the meters of the dps.  Entities that
+        depend on them are only updated when a metering window completes,
+        rather than for every sample, unless other dps changed too.
+        """
+        if not self._partial_refresh or not self.available:
+            # Left to the full polls.
+            return False
+        before = self._get_cached_state()
+        was_available = self.available
+        dps_ids = self.fast_dps_in_use
+        await self.async_refresh_dps(dps_ids)
+        completed = self._sample_meters(dps_ids)
+        changed = self._changed_dps(before)
+        if self.available != was_available:
+            self._notify_entities()
+        else:
+            self._notify_entities(((changed | self._stale_dps()) - dps_ids) | completed)
+        return self.has_returned_state and bool(changed)
+
+    def _sample_meters(self, dps_ids):
+        """Sample the given dps, returning those that completed a window."""
+        now = time()
+        state = self._get_cached_state()
+        return {
+            dps_id
+            for dps_id in dps_ids
+            if dps_id in self._meters
+            and self._meters[dps_id].add(state.get(dps_id), now)
+        }
+
+    @callback
+    def _handle_pushed_status(self, dps, cid=None):
+        if cid is not None:
+            # From a sub-device of a gateway, not the device itself.
+            return
+        before = self._get_cached_state()
+        was_available = self.available
+        self._device_state.update(dps)
+        self._device_state["updated_at"] = time()
+        self._invalidate_snapshot()
+        if self._log.isEnabledFor(logging.DEBUG):
+            self._log.debug("%s pushed state: %s", self.name, json.dumps(dps))
+        completed = self._sample_meters(self.fast_dps_in_use.intersection(dps))
+        self._notify_changes(before, was_available, completed)
+
+    @callback
+    def _notify_changes(self, before, was_available, completed=frozenset()):
+        """
+        Notify the entities that depend on dps that have changed since the
+        state was before, or since their entities were last written, or
+        whose meters have completed a window, or all entities if
+        availability has changed.  Returns the ids of the dps changed since
+        the state was before.
+        """
+        changed = self._changed_dps(before)
+        if self.available != was_available:
+            self._notify_entities()
+        else:
+            self._notify_entities(changed | self._stale_dps() | completed)
+        return changed
+
+    def _changed_dps(self, before):
+        """Return the ids of dps that have changed since the state was before."""
+        after = self._get_cached_state()
+        return {
+            key
+            for key in before.keys() | after.keys()
+            if key != "updated_at"
+            and (key not in before or key not in after or before[key] != after[key])
+        }
+
+    def _stale_dps(self):
+        """
+        Return the ids of dps whose entities were written with a value they
+        no longer have, such as a pending update that expired because the
+        device did not apply it.
+        """
+        state = self._get_cached_state()
+        return {
+            key
+            for key, value in self._notified.items()
+            if key not in state or state[key] != value
+        }
+
+    @callback
+    def _notify_entities(self, changed=None):
+        """
+        Write the state of entities that depend on any of the changed dps
+        ids, or of all entities if changed is None.  Entities whose
+        dps_ids are None have their state written every time.
+        """
+        state = self._get_cached_state()
+        if changed is None:
+            self._notified = {k: v for k, v in state.items() if k != "updated_at"}
+        else:
+            for key in changed:
+                if key in state:
+                    self._notified[key] = state[key]
+                else:
+                    self._notified.pop(key, None)
+        for entity in self._entities:
+            dps_ids = entity.dps_ids
+            if changed is None or dps_ids is None or not dps_ids.isdisjoint(changed):
+                entity.async_write_ha_state()
 
     def anticipate_property_value(self, dps_id, value):
         """
@@ -157,28 +575,58 @@ class TuyaLocalDevice(object):
 
         The anticipated value will be cleared with the next update.
         """
-        self._cached_state[dps_id] = value
+        self._device_state[dps_id] = value
+        self._invalidate_snapshot()
+
+    @property
+    def _cached_state(self):
+        """The last state received from the device."""
+        return self._device_state
+
+    @_cached_state.setter
+    def _cached_state(self, state):
+        self._device_state = state
+        self._invalidate_snapshot()
+
+    @property
+    def _pending_updates(self):
+        """Values that have been set, but not yet confirmed by the device."""
+        return self._pending
+
+    @_pending_updates.setter
+    def _pending_updates(self, pending):
+        self._pending = pending
+        self._invalidate_snapshot()
 
     def _reset_cached_state(self):
         self._cached_state = {"updated_at": 0}
         self._pending_updates = {}
-        self._last_connection = 0
-
-    def _refresh_cached_state(self):
-        new_state = self._api.status()
-        self._cached_state = new_state["dps"]
-        self._cached_state["updated_at"] = time()
-        _LOGGER.debug(f"{self.name} refreshed device state: {json.dumps(new_state)}")
-        _LOGGER.debug(
-            f"new cache state (including pending properties): {json.dumps(self._get_cached_state())}"
-        )
 
-    def _set_properties(self, properties):
-        if len(properties) == 0:
-            return
+    async def _async_refresh_cached_state(self):
+        start = perf_counter()
+        new_state = await self._connection.async_status()
+        self._stats.polls.record(perf_counter() - start)
+        self._cached_state = {**new_state["dps"], "updated_at": time()}
+        if self._log.isEnabledFor(logging.DEBUG):
+            self._log.debug(
+                "%s refreshed device state: %s", self.name, json.dumps(new_state)
+            )
+            self._log.debug(
+                "new cache state (including pending properties): %s",
+                json.dumps(dict(self._get_cached_state())),
+            )
 
-        self._add_properties_to_pending_updates(properties)
-        self._debounce_sending_updates()
+    async def _async_refresh_dps(self, dps_ids):
+        start = perf_counter()
+        result = await self._connection.async_update_dps(dps_ids)
+        self._stats.partial_polls.record(perf_counter() - start)
+        dps = result.get("dps", {})
+        # Only part of the state is refreshed, so updated_at is left for
+        # the full polls.
+        self._device_state.update(dps)
+        self._invalidate_snapshot()
+        if self._log.isEnabledFor(logging.DEBUG):
+            self._log.debug("%s refreshed dps: %s", self.name, json.dumps(dps))
 
     def _add_properties_to_pending_updates(self, properties):
         now = time()
@@ -186,84 +634,143 @@ class TuyaLocalDevice(object):
         pending_updates = self._get_pending_updates()
         for key, value in properties.items():
             pending_updates[key] = {"value": value, "updated_at": now}
+        self._invalidate_snapshot()
+
+        if self._log.isEnabledFor(logging.DEBUG):
+            self._log.debug(
+                "%s new pending updates: %s",
+                self.name,
+                json.dumps(self._pending_updates),
+            )
+
+    async def _async_send_properties(self, properties):
+        if self._log.isEnabledFor(logging.DEBUG):
+            self._log.debug(
+                "%s sending dps update: %s", self.name, json.dumps(properties)
+            )
 
-        _LOGGER.debug(
-            f"{self.name} new pending updates: {json.dumps(self._pending_updates)}"
+        return await self._async_retry_on_failed_connection(
+            lambda: self._async_control(properties),
+            "Failed to update device state.",
         )
 
-    def _debounce_sending_updates(self):
+    async def _async_control(self, properties):
+        start = perf_counter()
+        await self._connection.async_control(properties)
+        self._stats.commands.record(perf_counter() - start)
+        self._mark_pending_updates_sent()
+
+    def _mark_pending_updates_sent(self):
+        self._device_state["updated_at"] = 0
         now = time()
-        since = now - self._last_connection
-        # set this now to avoid a race condition, it will be updated later
-        # when the data is actally sent
-        self._last_connection = now
-        # Only delay a second if there was recently another command.
-        # Otherwise delay 1ms, to keep things simple by reusing the
-        # same send mechanism.
-        waittime = 1 if since < 1.0 else 0.001
+        pending_updates = self._get_pending_updates()
+        for key, value in pending_updates.items():
+            pending_updates[key]["updated_at"] = now
+        self._invalidate_snapshot()
 
-        try:
-            self._debounce.cancel()
-        except AttributeError:
-            pass
-        self._debounce = Timer(waittime, self._send_pending_updates)
-        self._debounce.start()
-
-    def _send_pending_updates(self):
-        pending_properties = self._get_pending_properties()
-        payload = self._api.generate_payload(tinytuya.CONTROL, pending_properties)
-
-        _LOGGER.debug(
-            f"{self.name} sending dps update: {json.dumps(pending_properties)}"
-        )
+    async def _async_retry_on_failed_connection(self, func, error_message, *args):
+        """
+        Call func until it succeeds, returning False if it never does, when
+        error_message is logged with args.
 
-        self._retry_on_failed_connection(
-            lambda: self._send_payload(payload), "Failed to update device state."
-        )
+        Once a device has failed to respond, it is not contacted again
+        until the circuit breaker allows a probe, and then only if the
+        probe finds that it is accepting connections.
+        """
+        if not self._breaker.closed and not await self._async_probe():
+            return False
 
-    def _send_payload(self, payload):
-        try:
-            self._lock.acquire()
-            self._api._send_receive(payload)
-            self._cached_state["updated_at"] = 0
-            now = time()
-            self._last_connection = now
-            pending_updates = self._get_pending_updates()
-            for key, value in pending_updates.items():
-                pending_updates[key]["updated_at"] = now
-        finally:
-            self._lock.release()
-
-    def _retry_on_failed_connection(self, func, error_message):
         for i in range(self._CONNECTION_ATTEMPTS):
             try:
-                func()
+                await func()
                 self._api_protocol_working = True
-                break
+                self._record_api_protocol_version()
+                self._breaker.record_success()
+                return True
             except Exception as e:
-                _LOGGER.debug(f"Retrying after exception {e}")
+                self._log.debug("Retrying after exception %s", e)
                 if i + 1 == self._CONNECTION_ATTEMPTS:
+                    self._stats.failures += 1
                     self._reset_cached_state()
                     self._api_protocol_working = False
-                    _LOGGER.error(error_message)
-                if not self._api_protocol_working:
+                    self._breaker.record_failure()
+                    self._log.error(error_message, *args)
+                else:
+                    self._stats.retries += 1
+                if self._should_rotate_api_protocol_version(e):
                     self._rotate_api_protocol_version()
+        return False
+
+    async def _async_probe(self):
+        """Return True if the device is due to be tried again, and is up."""
+        if not self._breaker.allow_probe():
+            return False
+        try:
+            await self._connection.async_probe()
+        except Exception as e:
+            self._log.debug("Probe of %s failed: %s", self.name, e)
+            self._breaker.record_failure()
+            return False
+        return True
+
+    def _should_rotate_api_protocol_version(self, error):
+        """
+        Return True if a failure suggests the wrong protocol version is in use.
+
+        Until a version has been negotiated, any failure could be caused by
+        the version, so each is tried in turn.  After that, only messages
+        that could not be decoded cause the version to change, so that a
+        device that is temporarily unreachable keeps its version.
+        """
+        if self._api_protocol_negotiated is None:
+            return not self._api_protocol_working
+        return isinstance(error, TuyaProtocolError)
+
+    def _record_api_protocol_version(self):
+        version = self._codec.version
+        if version == self._api_protocol_negotiated:
+            return
+        self._log.info("Negotiated protocol version %s with %s", version, self.name)
+        self._api_protocol_negotiated = version
+        if self._on_protocol_version is not None:
+            self._on_protocol_version(version)
+
+    def _invalidate_snapshot(self):
+        self._snapshot = None
 
     def _get_cached_state(self):
-        cached_state = self._cached_state.copy()
-        return {**cached_state, **self._get_pending_properties()}
+        """
+        Return a read-only snapshot of the cached state with pending updates
+        applied.  The snapshot is only rebuilt when the cached state or
+        pending updates change, or a pending update expires.
+        """
+        if self._snapshot is None or time() >= self._snapshot_expiry:
+            pending = self._get_pending_updates()
+            self._snapshot = MappingProxyType(
+                {**self._device_state, **self._get_pending_properties()}
+            )
+            self._snapshot_expiry = (
+                min((info["updated_at"] for info in pending.values()), default=inf)
+                + self._FAKE_IT_TIL_YOU_MAKE_IT_TIMEOUT
+            )
+            self._state_version += 1
+        return self._snapshot
 
     def _get_pending_properties(self):
         return {key: info["value"] for key, info in self._get_pending_updates().items()}
 
     def _get_pending_updates(self):
         now = time()
-        self._pending_updates = {
-            key: value
-            for key, value in self._pending_updates.items()
-            if now - value["updated_at"] < self._FAKE_IT_TIL_YOU_MAKE_IT_TIMEOUT
-        }
-        return self._pending_updates
+        expired = [
+            key
+            for key, value in self._pending.items()
+            if now - value["updated_at"] >= self._FAKE_IT_TIL_YOU_MAKE_IT_TIMEOUT
+        ]
+        if expired:
+            for key in expired:
+                del self._pending[key]
+            self._invalidate_snapshot()
+        return self._pending
 
     def _rotate_api_protocol_version(self):
         if self._api_protocol_version_index is None:
@@ -275,8 +782,8 @@ class TuyaLocalDevice(object):
             self._api_protocol_version_index = 0
 
         new_version = API_PROTOCOL_VERSIONS[self._api_protocol_version_index]
-        _LOGGER.info(f"Setting protocol version for {self.name} to {new_version}.")
-        self._api.set_version(new_version)
+        self._log.info("Setting protocol version for %s to %s", self.name, new_version)
+        self._codec.version = new_version
 
     @staticmethod
     def get_key_for_value(obj, value, fallback=None):
@@ -285,23 +792,142 @@ class TuyaLocalDevice(object):
         return keys[values.index(value)] if value in values else fallback
 
 
+async def async_load_protocol_versions(hass: HomeAssistant):
+    """Load the protocol versions negotiated with devices, if not loaded."""
+    if DATA_PROTOCOL_VERSIONS not in hass.data:
+        store = Store(hass, _PROTOCOL_VERSIONS_STORE_VERSION, PROTOCOL_VERSIONS_FILE)
+        versions = await store.async_load()
+        hass.data.setdefault(
+            DATA_PROTOCOL_VERSIONS, {"store": store, "versions": versions or {}}
+        )
+    return hass.data[DATA_PROTOCOL_VERSIONS]["versions"]
+
+
+def _protocol_version_saver(hass: HomeAssistant, dev_id):
+    """
+    Return a callback that saves the protocol version negotiated with a
+    device, or None if the stored versions have not been loaded.
+    """
+    data = hass.data.get(DATA_PROTOCOL_VERSIONS)
+    if data is None:
+        return None
+
+    @callback
+    def save(version):
+        data["versions"][dev_id] = version
+        data["store"].async_delay_save(
+            lambda: data["versions"], _PROTOCOL_VERSIONS_SAVE_DELAY
+        )
+
+    return save
+
+
+def _stored_protocol_version(hass: HomeAssistant, dev_id):
+    data = hass.data.get(DATA_PROTOCOL_VERSIONS)
+    return None if data is None else data["versions"].get(dev_id)
+
+
+def polling_options(config_type):
+    """
+    Return the keyword arguments for a device of the given type that
+    control how it is polled, from its device config.
+    """
+    device_config = get_config(config_type)
+    if device_config is None:
+        return {}
+    return {
+        "poll_interval": device_config.poll_interval,
+        "fast_dps": device_config.fast_dps_ids,
+        "fast_poll_interval": device_config.fast_poll_interval,
+        "energy_dps": device_config.energy_dps_ids,
+    }
+
+
 def setup_device(hass: HomeAssistant, config: dict):
     """Setup a tuya device based on passed in config."""
 
-    _LOGGER.info(f"Creating device: {config[CONF_DEVICE_ID]}")
+    _LOGGER.info("Creating device: %s", config[CONF_DEVICE_ID])
     hass.data[DOMAIN] = hass.data.get(DOMAIN, {})
+    dev_id = config[CONF_DEVICE_ID]
     device = TuyaLocalDevice(
         config[CONF_NAME],
         config[CONF_DEVICE_ID],
         config[CONF_HOST],
         config[CONF_LOCAL_KEY],
         hass,
+        config.get(CONF_PERSIST, False),
+        protocol_version=_stored_protocol_version(hass, dev_id),
+        on_protocol_version=_protocol_version_saver(hass, dev_id),
+        **polling_options(config.get(CONF_TYPE)),
     )
     hass.data[DOMAIN][config[CONF_DEVICE_ID]] = {"device": device}
+    discovery = hass.data.get(DATA_DISCOVERY)
+    if discovery is not None:
+        discovery.register(dev_id, device.update_from_discovery)
 
     return device
 
 
+async def async_detect_types(
+    hass: HomeAssistant, devices, concurrency=DETECTION_CONCURRENCY
+):
+    """
+    Detect the types of several devices, polling them concurrently.
+
+    Args:
+        devices: an iterable of (dev_id, address, local_key) tuples.
+        concurrency (int): the maximum number of devices polled at once.
+    Returns:
+        A dict of dev_id to a dict containing "type", the best matching
+        config_type or None, "matches", a list of (config_type, quality)
+        tuples, best match first, and "elapsed", the seconds taken, or
+        None if the device could not be polled.
+    """
+    await async_load_config_index(hass)
+    await async_load_protocol_versions(hass)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def async_detect(dev_id, address, local_key):
+        async with semaphore:
+            start = monotonic()
+            device = TuyaLocalDevice(
+                dev_id,
+                dev_id,
+                address,
+                local_key,
+                hass,
+                protocol_version=_stored_protocol_version(hass, dev_id),
+                on_protocol_version=_protocol_version_saver(hass, dev_id),
+            )
+            try:
+                ranked = await device.async_ranked_types()
+            finally:
+                device.close()
+
+        matches = [(cfg.config_type, quality) for cfg, quality in ranked]
+        best = next((t for t, quality in matches if quality > 0), None)
+        elapsed = monotonic() - start
+        _LOGGER.info("Detected %s as %s in %.2fs", dev_id, best, elapsed)
+        return {"type": best, "matches": matches, "elapsed": elapsed}
+
+    devices = list(devices)
+    # A device that cannot be detected does not stop the others.
+    results = await asyncio.gather(
+        *(async_detect(*d) for d in devices), return_exceptions=True
+    )
+    detected = {}
+    for (dev_id, _, _), result in zip(devices, results):
+        if isinstance(result, BaseException):
+            _LOGGER.warning("Unable to detect the type of %s: %s", dev_id, result)
+            result = {"type": None, "matches": [], "elapsed": None}
+        detected[dev_id] = result
+    return detected
+
+
 def delete_device(hass: HomeAssistant, config: dict):
-    _LOGGER.info(f"Deleting device: {config[CONF_DEVICE_ID]}")
+    _LOGGER.info("Deleting device: %s", config[CONF_DEVICE_ID])
+    discovery = hass.data.get(DATA_DISCOVERY)
+    if discovery is not None:
+        discovery.unregister(config[CONF_DEVICE_ID])
+    hass.data[DOMAIN][config[CONF_DEVICE_ID]]["device"].close()
     del hass.data[DOMAIN][config[CONF_DEVICE_ID]]["device"]
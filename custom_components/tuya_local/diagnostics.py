@@ -0,0 +1,21 @@
+"""
+Diagnostics for Tuya Local devices.
+"""
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_DEVICE_ID, CONF_LOCAL_KEY, DOMAIN
+
+TO_REDACT = {CONF_LOCAL_KEY}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry):
+    """Return the config and connection statistics for a device."""
+    data = hass.data.get(DOMAIN, {}).get(entry.data[CONF_DEVICE_ID], {})
+    device = data.get("device")
+    return {
+        "config": async_redact_data({**entry.data, **entry.options}, TO_REDACT),
+        "device": None if device is None else device.stats,
+    }
@@ -0,0 +1,139 @@
+"""
+Discovery of Tuya Local device addresses from their UDP broadcasts.
+"""
+
+import asyncio
+import logging
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DOMAIN
+from .protocol import TuyaProtocolError, decode_discovery
+
+_LOGGER = logging.getLogger(__name__)
+
+# Protocol 3.1 devices broadcast in plain text on the first port, and
+# protocol 3.3 devices encrypt their broadcasts on the second.
+DISCOVERY_PORTS = (6666, 6667)
+# hass.data key for the discovery listener
+DATA_DISCOVERY = f"{DOMAIN}_discovery"
+
+
+class _DiscoveryProtocol(asyncio.DatagramProtocol):
+    def __init__(self, discovery):
+        self._discovery = discovery
+
+    def datagram_received(self, data, addr):
+        self._discovery.handle_datagram(data, addr)
+
+
+class TuyaDiscovery:
+    """
+    Listens for the broadcasts that Tuya devices make every few seconds,
+    and keeps a table of the address and protocol version of each.
+
+    A single listener is shared by all devices.  Each device registers a
+    callback to be told when its address or version changes, so that
+    devices given a new address by DHCP are followed without their
+    config being edited.
+    """
+
+    def __init__(self):
+        self._devices = {}
+        self._listeners = {}
+        self._transports = []
+
+    @property
+    def devices(self):
+        """Return a dict of device id to (ip, version) seen so far."""
+        return dict(self._devices)
+
+    async def async_start(self, loop=None):
+        """Start listening, returning False if no port could be bound."""
+        loop = loop or asyncio.get_running_loop()
+        for port in DISCOVERY_PORTS:
+            try:
+                transport, _ = await loop.create_datagram_endpoint(
+                    lambda: _DiscoveryProtocol(self),
+                    local_addr=("0.0.0.0", port),
+                    reuse_port=True,
+                )
+            except OSError as e:
+                _LOGGER.warning(
+                    "Unable to listen for discovery on port %d: %s", port, e
+                )
+                continue
+            self._transports.append(transport)
+        return bool(self._transports)
+
+    @callback
+    def stop(self, event=None):
+        """Stop listening."""
+        for transport in self._transports:
+            transport.close()
+        self._transports = []
+
+    @callback
+    def register(self, dev_id, listener):
+        """
+        Call listener with (ip, version) when the device is discovered at
+        a new address or with a new version, and straight away if it has
+        already been discovered.
+        """
+        self._listeners[dev_id] = listener
+        if dev_id in self._devices:
+            listener(*self._devices[dev_id])
+
+    @callback
+    def unregister(self, dev_id):
+        """Stop telling a device about changes."""
+        self._listeners.pop(dev_id, None)
+
+    @callback
+    def handle_datagram(self, data, addr):
+        try:
+            info = decode_discovery(data)
+        except TuyaProtocolError as e:
+            _LOGGER.debug("Undecodable discovery message from %s: %s", addr[0], e)
+            return
+        if not isinstance(info, dict) or "gwId" not in info:
+            return
+
+        dev_id = info["gwId"]
+        try:
+            version = float(info.get("version"))
+        except (TypeError, ValueError):
+            version = None
+        found = (info.get("ip", addr[0]), version)
+        if self._devices.get(dev_id) == found:
+            return
+
+        _LOGGER.debug("Discovered %s at %s, protocol %s", dev_id, *found)
+        self._devices[dev_id] = found
+        listener = self._listeners.get(dev_id)
+        if listener is not None:
+            listener(*found)
+
+
+async def async_start_discovery(hass: HomeAssistant):
+    """
+    Start the discovery listener shared by all devices, if not already
+    started.  Returns the listener, or None if it could not be started.
+    """
+    if DATA_DISCOVERY not in hass.data:
+        discovery = TuyaDiscovery()
+        hass.data[DATA_DISCOVERY] = discovery
+        if await discovery.async_start(hass.loop):
+            hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, discovery.stop)
+        else:
+            hass.data[DATA_DISCOVERY] = None
+    return hass.data[DATA_DISCOVERY]
+
+
+@callback
+def stop_discovery(hass: HomeAssistant):
+    """Stop the discovery listener, once no devices are left to use it."""
+    discovery = hass.data.pop(DATA_DISCOVERY, None)
+    if discovery is not None:
+        discovery.stop()
@@ -0,0 +1,378 @@
+"""
+Sub-devices of Tuya gateways, sharing the gateway's connection.
+"""
+
+import asyncio
+import logging
+
+from homeassistant.const import CONF_HOST, CONF_NAME
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .connection import TuyaConnection
+from .const import (
+    API_PROTOCOL_VERSIONS,
+    CONF_CID,
+    CONF_DEVICE_ID,
+    CONF_GATEWAY_ID,
+    CONF_LOCAL_KEY,
+    CONF_TYPE,
+    DOMAIN,
+    GATEWAY_CONCURRENCY,
+    PUSH_SAFETY_INTERVAL,
+)
+from .device import (
+    TuyaLocalDevice,
+    _protocol_version_saver,
+    _stored_protocol_version,
+    polling_options,
+)
+from .discovery import DATA_DISCOVERY
+from .protocol import TuyaCodec, TuyaProtocolError
+
+_LOGGER = logging.getLogger(__name__)
+
+# hass.data key for the gateways shared by sub-devices
+DATA_GATEWAYS = f"{DOMAIN}_gateways"
+
+
+class TuyaLocalGateway:
+    """
+    A Tuya gateway, such as a Zigbee or BLE hub, that its sub-devices are
+    reached through.
+
+    Gateways only accept a single connection, so the gateway keeps one
+    persistent connection that all of its sub-devices share, addressing
+    their requests by cid.  Status updates pushed by the gateway are passed
+    to the sub-device they came from.  The protocol version is negotiated
+    with the gateway through the requests of its sub-devices.  Instead of each sub-device polling
+    on its own schedule, the gateway polls all of them together in one
+    cycle, with at most GATEWAY_CONCURRENCY status queries in flight at
+    once.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        name,
+        dev_id,
+        address,
+        local_key,
+        protocol_version=None,
+        on_close=None,
+        persist=True,
+        on_protocol_version=None,
+    ):
+        """
+        Args:
+            dev_id (str): The device id of the gateway.
+            address (str): The network address of the gateway.
+            local_key (str): The encryption key of the gateway.
+            protocol_version (float): The protocol version previously
+                negotiated with the gateway, if known.
+            on_close (callable): Called when the last sub-device is removed
+                and the gateway has been closed.
+            persist (bool): Keep a persistent connection open to the gateway.
+            on_protocol_version (callable): Called with the protocol version
+                when a different one is negotiated with the gateway.
+        """
+        self._hass = hass
+        self._name = name
+        self._dev_id = dev_id
+        self._on_protocol_version = on_protocol_version
+        if protocol_version in API_PROTOCOL_VERSIONS:
+            self._negotiated = protocol_version
+        else:
+            self._negotiated = None
+            protocol_version = API_PROTOCOL_VERSIONS[0]
+        self.codec = TuyaCodec(dev_id, local_key, protocol_version)
+        self.connection = TuyaConnection(
+            self.codec, address, name, persist, self._handle_pushed_status
+        )
+        self._on_close = on_close
+        self._children = {}
+        self._polling = set()
+        self._poll = None
+        self._queries = asyncio.Semaphore(GATEWAY_CONCURRENCY)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def children(self):
+        """Return a dict of cid to the sub-devices of the gateway."""
+        return dict(self._children)
+
+    @callback
+    def add_child(self, cid, device):
+        """Route status updates for cid to the given sub-device."""
+        self._children[cid] = device
+
+    @callback
+    def remove_child(self, cid):
+        """Stop routing to a sub-device, closing the gateway after the last."""
+        self._children.pop(cid, None)
+        self.stop_polling(cid)
+        if not self._children:
+            self.close()
+
+    @callback
+    def start_polling(self, cid):
+        """Include a sub-device in the poll cycle."""
+        self._polling.add(cid)
+        if self._poll is None:
+            self._poll = async_track_time_interval(
+                self._hass, self._async_poll_children, PUSH_SAFETY_INTERVAL
+            )
+            self._hass.async_create_task(self._async_poll_children())
+
+    @callback
+    def stop_polling(self, cid):
+        """Leave a sub-device out of the poll cycle."""
+        self._polling.discard(cid)
+        if not self._polling and self._poll is not None:
+            self._poll()
+            self._poll = None
+
+    async def async_status(self, cid):
+        """Query a sub-device for its status."""
+        async with self._queries:
+            return await self.connection.async_status(cid)
+
+    @callback
+    def update_from_discovery(self, address, version):
+        """Use the address and protocol version the gateway broadcast."""
+        if address != self.connection.host:
+            _LOGGER.info("%s has moved to %s", self._name, address)
+            self.connection.update_host(address)
+        if version in API_PROTOCOL_VERSIONS and version != self.codec.version:
+            self.codec.version = version
+            self.record_protocol_version()
+
+    def should_rotate_protocol_version(self, error):
+        """
+        Return True if a failure suggests the wrong protocol version is in
+        use.  As with other devices, until a version has been negotiated
+        any failure could be caused by the version, and after that only
+        messages that could not be decoded.
+        """
+        if self._negotiated is None:
+            return True
+        return isinstance(error, TuyaProtocolError)
+
+    def rotate_protocol_version(self, failed_version):
+        """
+        Move on from a protocol version that failed, unless another
+        sub-device has already done so since it was used.
+        """
+        if self.codec.version != failed_version:
+            return
+        index = API_PROTOCOL_VERSIONS.index(failed_version) + 1
+        version = API_PROTOCOL_VERSIONS[index % len(API_PROTOCOL_VERSIONS)]
+        _LOGGER.info("Setting protocol version for %s to %s", self._name, version)
+        self.codec.version = version
+
+    def record_protocol_version(self):
+        """Remember the protocol version that the gateway responded to."""
+        version = self.codec.version
+        if version == self._negotiated:
+            return
+        _LOGGER.info("Negotiated protocol version %s with %s", version, self._name)
+        self._negotiated = version
+        if self._on_protocol_version is not None:
+            self._on_protocol_version(version)
+
+    def close(self):
+        """Close the connection to the gateway."""
+        self._polling.clear()
+        if self._poll is not None:
+            self._poll()
+            self._poll = None
+        self.connection.close()
+        if self._on_close is not None:
+            self._on_close()
+            self._on_close = None
+
+    async def _async_poll_children(self, now=None):
+        children = [self._children[c] for c in self._polling if c in self._children]
+        _LOGGER.debug("%s: polling %d sub-devices", self._name, len(children))
+        await asyncio.gather(*(child.async_gateway_poll() for child in children))
+
+    @callback
+    def _handle_pushed_status(self, dps, cid=None):
+        child = self._children.get(cid)
+        if child is None:
+            _LOGGER.debug("%s: status for unknown sub-device %s", self._name, cid)
+            return
+        child._handle_pushed_status(dps)
+
+
+class _SubDeviceConnection:
+    """The part of a gateway's connection used by one sub-device."""
+
+    persistent = True
+
+    def __init__(self, gateway: TuyaLocalGateway, cid):
+        self._gateway = gateway
+        self._cid = cid
+        # The protocol version of the last request, for when it fails.
+        self.version_used = gateway.codec.version
+
+    @property
+    def host(self):
+        return self._gateway.connection.host
+
+    @property
+    def bytes_sent(self):
+        return self._gateway.connection.bytes_sent
+
+    @property
+    def bytes_received(self):
+        return self._gateway.connection.bytes_received
+
+    async def async_status(self):
+        self.version_used = self._gateway.codec.version
+        return await self._gateway.async_status(self._cid)
+
+    async def async_control(self, dps):
+        self.version_used = self._gateway.codec.version
+        return await self._gateway.connection.async_control(dps, self._cid)
+
+    async def async_update_dps(self, dps_ids):
+        self.version_used = self._gateway.codec.version
+        return await self._gateway.connection.async_update_dps(dps_ids, self._cid)
+
+    async def async_probe(self):
+        self.version_used = self._gateway.codec.version
+        await self._gateway.connection.async_probe()
+
+    def update_host(self, host):
+        # Sub-devices are reached at the gateway's address.
+        pass
+
+    def close(self):
+        self._gateway.remove_child(self._cid)
+
+
+class TuyaLocalSubDevice(TuyaLocalDevice):
+    """
+    A device behind a Tuya gateway, identified to the gateway by its cid.
+
+    Sub-devices use the same device configs as other devices, but talk to
+    the device through the gateway's connection, and are polled by the
+    gateway together with its other sub-devices.  The protocol version is
+    that of the gateway, which is negotiated through the requests of all
+    of its sub-devices.
+
+    Traffic statistics are those of the whole gateway connection.
+    """
+
+    def __init__(self, name, dev_id, gateway: TuyaLocalGateway, cid, hass, **kwargs):
+        """
+        Args:
+            dev_id (str): The device id of the sub-device.
+            gateway (TuyaLocalGateway): The gateway the device is behind.
+            cid (str): The node id of the device on the gateway.
+        """
+        self._gateway = gateway
+        self._cid = cid
+        super().__init__(
+            name,
+            dev_id,
+            gateway.connection.host,
+            None,
+            hass,
+            persist=True,
+            protocol_version=gateway.codec.version,
+            **kwargs,
+        )
+        gateway.add_child(cid, self)
+
+    @property
+    def cid(self):
+        return self._cid
+
+    def _create_connection(self, address, local_key, persist):
+        return self._gateway.codec, _SubDeviceConnection(self._gateway, self._cid)
+
+    def _should_rotate_api_protocol_version(self, error):
+        # The version is shared with the gateway's other sub-devices.
+        return self._gateway.should_rotate_protocol_version(error)
+
+    def _rotate_api_protocol_version(self):
+        self._gateway.rotate_protocol_version(self._connection.version_used)
+
+    def _record_api_protocol_version(self):
+        self._gateway.record_protocol_version()
+
+    @callback
+    def register_entity(self, entity):
+        """Register an entity to be updated when the state changes."""
+        self._entities.append(entity)
+        self._gateway.start_polling(self._cid)
+        self._update_fast_polling()
+
+    @callback
+    def unregister_entity(self, entity):
+        """Stop updating an entity when the state changes."""
+        if entity in self._entities:
+            self._entities.remove(entity)
+        if not self._entities:
+            self._gateway.stop_polling(self._cid)
+        self._update_fast_polling()
+
+    async def async_gateway_poll(self):
+        """Poll the device as part of the gateway's poll cycle."""
+        await self._async_safety_poll()
+
+
+def get_gateway(hass: HomeAssistant, config: dict):
+    """Return the gateway for a sub-device config, creating it if needed."""
+    gateways = hass.data.setdefault(DATA_GATEWAYS, {})
+    gateway_id = config[CONF_GATEWAY_ID]
+    gateway = gateways.get(gateway_id)
+    if gateway is None:
+        discovery = hass.data.get(DATA_DISCOVERY)
+
+        @callback
+        def closed():
+            gateways.pop(gateway_id, None)
+            if discovery is not None:
+                discovery.unregister(gateway_id)
+
+        gateway = TuyaLocalGateway(
+            hass,
+            gateway_id,
+            gateway_id,
+            config[CONF_HOST],
+            config[CONF_LOCAL_KEY],
+            _stored_protocol_version(hass, gateway_id),
+            closed,
+            on_protocol_version=_protocol_version_saver(hass, gateway_id),
+        )
+        gateways[gateway_id] = gateway
+        if discovery is not None:
+            discovery.register(gateway_id, gateway.update_from_discovery)
+    return gateway
+
+
+def setup_sub_device(hass: HomeAssistant, config: dict):
+    """Setup a sub-device of a gateway based on passed in config."""
+    _LOGGER.info(
+        "Creating sub-device %s of gateway %s",
+        config[CONF_DEVICE_ID],
+        config[CONF_GATEWAY_ID],
+    )
+    hass.data[DOMAIN] = hass.data.get(DOMAIN, {})
+    device = TuyaLocalSubDevice(
+        config[CONF_NAME],
+        config[CONF_DEVICE_ID],
+        get_gateway(hass, config),
+        config[CONF_CID],
+        hass,
+        **polling_options(config.get(CONF_TYPE)),
+    )
+    hass.data[DOMAIN][config[CONF_DEVICE_ID]] = {"device": device}
+
+    return device
@@ -9,7 +9,7 @@ import logging
 
 from ..device import TuyaLocalDevice
 from ..helpers.device_config import TuyaEntityConfig
-from ..helpers.mixin import TuyaLocalEntity
+from ..helpers.mixin import TuyaLocalEntity, memoized_property
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -43,7 +43,7 @@ class TuyaLocalBinarySensor(TuyaLocalEntity, BinarySensorEntity):
                 )
             return None
 
-    @property
+    @memoized_property
     def is_on(self):
         """Return true if the binary sensor is on."""
         return self._sensor_dps.get_value(self._device)
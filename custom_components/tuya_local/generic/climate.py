@@ -39,7 +39,7 @@ from homeassistant.const import (
 
 from ..device import TuyaLocalDevice
 from ..helpers.device_config import TuyaEntityConfig
-from ..helpers.mixin import TuyaLocalEntity, unit_from_ascii
+from ..helpers.mixin import TuyaLocalEntity, memoized_property, unit_from_ascii
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -103,7 +103,7 @@ class TuyaLocalClimate(TuyaLocalEntity, ClimateEntity):
         """Return the features supported by this climate device."""
         return self._support_flags
 
-    @property
+    @memoized_property
     def temperature_unit(self):
         """Return the unit of measurement."""
         # If there is a separate DPS that returns the units, use that
@@ -120,28 +120,28 @@ class TuyaLocalClimate(TuyaLocalEntity, ClimateEntity):
         # Return the default unit from the device
         return self._device.temperature_unit
 
-    @property
+    @memoized_property
     def target_temperature(self):
         """Return the currently set target temperature."""
         if self._temperature_dps is None:
             raise NotImplementedError()
         return self._temperature_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def target_temperature_high(self):
         """Return the currently set high target temperature."""
         if self._temp_high_dps is None:
             raise NotImplementedError()
         return self._temp_high_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def target_temperature_low(self):
         """Return the currently set low target temperature."""
         if self._temp_low_dps is None:
             raise NotImplementedError()
         return self._temp_low_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def target_temperature_step(self):
         """Return the supported step of target temperature."""
         dps = self._temperature_dps
@@ -153,7 +153,7 @@ class TuyaLocalClimate(TuyaLocalEntity, ClimateEntity):
             return 1
         return dps.step(self._device)
 
-    @property
+    @memoized_property
     def min_temp(self):
         """Return the minimum supported target temperature."""
         # if a separate min_temperature dps is specified, the device tells us.
@@ -168,7 +168,7 @@ class TuyaLocalClimate(TuyaLocalEntity, ClimateEntity):
             r = self._temperature_dps.range(self._device)
         return DEFAULT_MIN_TEMP if r is None else r["min"]
 
-    @property
+    @memoized_property
     def max_temp(self):
         """Return the maximum supported target temperature."""
         # if a separate max_temperature dps is specified, the device tells us.
@@ -210,21 +210,21 @@ class TuyaLocalClimate(TuyaLocalEntity, ClimateEntity):
         if dps_map:
             await self._device.async_set_properties(dps_map)
 
-    @property
+    @memoized_property
     def current_temperature(self):
         """Return the current measured temperature."""
         if self._current_temperature_dps is None:
             return None
         return self._current_temperature_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def target_humidity(self):
         """Return the currently set target humidity."""
         if self._humidity_dps is None:
             raise NotImplementedError()
         return self._humidity_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def min_humidity(self):
         """Return the minimum supported target humidity."""
         if self._humidity_dps is None:
@@ -232,7 +232,7 @@ class TuyaLocalClimate(TuyaLocalEntity, ClimateEntity):
         r = self._humidity_dps.range(self._device)
         return DEFAULT_MIN_HUMIDITY if r is None else r["min"]
 
-    @property
+    @memoized_property
     def max_humidity(self):
         """Return the maximum supported target humidity."""
         if self._humidity_dps is None:
@@ -246,21 +246,21 @@ class TuyaLocalClimate(TuyaLocalEntity, ClimateEntity):
 
         await self._humidity_dps.async_set_value(self._device, humidity)
 
-    @property
+    @memoized_property
     def current_humidity(self):
         """Return the current measured humidity."""
         if self._current_humidity_dps is None:
             return None
         return self._current_humidity_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def hvac_action(self):
         """Return the current HVAC action."""
         if self._hvac_action_dps is None:
             return None
         return self._hvac_action_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def hvac_mode(self):
         """Return current HVAC mode."""
         if self._hvac_mode_dps is None:
@@ -268,7 +268,7 @@ class TuyaLocalClimate(TuyaLocalEntity, ClimateEntity):
         hvac_mode = self._hvac_mode_dps.get_value(self._device)
         return STATE_UNAVAILABLE if hvac_mode is None else hvac_mode
 
-    @property
+    @memoized_property
     def hvac_modes(self):
         """Return available HVAC modes."""
         if self._hvac_mode_dps is None:
@@ -282,7 +282,7 @@ class TuyaLocalClimate(TuyaLocalEntity, ClimateEntity):
             raise NotImplementedError()
         await self._hvac_mode_dps.async_set_value(self._device, hvac_mode)
 
-    @property
+    @memoized_property
     def is_aux_heat(self):
         """Return state of aux heater"""
         if self._aux_heat_dps is None:
@@ -302,14 +302,14 @@ class TuyaLocalClimate(TuyaLocalEntity, ClimateEntity):
             raise NotImplementedError()
         await self._aux_heat_dps.async_set_value(self._device, False)
 
-    @property
+    @memoized_property
     def preset_mode(self):
         """Return the current preset mode."""
         if self._preset_mode_dps is None:
             raise NotImplementedError()
         return self._preset_mode_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def preset_modes(self):
         """Return the list of presets that this device supports."""
         if self._preset_mode_dps is None:
@@ -322,14 +322,14 @@ class TuyaLocalClimate(TuyaLocalEntity, ClimateEntity):
             raise NotImplementedError()
         await self._preset_mode_dps.async_set_value(self._device, preset_mode)
 
-    @property
+    @memoized_property
     def swing_mode(self):
         """Return the current swing mode."""
         if self._swing_mode_dps is None:
             raise NotImplementedError()
         return self._swing_mode_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def swing_modes(self):
         """Return the list of swing modes that this device supports."""
         if self._swing_mode_dps is None:
@@ -342,14 +342,14 @@ class TuyaLocalClimate(TuyaLocalEntity, ClimateEntity):
             raise NotImplementedError()
         await self._swing_mode_dps.async_set_value(self._device, swing_mode)
 
-    @property
+    @memoized_property
     def fan_mode(self):
         """Return the current fan mode."""
         if self._fan_mode_dps is None:
             raise NotImplementedError()
         return self._fan_mode_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def fan_modes(self):
         """Return the list of fan modes that this device supports."""
         if self._fan_mode_dps is None:
@@ -14,7 +14,7 @@ from homeassistant.components.cover import (
 
 from ..device import TuyaLocalDevice
 from ..helpers.device_config import TuyaEntityConfig
-from ..helpers.mixin import TuyaLocalEntity
+from ..helpers.mixin import TuyaLocalEntity, memoized_property
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -65,7 +65,7 @@ class TuyaLocalCover(TuyaLocalEntity, CoverEntity):
         """Inform HA of the supported features."""
         return self._support_flags
 
-    @property
+    @memoized_property
     def current_cover_position(self):
         """Return current position of cover."""
         if self._position_dps:
@@ -85,7 +85,7 @@ class TuyaLocalCover(TuyaLocalEntity, CoverEntity):
             else:
                 return 50
 
-    @property
+    @memoized_property
     def is_opening(self):
         """Return if the cover is opening or not."""
         # If dps is available to inform current action, use that
@@ -98,7 +98,7 @@ class TuyaLocalCover(TuyaLocalEntity, CoverEntity):
                 and self.current_cover_position != 100
             )
 
-    @property
+    @memoized_property
     def is_closing(self):
         """Return if the cover is closing or not."""
         # If dps is available to inform current action, use that
@@ -13,7 +13,7 @@ from homeassistant.components.fan import (
 
 from ..device import TuyaLocalDevice
 from ..helpers.device_config import TuyaEntityConfig
-from ..helpers.mixin import TuyaLocalEntity
+from ..helpers.mixin import TuyaLocalEntity, memoized_property
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -51,7 +51,7 @@ class TuyaLocalFan(TuyaLocalEntity, FanEntity):
         """Return the features supported by this climate device."""
         return self._support_flags
 
-    @property
+    @memoized_property
     def is_on(self):
         """Return whether the switch is on or not."""
         # If there is no switch, it is always on
@@ -71,14 +71,14 @@ class TuyaLocalFan(TuyaLocalEntity, FanEntity):
             raise NotImplementedError
         await self._switch_dps.async_set_value(self._device, False)
 
-    @property
+    @memoized_property
     def percentage(self):
         """Return the currently set percentage."""
         if self._speed_dps is None:
             return None
         return self._speed_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def percentage_step(self):
         """Return the step for percentage."""
         if self._speed_dps is None:
@@ -88,7 +88,7 @@ class TuyaLocalFan(TuyaLocalEntity, FanEntity):
         else:
             return 100 / len(self._speed_dps.values(self._device))
 
-    @property
+    @memoized_property
     def speed_count(self):
         """Return the number of speeds supported by the fan."""
         if self._speed_dps is None:
@@ -109,14 +109,14 @@ class TuyaLocalFan(TuyaLocalEntity, FanEntity):
 
         await self._speed_dps.async_set_value(self._device, percentage)
 
-    @property
+    @memoized_property
     def preset_mode(self):
         """Return the current preset mode."""
         if self._preset_dps is None:
             return None
         return self._preset_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def preset_modes(self):
         """Return the list of presets that this device supports."""
         if self._preset_dps is None:
@@ -129,7 +129,7 @@ class TuyaLocalFan(TuyaLocalEntity, FanEntity):
             raise NotImplementedError()
         await self._preset_dps.async_set_value(self._device, preset_mode)
 
-    @property
+    @memoized_property
     def current_direction(self):
         """Return the current direction [forward or reverse]."""
         if self._direction_dps is None:
@@ -142,7 +142,7 @@ class TuyaLocalFan(TuyaLocalEntity, FanEntity):
             raise NotImplementedError()
         await self._direction_dps.async_set_value(self._device, direction)
 
-    @property
+    @memoized_property
     def oscillating(self):
         """Return whether or not the fan is oscillating."""
         if self._oscillate_dps is None:
@@ -12,7 +12,7 @@ from homeassistant.components.humidifier.const import (
 
 from ..device import TuyaLocalDevice
 from ..helpers.device_config import TuyaEntityConfig
-from ..helpers.mixin import TuyaLocalEntity
+from ..helpers.mixin import TuyaLocalEntity, memoized_property
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -51,7 +51,7 @@ class TuyaLocalHumidifier(TuyaLocalEntity, HumidifierEntity):
             else HumidifierDeviceClass.HUMIDIFIER
         )
 
-    @property
+    @memoized_property
     def is_on(self):
         """Return whether the switch is on or not."""
         # If there is no switch, it is always on if available
@@ -67,14 +67,14 @@ class TuyaLocalHumidifier(TuyaLocalEntity, HumidifierEntity):
         """Turn the switch off"""
         await self._switch_dps.async_set_value(self._device, False)
 
-    @property
+    @memoized_property
     def target_humidity(self):
         """Return the currently set target humidity."""
         if self._humidity_dps is None:
             raise NotImplementedError()
         return self._humidity_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def min_humidity(self):
         """Return the minimum supported target humidity."""
         if self._humidity_dps is None:
@@ -82,7 +82,7 @@ class TuyaLocalHumidifier(TuyaLocalEntity, HumidifierEntity):
         r = self._humidity_dps.range(self._device)
         return DEFAULT_MIN_HUMIDITY if r is None else r["min"]
 
-    @property
+    @memoized_property
     def max_humidity(self):
         """Return the maximum supported target humidity."""
         if self._humidity_dps is None:
@@ -96,14 +96,14 @@ class TuyaLocalHumidifier(TuyaLocalEntity, HumidifierEntity):
 
         await self._humidity_dps.async_set_value(self._device, humidity)
 
-    @property
+    @memoized_property
     def mode(self):
         """Return the current preset mode."""
         if self._mode_dps is None:
             raise NotImplementedError()
         return self._mode_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def available_modes(self):
         """Return the list of presets that this device supports."""
         if self._mode_dps is None:
@@ -26,7 +26,7 @@ from struct import pack, unpack
 
 from ..device import TuyaLocalDevice
 from ..helpers.device_config import TuyaEntityConfig
-from ..helpers.mixin import TuyaLocalEntity
+from ..helpers.mixin import TuyaLocalEntity, memoized_property
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -50,7 +50,7 @@ class TuyaLocalLight(TuyaLocalEntity, LightEntity):
         self._effect_dps = dps_map.pop("effect", None)
         self._init_end(dps_map)
 
-    @property
+    @memoized_property
     def supported_color_modes(self):
         """Return the supported color modes for this light."""
         if self._color_mode_dps:
@@ -74,7 +74,7 @@ class TuyaLocalLight(TuyaLocalEntity, LightEntity):
         else:
             return 0
 
-    @property
+    @memoized_property
     def color_mode(self):
         """Return the color mode of the light"""
         if self._color_mode_dps:
@@ -93,7 +93,7 @@ class TuyaLocalLight(TuyaLocalEntity, LightEntity):
         else:
             return COLOR_MODE_UNKNOWN
 
-    @property
+    @memoized_property
     def color_temp(self):
         """Return the color temperature in mireds"""
         if self._color_temp_dps:
@@ -104,7 +104,7 @@ class TuyaLocalLight(TuyaLocalEntity, LightEntity):
             else:
                 return unscaled
 
-    @property
+    @memoized_property
     def is_on(self):
         """Return the current state."""
         if self._switch_dps:
@@ -117,13 +117,13 @@ class TuyaLocalLight(TuyaLocalEntity, LightEntity):
             # assume always on if they are responding
             return self.available
 
-    @property
+    @memoized_property
     def brightness(self):
         """Get the current brightness of the light"""
         if self._brightness_dps:
             return self._brightness_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def rgbw_color(self):
         """Get the current RGBW color of the light"""
         if self._rgbhsv_dps:
@@ -165,7 +165,7 @@ class TuyaLocalLight(TuyaLocalEntity, LightEntity):
                 w = rgbhsv["v"]
                 return (r, g, b, w)
 
-    @property
+    @memoized_property
     def effect_list(self):
         """Return the list of valid effects for the light"""
         if self._effect_dps:
@@ -177,7 +177,7 @@ class TuyaLocalLight(TuyaLocalEntity, LightEntity):
                 if effect not in VALID_COLOR_MODES
             ]
 
-    @property
+    @memoized_property
     def effect(self):
         """Return the current effect setting of this light"""
         if self._effect_dps:
@@ -9,7 +9,7 @@ from homeassistant.const import STATE_UNAVAILABLE
 
 from ..device import TuyaLocalDevice
 from ..helpers.device_config import TuyaEntityConfig
-from ..helpers.mixin import TuyaLocalEntity
+from ..helpers.mixin import TuyaLocalEntity, memoized_property
 
 
 class TuyaLocalLock(TuyaLocalEntity, LockEntity):
@@ -26,7 +26,7 @@ class TuyaLocalLock(TuyaLocalEntity, LockEntity):
         self._lock_dps = dps_map.pop("lock")
         self._init_end(dps_map)
 
-    @property
+    @memoized_property
     def state(self):
         """Return the current state."""
         lock = self._lock_dps.get_value(self._device)
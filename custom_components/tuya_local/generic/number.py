@@ -9,7 +9,7 @@ from homeassistant.components.number.const import (
 
 from ..device import TuyaLocalDevice
 from ..helpers.device_config import TuyaEntityConfig
-from ..helpers.mixin import TuyaLocalEntity, unit_from_ascii
+from ..helpers.mixin import TuyaLocalEntity, memoized_property, unit_from_ascii
 
 MODE_AUTO = "auto"
 
@@ -33,21 +33,21 @@ class TuyaLocalNumber(TuyaLocalEntity, NumberEntity):
         self._max_dps = dps_map.pop("maximum", None)
         self._init_end(dps_map)
 
-    @property
+    @memoized_property
     def min_value(self):
         if self._min_dps is not None:
             return self._min_dps.get_value(self._device)
         r = self._value_dps.range(self._device)
         return DEFAULT_MIN_VALUE if r is None else r["min"]
 
-    @property
+    @memoized_property
     def max_value(self):
         if self._max_dps is not None:
             return self._max_dps.get_value(self._device)
         r = self._value_dps.range(self._device)
         return DEFAULT_MAX_VALUE if r is None else r["max"]
 
-    @property
+    @memoized_property
     def step(self):
         return self._value_dps.step(self._device)
 
@@ -59,7 +59,7 @@ class TuyaLocalNumber(TuyaLocalEntity, NumberEntity):
             m = MODE_AUTO
         return m
 
-    @property
+    @memoized_property
     def unit_of_measurement(self):
         """Return the unit associated with this number."""
         if self._unit_dps is None:
@@ -69,7 +69,7 @@ class TuyaLocalNumber(TuyaLocalEntity, NumberEntity):
 
         return unit_from_ascii(unit)
 
-    @property
+    @memoized_property
     def value(self):
         """Return the current value of the number."""
         return self._value_dps.get_value(self._device)
@@ -5,7 +5,7 @@ from homeassistant.components.select import SelectEntity
 
 from ..device import TuyaLocalDevice
 from ..helpers.device_config import TuyaEntityConfig
-from ..helpers.mixin import TuyaLocalEntity
+from ..helpers.mixin import TuyaLocalEntity, memoized_property
 
 
 class TuyaLocalSelect(TuyaLocalEntity, SelectEntity):
@@ -28,12 +28,12 @@ class TuyaLocalSelect(TuyaLocalEntity, SelectEntity):
             )
         self._init_end(dps_map)
 
-    @property
+    @memoized_property
     def options(self):
         "Return the list of possible options."
         return self._option_dps.values(self._device)
 
-    @property
+    @memoized_property
     def current_option(self):
         "Return the currently selected option"
         return self._option_dps.get_value(self._device)
@@ -4,13 +4,21 @@ Platform to read Tuya sensors.
 from homeassistant.components.sensor import (
     SensorDeviceClass,
     SensorEntity,
+    SensorStateClass,
     STATE_CLASSES,
 )
+from homeassistant.const import (
+    DATA_BYTES,
+    ENERGY_KILO_WATT_HOUR,
+    POWER_KILO_WATT,
+    TIME_MILLISECONDS,
+)
+from homeassistant.helpers.entity import EntityCategory
 import logging
 
 from ..device import TuyaLocalDevice
 from ..helpers.device_config import TuyaEntityConfig
-from ..helpers.mixin import TuyaLocalEntity, unit_from_ascii
+from ..helpers.mixin import TuyaLocalEntity, memoized_property, unit_from_ascii
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -53,12 +61,12 @@ class TuyaLocalSensor(TuyaLocalEntity, SensorEntity):
         else:
             return None
 
-    @property
+    @memoized_property
     def native_value(self):
         """Return the value reported by the sensor"""
         return self._sensor_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def native_unit_of_measurement(self):
         """Return the unit for the sensor"""
         if self._unit_dps is None:
@@ -67,3 +75,208 @@ class TuyaLocalSensor(TuyaLocalEntity, SensorEntity):
             unit = self._unit_dps.get_value(self._device)
 
         return unit_from_ascii(unit)
+
+    @memoized_property
+    def extra_state_attributes(self):
+        """
+        Get additional attributes, including the minimum, mean and maximum
+        readings over the last metering window for fast-changing sensors.
+        """
+        attr = super().extra_state_attributes
+        if not self._sensor_dps.fast:
+            return attr
+        meter = self._device.meter(self._sensor_dps.id)
+        if meter is not None and meter.summary is not None:
+            attr = {
+                **attr,
+                **{
+                    key: self._sensor_dps.map_value(value, self._device)
+                    for key, value in meter.summary.items()
+                },
+            }
+        return attr
+
+
+class TuyaLocalEnergySensor(TuyaLocalSensor):
+    """
+    The energy used by a device, integrated locally from the readings of a
+    fast-changing power sensor.  This starts from zero each time Home
+    Assistant is started, which the total_increasing state class allows
+    for.
+    """
+
+    _attr_device_class = SensorDeviceClass.ENERGY
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_native_unit_of_measurement = ENERGY_KILO_WATT_HOUR
+
+    def __init__(self, device: TuyaLocalDevice, config: TuyaEntityConfig):
+        """
+        Initialise the sensor.
+        Args:
+            device (TuyaLocalDevice): the device API instance.
+            config (TuyaEntityConfig): the configuration of the power sensor
+        """
+        super().__init__(device, config)
+        if not integrates_power(device, config):
+            raise AttributeError(f"{config.name} is not a metered power sensor")
+        self._meter = device.meter(self._sensor_dps.id)
+
+    @property
+    def name(self):
+        """Return the name for the UI."""
+        return f"{super().name} energy"
+
+    @property
+    def unique_id(self):
+        """Return the unique id for this entity."""
+        return f"{super().unique_id}_energy"
+
+    @property
+    def device_class(self):
+        return self._attr_device_class
+
+    @property
+    def state_class(self):
+        return self._attr_state_class
+
+    @property
+    def native_unit_of_measurement(self):
+        return self._attr_native_unit_of_measurement
+
+    @memoized_property
+    def native_value(self):
+        """Return the energy used since Home Assistant was started"""
+        energy = self._sensor_dps.map_value(self._meter.energy, self._device)
+        if self._sensor_dps.unit != POWER_KILO_WATT:
+            energy = energy / 1000
+        return round(energy, 3)
+
+    @property
+    def extra_state_attributes(self):
+        return {}
+
+
+def integrates_power(device: TuyaLocalDevice, config: TuyaEntityConfig):
+    """Return True if the energy used can be integrated from a power sensor."""
+    dps = config.find_dps("sensor")
+    if dps is None or not dps.fast or config.device_class != "power":
+        return False
+    meter = device.meter(dps.id)
+    return meter is not None and meter.integrates
+
+
+def _latency(key):
+    def value(stats):
+        mean = stats[key]["mean"]
+        return None if mean is None else round(mean * 1000)
+
+    return value
+
+
+# key, name, unit, state class and a function to get the value from the
+# device stats, for each diagnostic sensor.
+DIAGNOSTIC_SENSORS = (
+    (
+        "poll_latency",
+        "poll latency",
+        TIME_MILLISECONDS,
+        SensorStateClass.MEASUREMENT,
+        _latency("polls"),
+    ),
+    (
+        "command_latency",
+        "command latency",
+        TIME_MILLISECONDS,
+        SensorStateClass.MEASUREMENT,
+        _latency("commands"),
+    ),
+    (
+        "retries",
+        "retries",
+        None,
+        SensorStateClass.TOTAL_INCREASING,
+        lambda stats: stats["retries"],
+    ),
+    (
+        "failures",
+        "failures",
+        None,
+        SensorStateClass.TOTAL_INCREASING,
+        lambda stats: stats["failures"],
+    ),
+    (
+        "bytes_sent",
+        "bytes sent",
+        DATA_BYTES,
+        SensorStateClass.TOTAL_INCREASING,
+        lambda stats: stats["bytes_sent"],
+    ),
+    (
+        "bytes_received",
+        "bytes received",
+        DATA_BYTES,
+        SensorStateClass.TOTAL_INCREASING,
+        lambda stats: stats["bytes_received"],
+    ),
+    (
+        "coalesced_writes",
+        "coalesced writes",
+        None,
+        SensorStateClass.TOTAL_INCREASING,
+        lambda stats: stats["coalesced_writes"],
+    ),
+    (
+        "protocol_version",
+        "protocol version",
+        None,
+        None,
+        lambda stats: stats["protocol_version"],
+    ),
+)
+
+
+class TuyaLocalDiagnosticSensor(SensorEntity):
+    """A sensor reporting statistics about the connection to a device."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_should_poll = False
+    # The statistics change with every poll, not with particular dps.
+    dps_ids = None
+
+    def __init__(self, device: TuyaLocalDevice, key, name, unit, state_class, value):
+        """
+        Initialise the sensor.
+        Args:
+            device (TuyaLocalDevice): the device API instance.
+            key (str): the name of the statistic, used in the unique id.
+            value (callable): returns the value from the device stats.
+        """
+        self._device = device
+        self._value = value
+        self._attr_name = f"{device.name} {name}"
+        self._attr_unique_id = f"{device.unique_id}_{key}"
+        self._attr_native_unit_of_measurement = unit
+        self._attr_state_class = state_class
+
+    @property
+    def device_info(self):
+        """Return the device's information."""
+        return self._device.device_info
+
+    @property
+    def native_value(self):
+        """Return the statistic"""
+        return self._value(self._device.stats)
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        self._device.register_entity(self)
+
+    async def async_will_remove_from_hass(self):
+        self._device.unregister_entity(self)
+        await super().async_will_remove_from_hass()
+
+
+def diagnostic_sensors(device: TuyaLocalDevice):
+    """Return the diagnostic sensors for a device."""
+    return [TuyaLocalDiagnosticSensor(device, *args) for args in DIAGNOSTIC_SENSORS]
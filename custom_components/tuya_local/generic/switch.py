@@ -9,7 +9,7 @@ from homeassistant.const import STATE_UNAVAILABLE
 
 from ..device import TuyaLocalDevice
 from ..helpers.device_config import TuyaEntityConfig
-from ..helpers.mixin import TuyaLocalEntity
+from ..helpers.mixin import TuyaLocalEntity, memoized_property
 
 
 class TuyaLocalSwitch(TuyaLocalEntity, SwitchEntity):
@@ -35,7 +35,7 @@ class TuyaLocalSwitch(TuyaLocalEntity, SwitchEntity):
             else SwitchDeviceClass.SWITCH
         )
 
-    @property
+    @memoized_property
     def is_on(self):
         """Return whether the switch is on or not."""
         # if there is no switch, it is always on if available.
@@ -43,7 +43,7 @@ class TuyaLocalSwitch(TuyaLocalEntity, SwitchEntity):
             return self.available
         return self._switch_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def current_power_w(self):
         """Return the current power consumption in Watts."""
         if self._power_dps is None:
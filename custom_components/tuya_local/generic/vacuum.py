@@ -24,7 +24,7 @@ from homeassistant.components.vacuum import (
 )
 from ..device import TuyaLocalDevice
 from ..helpers.device_config import TuyaEntityConfig
-from ..helpers.mixin import TuyaLocalEntity
+from ..helpers.mixin import TuyaLocalEntity, memoized_property
 
 
 class TuyaLocalVacuum(TuyaLocalEntity, StateVacuumEntity):
@@ -51,7 +51,7 @@ class TuyaLocalVacuum(TuyaLocalEntity, StateVacuumEntity):
             raise AttributeError(f"{config.name} is missing a status dps")
         self._init_end(dps_map)
 
-    @property
+    @memoized_property
     def supported_features(self):
         """Return the features supported by this vacuum cleaner."""
         support = SUPPORT_STATE | SUPPORT_STATUS | SUPPORT_SEND_COMMAND
@@ -73,18 +73,18 @@ class TuyaLocalVacuum(TuyaLocalEntity, StateVacuumEntity):
             support |= SUPPORT_CLEAN_SPOT
         return support
 
-    @property
+    @memoized_property
     def battery_level(self):
         """Return the battery level of the vacuum cleaner."""
         if self._battery_dps:
             return self._battery_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def status(self):
         """Return the status of the vacuum cleaner."""
         return self._status_dps.get_value(self._device)
 
-    @property
+    @memoized_property
     def state(self):
         """Return the state of the vacuum cleaner."""
         status = self._status_dps.get_value(self._device)
@@ -157,13 +157,13 @@ class TuyaLocalVacuum(TuyaLocalEntity, StateVacuumEntity):
         ):
             await self._direction_dps.async_set_value(self._device, command)
 
-    @property
+    @memoized_property
     def fan_speed_list(self):
         """Return the list of fan speeds supported"""
         if self._fan_dps:
             return self._fan_dps.values(self._device)
 
-    @property
+    @memoized_property
     def fan_speed(self):
         """Return the current fan speed"""
         if self._fan_dps:
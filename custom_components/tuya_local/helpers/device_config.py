@@ -1,20 +1,39 @@
 """
 Config parser for Tuya Local devices.
 """
+import asyncio
 from base64 import b64decode, b64encode
-
+from datetime import timedelta
 from fnmatch import fnmatch
+import json
 import logging
-from os import walk
-from os.path import join, dirname, splitext, exists
+from os import remove, replace, stat, walk
+from os.path import basename, join, dirname, splitext
+from tempfile import NamedTemporaryFile
+from weakref import WeakSet
 
+from homeassistant.helpers.storage import STORAGE_DIR
 from homeassistant.util import slugify
 from homeassistant.util.yaml import load_yaml
 
 import custom_components.tuya_local.devices as config_dir
+from custom_components.tuya_local.const import (
+    DOMAIN,
+    FAST_POLL_INTERVAL,
+    MAX_POLL_INTERVAL,
+    MIN_POLL_INTERVAL,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+CONFIG_CACHE_FILE = "tuya_local.device_configs"
+_CONFIG_CACHE_VERSION = 1
+# hass.data key for the build of the index in progress
+DATA_CONFIG_INDEX = f"{DOMAIN}_config_index"
+
+# Index of parsed device configs, built on first use.
+_config_index = None
+
 
 def _typematch(type, value):
     # Workaround annoying legacy of bool being a subclass of int in Python
@@ -69,15 +88,23 @@ def _bytes_to_fmt(bytes, signed=False):
 class TuyaDeviceConfig:
     """Representation of a device config for Tuya Local devices."""
 
-    def __init__(self, fname):
+    def __init__(self, fname, config=None):
         """Initialize the device config.
         Args:
-            fname (string): The filename of the yaml config to load."""
-        _CONFIG_DIR = dirname(config_dir.__file__)
+            fname (string): The filename of the yaml config to load.
+            config (dict): The already parsed config, if available."""
         self._fname = fname
-        filename = join(_CONFIG_DIR, fname)
-        self._config = load_yaml(filename)
-        _LOGGER.debug("Loaded device config %s", fname)
+        if config is None:
+            _CONFIG_DIR = dirname(config_dir.__file__)
+            filename = join(_CONFIG_DIR, fname)
+            config = load_yaml(filename)
+            _LOGGER.debug("Loaded device config %s", fname)
+        self._config = config
+        self._primary = TuyaEntityConfig(self, config["primary_entity"], primary=True)
+        self._secondary = tuple(
+            TuyaEntityConfig(self, conf)
+            for conf in config.get("secondary_entities", {})
+        )
 
     @property
     def name(self):
@@ -99,15 +126,50 @@ class TuyaDeviceConfig:
         """Return the legacy conf_type associated with this device."""
         return self._config.get("legacy_type", self.config_type)
 
+    @property
+    def poll_interval(self):
+        """Return the minimum and maximum timedelta between polls."""
+        conf = self._config.get("poll_interval", {})
+        return (
+            timedelta(seconds=conf.get("min", MIN_POLL_INTERVAL.total_seconds())),
+            timedelta(seconds=conf.get("max", MAX_POLL_INTERVAL.total_seconds())),
+        )
+
+    @property
+    def fast_poll_interval(self):
+        """Return the timedelta between refreshes of fast-changing dps."""
+        conf = self._config.get("poll_interval", {})
+        return timedelta(seconds=conf.get("fast", FAST_POLL_INTERVAL.total_seconds()))
+
+    @property
+    def fast_dps_ids(self):
+        """Return the ids of the dps marked as fast-changing."""
+        entities = (self._primary, *self._secondary)
+        return frozenset(d.id for e in entities for d in e.dps() if d.fast)
+
+    @property
+    def energy_dps_ids(self):
+        """
+        Return the ids of the fast-changing dps of power sensors, which can
+        be integrated into the energy used.
+        """
+        entities = (self._primary, *self._secondary)
+        return frozenset(
+            d.id
+            for e in entities
+            if e.entity == "sensor" and e.device_class == "power"
+            for d in e.dps()
+            if d.fast and d.name == "sensor"
+        )
+
     @property
     def primary_entity(self):
         """Return the primary type of entity for this device."""
-        return TuyaEntityConfig(self, self._config["primary_entity"], primary=True)
+        return self._primary
 
     def secondary_entities(self):
         """Iterate through entites for any secondary entites supported."""
-        for conf in self._config.get("secondary_entities", {}):
-            yield TuyaEntityConfig(self, conf)
+        return iter(self._secondary)
 
     def matches(self, dps):
         """Determine if this device matches the provided dps map."""
@@ -161,14 +223,40 @@ class TuyaDeviceConfig:
 
         return round((total - len(keys)) * 100 / total)
 
+    @property
+    def dps_signature(self):
+        """
+        Return the set of (id, type) pairs for all dps used by this device.
+        Devices with the same signature match the same dps maps.
+        """
+        signature = set()
+        for e in [self.primary_entity, *self.secondary_entities()]:
+            for d in e.dps():
+                signature.add((d.id, d.type))
+        return frozenset(signature)
+
 
 class TuyaEntityConfig:
     """Representation of an entity config for a supported entity."""
 
+    __slots__ = (
+        "_device",
+        "_config",
+        "_is_primary",
+        "_dps",
+        "_dps_by_name",
+        "_dps_ids",
+    )
+
     def __init__(self, device, config, primary=False):
         self._device = device
         self._config = config
         self._is_primary = primary
+        self._dps = tuple(TuyaDpsConfig(self, d) for d in config["dps"])
+        self._dps_ids = frozenset(d.id for d in self._dps)
+        self._dps_by_name = {}
+        for d in self._dps:
+            self._dps_by_name.setdefault(d.name, d)
 
     def name(self, base_name):
         """The friendly name for this entity."""
@@ -244,43 +332,69 @@ class TuyaEntityConfig:
 
     def dps(self):
         """Iterate through the list of dps for this entity."""
-        for d in self._config["dps"]:
-            yield TuyaDpsConfig(self, d)
+        return iter(self._dps)
 
     def find_dps(self, name):
         """Find a dps with the specified name."""
-        for d in self.dps():
-            if d.name == name:
-                return d
-        return None
+        return self._dps_by_name.get(name)
+
+    @property
+    def dps_ids(self):
+        """
+        The ids of the dps this entity's state depends on.  Redirects,
+        mirrors and conditions only refer to dps within the same entity,
+        so these are the ids of all its dps.
+        """
+        return self._dps_ids
+
+
+_dps_types = {
+    "boolean": bool,
+    "integer": int,
+    "string": str,
+    "float": float,
+    "bitfield": int,
+    "json": str,
+    "base64": str,
+    "hex": str,
+}
 
 
 class TuyaDpsConfig:
     """Representation of a dps config."""
 
+    __slots__ = (
+        "_entity",
+        "_config",
+        "_id",
+        "_type",
+        "_format",
+        "_stringify",
+        "_dps_map",
+        "_mask_map",
+        "_value_map",
+        "_mirror_map",
+        "_default_map",
+    )
+
     def __init__(self, entity, config):
         self._entity = entity
         self._config = config
-        self.stringify = False
+        self._id = str(config["id"])
+        self._type = _dps_types.get(config["type"])
+        self._format = self._parse_format()
+        # Configs are shared between devices of the same type, so the
+        # devices whose last value read was a string are remembered.
+        self._stringify = WeakSet()
+        self._compile_mappings()
 
     @property
     def id(self):
-        return str(self._config["id"])
+        return self._id
 
     @property
     def type(self):
-        t = self._config["type"]
-        types = {
-            "boolean": bool,
-            "integer": int,
-            "string": str,
-            "float": float,
-            "bitfield": int,
-            "json": str,
-            "base64": str,
-            "hex": str,
-        }
-        return types.get(t)
+        return self._type
 
     @property
     def rawtype(self):
@@ -292,6 +406,9 @@ class TuyaDpsConfig:
 
     @property
     def format(self):
+        return self._format
+
+    def _parse_format(self):
         fmt = self._config.get("format")
         if fmt:
             unpack_fmt = ">"
@@ -311,7 +428,7 @@ class TuyaDpsConfig:
                 unpack_fmt = unpack_fmt + _bytes_to_fmt(b, mn < 0)
                 ranges.append({"min": mn, "max": mx})
                 names.append(name)
-            _LOGGER.debug(f"format of {unpack_fmt} found")
+            _LOGGER.debug("format of %s found", unpack_fmt)
             return {"format": unpack_fmt, "ranges": ranges, "names": names}
 
         return None
@@ -337,15 +454,47 @@ class TuyaDpsConfig:
         else:
             return v
 
-    def _match(self, matchdata, value):
-        """Return true val1 matches val2"""
-        if self.rawtype == "bitfield" and matchdata:
-            try:
-                return (int(value) & int(matchdata)) != 0
-            except (TypeError, ValueError):
-                return False
-        else:
-            return str(value) == str(matchdata)
+    def _compile_mappings(self):
+        """
+        Build lookup tables from the mapping list, so that the mapping for a
+        dps value or entity value can be found without scanning the list.
+        Entries in the tables record the mapping's position in the list,
+        so that the first match in the list can still be returned when
+        several would match.
+        """
+        # str(dps_val) -> (index, mapping)
+        self._dps_map = {}
+        # [(index, bitmask, mapping)] for bitfields
+        self._mask_map = []
+        # str(value) -> (index, mapping)
+        self._value_map = {}
+        # [(index, dps name, mapping)] for values mirrored from another dps,
+        # which can only be checked against the current device state
+        self._mirror_map = []
+        # The last mapping without a dps_val
+        self._default_map = None
+
+        for i, m in enumerate(self._config.get("mapping", {})):
+            if "dps_val" not in m:
+                self._default_map = m
+            elif self.rawtype == "bitfield" and m["dps_val"]:
+                try:
+                    self._mask_map.append((i, int(m["dps_val"]), m))
+                except (TypeError, ValueError):
+                    # Never matches, as the mask cannot be applied.
+                    pass
+            else:
+                self._dps_map.setdefault(str(m["dps_val"]), (i, m))
+
+            if "value" in m:
+                self._value_map.setdefault(str(m["value"]), (i, m))
+            elif "value_mirror" in m:
+                self._mirror_map.append((i, m["value_mirror"], m))
+            for c in m.get("conditions", {}):
+                if "value" in c:
+                    self._value_map.setdefault(str(c["value"]), (i, m))
+                elif "value_mirror" in c:
+                    self._mirror_map.append((i, c["value_mirror"], m))
 
     async def async_set_value(self, device, value):
         """Set the value of the dps in the given device to given value."""
@@ -361,7 +510,7 @@ class TuyaDpsConfig:
         """Return the possible values a dps can take."""
         if "mapping" not in self._config.keys():
             _LOGGER.debug(
-                f"No mapping for {self.name}, unable to determine valid values"
+                "No mapping for %s, unable to determine valid values", self.name
             )
             return None
         val = []
@@ -391,10 +540,12 @@ class TuyaDpsConfig:
                         c_val.append(r_dps.get_value(device))
                 # if given, the conditional mapping is an override
                 if c_val:
-                    _LOGGER.debug(f"Overriding {self.name} values {val} with {c_val}")
+                    _LOGGER.debug(
+                        "Overriding %s values %s with %s", self.name, val, c_val
+                    )
                     val = c_val
                     break
-        _LOGGER.debug(f"{self.name} values: {val}")
+        _LOGGER.debug("%s values: %s", self.name, val)
         return list(set(val)) if val else None
 
     def range(self, device, scaled=True):
@@ -402,7 +553,7 @@ class TuyaDpsConfig:
         mapping = self._find_map_for_dps(device.get_property(self.id))
         scale = 1
         if mapping:
-            _LOGGER.debug(f"Considering mapping for range of {self.name}")
+            _LOGGER.debug("Considering mapping for range of %s", self.name)
             if scaled:
                 scale = mapping.get("scale", scale)
             cond = self._active_condition(mapping, device)
@@ -410,14 +561,14 @@ class TuyaDpsConfig:
                 constraint = mapping.get("constraint")
                 if scaled:
                     scale = mapping.get("scale", scale)
-                _LOGGER.debug(f"Considering condition on {constraint}")
+                _LOGGER.debug("Considering condition on %s", constraint)
             r = None if cond is None else cond.get("range")
             if r and "min" in r and "max" in r:
-                _LOGGER.info(f"Conditional range returned for {self.name}")
+                _LOGGER.debug("Conditional range returned for %s", self.name)
                 return _scale_range(r, scale)
             r = mapping.get("range")
             if r and "min" in r and "max" in r:
-                _LOGGER.info(f"Mapped range returned for {self.name}")
+                _LOGGER.debug("Mapped range returned for %s", self.name)
                 return _scale_range(r, scale)
         r = self._config.get("range")
         if r and "min" in r and "max" in r:
@@ -430,23 +581,27 @@ class TuyaDpsConfig:
         scale = 1
         mapping = self._find_map_for_dps(device.get_property(self.id))
         if mapping:
-            _LOGGER.debug(f"Considering mapping for step of {self.name}")
+            _LOGGER.debug("Considering mapping for step of %s", self.name)
             step = mapping.get("step", 1)
             scale = mapping.get("scale", 1)
             cond = self._active_condition(mapping, device)
             if cond:
                 constraint = mapping.get("constraint")
-                _LOGGER.debug(f"Considering condition on {constraint}")
+                _LOGGER.debug("Considering condition on %s", constraint)
                 step = cond.get("step", step)
                 scale = cond.get("scale", scale)
         if step != 1 or scale != 1:
-            _LOGGER.info(f"Step for {self.name} is {step} with scale {scale}")
+            _LOGGER.debug("Step for %s is %s with scale %s", self.name, step, scale)
         return step / scale if scaled else step
 
     @property
     def readonly(self):
         return self._config.get("readonly", False)
 
+    def map_value(self, value, device):
+        """Return the value a raw value of the dps would be reported as."""
+        return self._map_from_dps(value, device)
+
     def invalid_for(self, value, device):
         mapping = self._find_map_for_value(value, device)
         if mapping:
@@ -459,6 +614,11 @@ class TuyaDpsConfig:
     def hidden(self):
         return self._config.get("hidden", False)
 
+    @property
+    def fast(self):
+        """Whether the dps changes often enough to be refreshed on its own."""
+        return self._config.get("fast", False)
+
     @property
     def unit(self):
         return self._config.get("unit")
@@ -469,23 +629,39 @@ class TuyaDpsConfig:
         return self._config.get("class")
 
     def _find_map_for_dps(self, value):
-        default = None
-        for m in self._config.get("mapping", {}):
-            if "dps_val" not in m:
-                default = m
-            elif self._match(m["dps_val"], value):
-                return m
-        return default
+        found = self._dps_map.get(str(value))
+        if self._mask_map:
+            try:
+                bits = int(value)
+            except (TypeError, ValueError):
+                bits = 0
+            for i, mask, m in self._mask_map:
+                if found is not None and i > found[0]:
+                    break
+                if bits & mask:
+                    return m
+
+        return self._default_map if found is None else found[1]
+
+    def _stringified(self, device):
+        """Return True if the last value read from device was a string."""
+        # Empty for most dps, and looking a device up creates a weakref.
+        return bool(self._stringify) and device in self._stringify
 
     def _map_from_dps(self, value, device):
+        stringify = False
         if value is not None and self.type is not str and isinstance(value, str):
             try:
                 value = self.type(value)
-                self.stringify = True
+                stringify = True
             except ValueError:
-                self.stringify = False
-        else:
-            self.stringify = False
+                pass
+        # Only updated when it changes, as this is read on every state write.
+        if stringify != self._stringified(device):
+            if stringify:
+                self._stringify.add(device)
+            else:
+                self._stringify.discard(device)
 
         result = value
 
@@ -515,7 +691,7 @@ class TuyaDpsConfig:
                         result = m.get("value", result)
 
             if redirect:
-                _LOGGER.debug(f"Redirecting {self.name} to {redirect}")
+                _LOGGER.debug("Redirecting %s to %s", self.name, redirect)
                 r_dps = self._entity.find_dps(redirect)
                 return r_dps.get_value(device)
             if mirror:
@@ -544,25 +720,15 @@ class TuyaDpsConfig:
         return result
 
     def _find_map_for_value(self, value, device):
-        default = None
-        for m in self._config.get("mapping", {}):
-            if "dps_val" not in m:
-                default = m
-            if "value" in m and str(m["value"]) == str(value):
+        found = self._value_map.get(str(value))
+        for i, mirror, m in self._mirror_map:
+            if found is not None and i >= found[0]:
+                break
+            r_dps = self._entity.find_dps(mirror)
+            if str(r_dps.get_value(device)) == str(value):
                 return m
-            if "value" not in m and "value_mirror" in m:
-                r_dps = self._entity.find_dps(m["value_mirror"])
-                if str(r_dps.get_value(device)) == str(value):
-                    return m
 
-            for c in m.get("conditions", {}):
-                if "value" in c and str(c["value"]) == str(value):
-                    return m
-                if "value" not in c and "value_mirror" in c:
-                    r_dps = self._entity.find_dps(c["value_mirror"])
-                    if str(r_dps.get_value(device)) == str(value):
-                        return m
-        return default
+        return self._default_map if found is None else found[1]
 
     def _active_condition(self, mapping, device, value=None):
         constraint = mapping.get("constraint")
@@ -627,7 +793,7 @@ class TuyaDpsConfig:
                 redirect = cond.get("value_redirect", redirect)
 
             if redirect:
-                _LOGGER.debug(f"Redirecting {self.name} to {redirect}")
+                _LOGGER.debug("Redirecting %s to %s", self.name, redirect)
                 r_dps = self._entity.find_dps(redirect)
                 return r_dps.get_values_to_set(device, value)
 
@@ -638,7 +804,7 @@ class TuyaDpsConfig:
                     replaced = True
 
             if scale != 1 and isinstance(result, (int, float)):
-                _LOGGER.debug(f"Scaling {result} by {scale}")
+                _LOGGER.debug("Scaling %s by %s", result, scale)
                 result = result * scale
                 remap = self._find_map_for_value(result, device)
                 if remap and "dps_val" in remap and "dps_val" not in mapping:
@@ -646,7 +812,7 @@ class TuyaDpsConfig:
                 replaced = True
 
             if step and isinstance(result, (int, float)):
-                _LOGGER.debug(f"Stepping {result} to {step}")
+                _LOGGER.debug("Stepping %s to %s", result, step)
                 result = step * round(float(result) / step)
                 remap = self._find_map_for_value(result, device)
                 if remap and "dps_val" in remap and "dps_val" not in mapping:
@@ -676,7 +842,7 @@ class TuyaDpsConfig:
                 )
 
         if self.type is int:
-            _LOGGER.debug(f"Rounding {self.name}")
+            _LOGGER.debug("Rounding %s", self.name)
             result = int(round(result))
         elif self.type is bool:
             result = True if result else False
@@ -685,7 +851,7 @@ class TuyaDpsConfig:
         elif self.type is str:
             result = str(result)
 
-        if self.stringify:
+        if self._stringified(device):
             result = str(result)
 
         dps_map[self.id] = result
@@ -716,25 +882,195 @@ def available_configs():
                 yield basename
 
 
+class DeviceConfigIndex:
+    """
+    Index of all available device configs.
+
+    For detection, an inverted index maps each (dps id, type) pair to the
+    signatures that require it, so the configs matching a dps map are found
+    by counting the pairs it satisfies rather than checking every config.
+    """
+
+    def __init__(self, configs):
+        """Initialize the index.
+        Args:
+            configs (list): TuyaDeviceConfigs, in the order to match them."""
+        self.configs = configs
+        self.by_config_type = {}
+        self.by_legacy_type = {}
+        self.by_signature = {}
+        for cfg in configs:
+            self.by_config_type[cfg.config_type] = cfg
+            # As in the original file scan, the first config wins when
+            # several share a legacy type.
+            self.by_legacy_type.setdefault(cfg.legacy_type, cfg)
+            self.by_signature.setdefault(cfg.dps_signature, []).append(cfg)
+        self._signatures = {
+            cfg.config_type: sig
+            for sig, cfgs in self.by_signature.items()
+            for cfg in cfgs
+        }
+        self._by_dps = {}
+        for sig in self.by_signature:
+            for pair in sig:
+                self._by_dps.setdefault(pair, []).append(sig)
+        self._types = {t for _, t in self._by_dps if t is not None}
+        self._unconditional = {sig for sig in self.by_signature if not sig}
+
+    def _matched_signatures(self, dps):
+        """Return the signatures that are fully satisfied by dps."""
+        counts = {}
+        for id, value in dps.items():
+            for t in self._types:
+                if _typematch(t, value):
+                    for sig in self._by_dps.get((id, t), ()):
+                        counts[sig] = counts.get(sig, 0) + 1
+        matched = {sig for sig, n in counts.items() if n == len(sig)}
+        return matched | self._unconditional
+
+    def possible_matches(self, dps):
+        """Return the configs that match dps, in the original file order."""
+        matched = self._matched_signatures(dps)
+        for cfg in self.configs:
+            if self._signatures[cfg.config_type] in matched:
+                _LOGGER.debug("Matched config for %s", cfg.name)
+                yield cfg
+
+    def ranked_matches(self, dps):
+        """
+        Return (config, match_quality) for the configs that match dps,
+        best match first.  Configs of equal quality remain in file order.
+        """
+        total = len([k for k in dps.keys() if k != "updated_at"])
+        ranked = []
+        for cfg in self.possible_matches(dps):
+            sig = self._signatures[cfg.config_type]
+            # All of a matched config's dps are present, so its quality
+            # is the proportion of the device's dps that it covers.
+            ids = len({id for id, _ in sig})
+            quality = round(ids * 100 / total) if total else 0
+            ranked.append((cfg, quality))
+        ranked.sort(key=lambda m: m[1], reverse=True)
+        return ranked
+
+
+def _load_config_cache(cache_file):
+    try:
+        with open(cache_file, encoding="utf-8") as f:
+            cache = json.load(f)
+        if cache.get("version") == _CONFIG_CACHE_VERSION:
+            return cache["files"]
+    except (OSError, ValueError, KeyError, AttributeError) as e:
+        _LOGGER.debug("Device config cache not used: %s", e)
+    return {}
+
+
+def _save_config_cache(cache_file, files):
+    tmp_file = None
+    try:
+        # Written to a temporary file of its own, so that a save cannot
+        # interfere with another one in progress.
+        with NamedTemporaryFile(
+            "w",
+            encoding="utf-8",
+            dir=dirname(cache_file),
+            prefix=basename(cache_file) + ".",
+            suffix=".tmp",
+            delete=False,
+        ) as f:
+            tmp_file = f.name
+            json.dump({"version": _CONFIG_CACHE_VERSION, "files": files}, f)
+        replace(tmp_file, cache_file)
+    except (OSError, TypeError, ValueError) as e:
+        _LOGGER.warning("Unable to save device config cache: %s", e)
+        if tmp_file is not None:
+            try:
+                remove(tmp_file)
+            except OSError:
+                pass
+
+
+def load_config_index(cache_file=None):
+    """
+    Parse all the available device configs into a new index.
+    If cache_file is given, parsed configs are reused from it unless the
+    config file has been modified since, and the cache is updated.
+    """
+    global _config_index
+
+    _CONFIG_DIR = dirname(config_dir.__file__)
+    cache = {} if cache_file is None else _load_config_cache(cache_file)
+    files = {}
+    configs = []
+    for fname in available_configs():
+        mtime = stat(join(_CONFIG_DIR, fname)).st_mtime
+        cached = cache.get(fname)
+        if cached and cached.get("mtime") == mtime:
+            cfg = TuyaDeviceConfig(fname, cached["config"])
+        else:
+            cfg = TuyaDeviceConfig(fname)
+        files[fname] = {"mtime": mtime, "config": cfg._config}
+        configs.append(cfg)
+
+    if cache_file is not None and files != cache:
+        _save_config_cache(cache_file, files)
+
+    _config_index = DeviceConfigIndex(configs)
+    return _config_index
+
+
+def config_index():
+    """Return the index of device configs, building it if needed."""
+    return _config_index or load_config_index()
+
+
+async def async_load_config_index(hass):
+    """
+    Build the device config index in the executor, if not already built.
+
+    Config entries are set up concurrently, so the first caller starts the
+    build, and the others wait for the same one to finish.
+    """
+    if _config_index is not None:
+        return
+    build = hass.data.get(DATA_CONFIG_INDEX)
+    if build is None:
+        build = hass.data[DATA_CONFIG_INDEX] = asyncio.ensure_future(
+            hass.async_add_executor_job(
+                load_config_index,
+                hass.config.path(STORAGE_DIR, CONFIG_CACHE_FILE),
+            )
+        )
+    try:
+        # Shielded so that one cancelled caller does not cancel the build
+        # for the others.
+        await asyncio.shield(build)
+    finally:
+        if build.done() and hass.data.get(DATA_CONFIG_INDEX) is build:
+            del hass.data[DATA_CONFIG_INDEX]
+
+
 def possible_matches(dps):
     """Return possible matching configs for a given set of dps values."""
-    for cfg in available_configs():
-        parsed = TuyaDeviceConfig(cfg)
-        if parsed.matches(dps):
-            yield parsed
+    return config_index().possible_matches(dps)
+
+
+def ranked_matches(dps):
+    """
+    Return (config, match_quality) for the configs matching a given set of
+    dps values, best match first.
+    """
+    return config_index().ranked_matches(dps)
 
 
 def get_config(conf_type):
     """
     Return a config to use with config_type.
     """
-    _CONFIG_DIR = dirname(config_dir.__file__)
-    fname = conf_type + ".yaml"
-    fpath = join(_CONFIG_DIR, fname)
-    if exists(fpath):
-        return TuyaDeviceConfig(fname)
-    else:
+    cfg = config_index().by_config_type.get(conf_type)
+    if cfg is None:
         return config_for_legacy_use(conf_type)
+    return cfg
 
 
 def config_for_legacy_use(conf_type):
@@ -744,9 +1080,4 @@ def config_for_legacy_use(conf_type):
     to be the correct config for the device, so only use it for looking up
     the legacy class during the transition period.
     """
-    for cfg in available_configs():
-        parsed = TuyaDeviceConfig(cfg)
-        if parsed.legacy_type == conf_type:
-            return parsed
-
-    return None
+    return config_index().by_legacy_type.get(conf_type)
@@ -2,6 +2,8 @@
 Mixins to make writing new platforms easier
 """
 import logging
+from functools import wraps
+
 from homeassistant.const import (
     AREA_SQUARE_METERS,
     CONCENTRATION_MICROGRAMS_PER_CUBIC_METER,
@@ -12,6 +14,27 @@ from homeassistant.helpers.entity import EntityCategory
 
 _LOGGER = logging.getLogger(__name__)
 
+_MISSING = object()
+
+
+def memoized_property(func):
+    """
+    A property of an entity that is computed at most once for each version
+    of the device state, as HA reads many properties on every state write,
+    and many of them walk the mapping rules of the device config.
+    """
+    key = func.__name__
+
+    @wraps(func)
+    def getter(self):
+        memo = self._memo()
+        value = memo.get(key, _MISSING)
+        if value is _MISSING:
+            value = memo[key] = func(self)
+        return value
+
+    return property(getter)
+
 
 class TuyaLocalEntity:
     """Common functions for all entity types."""
@@ -20,6 +43,8 @@ class TuyaLocalEntity:
         self._device = device
         self._config = config
         self._attr_dps = []
+        self._memo_version = None
+        self._memo_values = {}
         return {c.name: c for c in config.dps()}
 
     def _init_end(self, dps):
@@ -27,13 +52,28 @@ class TuyaLocalEntity:
             if not d.hidden:
                 self._attr_dps.append(d)
 
+    def _memo(self):
+        """Return the property values computed for the current state."""
+        version = self._device.state_version
+        if version != self._memo_version:
+            self._memo_version = version
+            self._memo_values = {}
+        return self._memo_values
+
     @property
     def should_poll(self):
-        return True
+        # The device schedules its own polls, and updates its entities when
+        # their dps change, whether polled, pushed or set by a command.
+        return False
+
+    @property
+    def dps_ids(self):
+        """Return the ids of the dps this entity's state depends on."""
+        return self._config.dps_ids
 
     @property
     def available(self):
-        return self._device.has_returned_state
+        return self._device.available
 
     @property
     def name(self):
@@ -59,7 +99,7 @@ class TuyaLocalEntity:
             else EntityCategory(self._config.entity_category)
         )
 
-    @property
+    @memoized_property
     def icon(self):
         """Return the icon to use in the frontend for this device."""
         icon = self._config.icon(self._device)
@@ -68,7 +108,7 @@ class TuyaLocalEntity:
         else:
             return super().icon
 
-    @property
+    @memoized_property
     def extra_state_attributes(self):
         """Get additional attributes that the platform itself does not support."""
         attr = {}
@@ -76,6 +116,14 @@ class TuyaLocalEntity:
             attr[a.name] = a.get_value(self._device)
         return attr
 
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        self._device.register_entity(self)
+
+    async def async_will_remove_from_hass(self):
+        self._device.unregister_entity(self)
+        await super().async_will_remove_from_hass()
+
     async def async_update(self):
         await self._device.async_refresh()
 
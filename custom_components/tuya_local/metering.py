@@ -0,0 +1,76 @@
+"""
+Aggregation of energy metering readings from Tuya Local devices.
+"""
+
+from math import inf
+
+
+class DpsMeter:
+    """
+    Samples of a metering dps, such as the power, current or voltage
+    reported by an energy monitoring plug, taken more often than the state
+    of its entities is written.
+
+    Samples are collected into windows of a fixed length, and the minimum,
+    mean and maximum of the last complete window are kept.  For power
+    readings, the samples are also integrated over time into the energy
+    used, in dps units multiplied by hours.  Samples further apart than
+    max_gap are not integrated, so that the time a device was unreachable
+    is not counted.
+
+    Values are the raw dps values, before any scaling in the device config.
+    """
+
+    def __init__(self, window, max_gap, integrate=False):
+        """
+        Args:
+            window (timedelta): The length of the aggregation windows.
+            max_gap (timedelta): The longest time between samples that
+                are integrated.
+            integrate (bool): Whether to integrate the samples into energy.
+        """
+        self._window = window.total_seconds()
+        self._max_gap = max_gap.total_seconds()
+        self.integrates = integrate
+        self.energy = 0
+        self.summary = None
+        self._last = None
+        self._reset(None)
+
+    def add(self, value, at):
+        """
+        Add a sample taken at the given time in seconds.  Returns True if
+        it completed a window, so that the summary has changed.
+        """
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return False
+        if self.integrates and self._last is not None:
+            last_at, last_value = self._last
+            elapsed = at - last_at
+            if 0 < elapsed <= self._max_gap:
+                # Trapezoidal rule, as readings change gradually.
+                self.energy += (last_value + value) / 2 * elapsed / 3600
+        self._last = (at, value)
+
+        if self._start is None:
+            self._start = at
+        self._count += 1
+        self._total += value
+        self._min = min(self._min, value)
+        self._max = max(self._max, value)
+        if at - self._start < self._window:
+            return False
+        self.summary = {
+            "min": self._min,
+            "mean": self._total / self._count,
+            "max": self._max,
+        }
+        self._reset(at)
+        return True
+
+    def _reset(self, start):
+        self._start = start
+        self._count = 0
+        self._total = 0
+        self._min = inf
+        self._max = -inf
@@ -0,0 +1,250 @@
+"""
+Encoding and decoding of the Tuya local protocol, versions 3.1 and 3.3,
+and of the discovery messages broadcast by devices.
+"""
+
+import binascii
+import json
+import logging
+import struct
+from base64 import b64decode, b64encode
+from collections import namedtuple
+from hashlib import md5
+from time import time
+
+from Crypto.Cipher import AES
+
+_LOGGER = logging.getLogger(__name__)
+
+CONTROL = 7
+STATUS = 8
+HEART_BEAT = 9
+DP_QUERY = 10
+CONTROL_NEW = 13
+UPDATEDPS = 18
+
+PREFIX_VALUE = 0x000055AA
+SUFFIX_VALUE = 0x0000AA55
+HEADER_FMT = ">4I"
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+RETCODE_SIZE = 4
+END_FMT = ">2I"
+END_SIZE = struct.calcsize(END_FMT)
+
+PROTOCOL_VERSION_BYTES_31 = b"3.1"
+PROTOCOL_VERSION_BYTES_33 = b"3.3"
+PROTOCOL_33_HEADER = PROTOCOL_VERSION_BYTES_33 + 12 * b"\x00"
+
+# Discovery broadcasts from protocol 3.3 devices are encrypted with a key
+# shared by all devices.
+UDP_KEY = md5(b"yGAdlopoPVldABfn").digest()
+
+# Commands that are not prefixed with the version header in protocol 3.3
+_NO_33_HEADER = (DP_QUERY, UPDATEDPS)
+
+# Payload templates for each command.  Devices with 22 character ids
+# ("device22") need CONTROL_NEW with a list of dps to answer a status
+# query, instead of DP_QUERY.
+_PAYLOADS = {
+    "default": {
+        CONTROL: ("devId", "uid", "t"),
+        STATUS: ("gwId", "devId"),
+        HEART_BEAT: ("gwId", "devId"),
+        DP_QUERY: ("gwId", "devId", "uid", "t"),
+        CONTROL_NEW: ("devId", "uid", "t"),
+        UPDATEDPS: (),
+    },
+    "device22": {
+        CONTROL: ("devId", "uid", "t"),
+        HEART_BEAT: ("gwId", "devId"),
+        DP_QUERY: ("devId", "uid", "t"),
+        UPDATEDPS: (),
+    },
+}
+
+TuyaMessage = namedtuple("TuyaMessage", "seqno cmd retcode payload")
+
+
+class TuyaProtocolError(Exception):
+    """A message from the device could not be verified or decoded."""
+
+
+def pack_message(seqno, cmd, payload):
+    """Frame a payload as a Tuya message, with header, CRC and suffix."""
+    buffer = (
+        struct.pack(HEADER_FMT, PREFIX_VALUE, seqno, cmd, len(payload) + END_SIZE)
+        + payload
+    )
+    return buffer + struct.pack(
+        END_FMT, binascii.crc32(buffer) & 0xFFFFFFFF, SUFFIX_VALUE
+    )
+
+
+def parse_header(header):
+    """Return the (seqno, cmd, length) from a message header."""
+    prefix, seqno, cmd, length = struct.unpack(HEADER_FMT, header)
+    if prefix != PREFIX_VALUE:
+        raise TuyaProtocolError(f"Bad message prefix {prefix:#x}")
+    return seqno, cmd, length
+
+
+def unpack_message(data):
+    """Unpack a complete message received from a device."""
+    seqno, cmd, _ = parse_header(data[:HEADER_SIZE])
+    crc, suffix = struct.unpack(END_FMT, data[-END_SIZE:])
+    if suffix != SUFFIX_VALUE:
+        raise TuyaProtocolError(f"Bad message suffix {suffix:#x}")
+    if crc != binascii.crc32(data[:-END_SIZE]) & 0xFFFFFFFF:
+        raise TuyaProtocolError("CRC mismatch")
+
+    payload = data[HEADER_SIZE:-END_SIZE]
+    retcode = 0
+    # Messages from devices normally start with a return code, but some
+    # unsolicited messages omit it.
+    if len(payload) >= RETCODE_SIZE:
+        (code,) = struct.unpack(">I", payload[:RETCODE_SIZE])
+        if not code & 0xFFFFFF00:
+            retcode = code
+            payload = payload[RETCODE_SIZE:]
+    return TuyaMessage(seqno, cmd, retcode, payload)
+
+
+def _pad(data):
+    padnum = AES.block_size - len(data) % AES.block_size
+    return data + bytes([padnum]) * padnum
+
+
+def _unpad(data):
+    if not data or data[-1] > AES.block_size:
+        raise TuyaProtocolError("Bad padding")
+    return data[: -data[-1]]
+
+
+class TuyaCodec:
+    """Encode requests to and decode responses from a single device."""
+
+    def __init__(self, dev_id, local_key, version=3.3):
+        self.dev_id = dev_id
+        self.local_key = local_key.encode("latin1")
+        self.version = version
+        self.dev_type = "default"
+        self.seqno = 0
+        self._aes = None
+
+    @property
+    def _cipher(self):
+        # Created on first use, so an invalid key is reported as a
+        # connection failure rather than preventing setup.
+        if self._aes is None:
+            self._aes = AES.new(self.local_key, AES.MODE_ECB)
+        return self._aes
+
+    def encrypt(self, data):
+        return self._cipher.encrypt(_pad(data))
+
+    def decrypt(self, data):
+        if len(data) % AES.block_size:
+            raise TuyaProtocolError("Encrypted payload is not block aligned")
+        return _unpad(self._cipher.decrypt(data))
+
+    def encode(self, cmd, data=None, cid=None):
+        """
+        Build a framed message for the given command.  When cid is given,
+        the message is addressed to that sub-device of a gateway.
+        """
+        template = _PAYLOADS[self.dev_type]
+        if cmd not in template:
+            raise ValueError(f"Command {cmd} not supported for {self.dev_type}")
+        fields = template[cmd]
+        if self.dev_type == "device22" and cmd == DP_QUERY:
+            cmd = CONTROL_NEW
+            data = {"1": None} if data is None else data
+
+        json_data = {}
+        for field in fields:
+            json_data[field] = str(int(time())) if field == "t" else self.dev_id
+        if cid is not None:
+            json_data["cid"] = cid
+        if data is not None:
+            json_data["dpId" if cmd == UPDATEDPS else "dps"] = data
+
+        payload = json.dumps(json_data, separators=(",", ":")).encode("utf-8")
+
+        if self.version == 3.3:
+            payload = self.encrypt(payload)
+            if cmd not in _NO_33_HEADER:
+                payload = PROTOCOL_33_HEADER + payload
+        elif cmd == CONTROL:
+            payload = b64encode(self.encrypt(payload))
+            digest = md5(
+                b"data="
+                + payload
+                + b"||lpv="
+                + PROTOCOL_VERSION_BYTES_31
+                + b"||"
+                + self.local_key
+            ).hexdigest()
+            payload = (
+                PROTOCOL_VERSION_BYTES_31 + digest[8:24].encode("latin1") + payload
+            )
+
+        message = pack_message(self.seqno, cmd, payload)
+        self.seqno += 1
+        return cmd, message
+
+    def decode(self, payload):
+        """
+        Decode the payload of a received message.
+
+        Returns the decoded json, or None for an empty acknowledgement.
+        Raises TuyaProtocolError if the payload cannot be decoded.
+        """
+        if not payload:
+            return None
+        try:
+            if payload.startswith(PROTOCOL_VERSION_BYTES_31):
+                # Skip the version header and 16 byte md5 signature
+                payload = self.decrypt(b64decode(payload[19:]))
+            elif self.version == 3.3:
+                if self.dev_type != "default" or payload.startswith(
+                    PROTOCOL_VERSION_BYTES_33
+                ):
+                    payload = payload[len(PROTOCOL_33_HEADER) :]
+                payload = self.decrypt(payload)
+            elif not payload.startswith(b"{"):
+                raise TuyaProtocolError(f"Unexpected payload {payload!r}")
+
+            text = payload.decode("utf-8")
+        except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+            raise TuyaProtocolError(f"Unable to decrypt payload: {e}") from e
+
+        if "data unvalid" in text and self.dev_type == "default":
+            _LOGGER.debug("%s: switching to device22 payloads", self.dev_id)
+            self.dev_type = "device22"
+            return None
+
+        try:
+            return json.loads(text)
+        except ValueError as e:
+            raise TuyaProtocolError(f"Invalid json payload {text!r}") from e
+
+
+def decode_discovery(data):
+    """
+    Decode a discovery message broadcast by a device.
+
+    Returns the decoded json, which includes the device's "gwId", "ip"
+    and protocol "version".  Raises TuyaProtocolError if the message
+    cannot be decoded.
+    """
+    if len(data) < HEADER_SIZE + END_SIZE:
+        raise TuyaProtocolError("Discovery message too short")
+    payload = unpack_message(data).payload
+    try:
+        if not payload.startswith(b"{"):
+            if len(payload) % AES.block_size:
+                raise TuyaProtocolError("Encrypted payload is not block aligned")
+            payload = _unpad(AES.new(UDP_KEY, AES.MODE_ECB).decrypt(payload))
+        return json.loads(payload.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise TuyaProtocolError(f"Invalid discovery message: {e}") from e
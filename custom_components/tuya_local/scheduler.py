@@ -0,0 +1,113 @@
+"""
+Adaptive polling of Tuya Local devices.
+"""
+
+import logging
+from random import uniform
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import (
+    MAX_POLL_INTERVAL,
+    MIN_POLL_INTERVAL,
+    POLL_JITTER,
+    SCAN_INTERVAL,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Factors applied to the poll interval after a poll that found changes,
+# and after one that did not.
+_SPEED_UP = 0.5
+_SLOW_DOWN = 1.5
+
+
+class PollScheduler:
+    """
+    Polls a device at an interval adapted to how often its state changes.
+
+    The interval is halved each time a poll finds that the state has
+    changed, and grows by half again each time it has not, limited to the
+    range between min_interval and max_interval.  So a device that is
+    changing is polled often, and one that is idle is left alone.
+
+    To avoid all devices being polled at the same moment, the first poll
+    is made at a random point within the minimum interval, and each
+    following poll is moved randomly by up to POLL_JITTER of the interval.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        name,
+        poll,
+        min_interval=MIN_POLL_INTERVAL,
+        max_interval=MAX_POLL_INTERVAL,
+    ):
+        """
+        Args:
+            name (str): The device name, for logging.
+            poll (coroutine function): Polls the device, returning True
+                if its state changed.
+            min_interval (timedelta): The shortest time between polls.
+            max_interval (timedelta): The longest time between polls.
+        """
+        self._hass = hass
+        self._name = name
+        self._poll = poll
+        self._min = min_interval.total_seconds()
+        self._max = max(max_interval.total_seconds(), self._min)
+        self._interval = min(max(SCAN_INTERVAL.total_seconds(), self._min), self._max)
+        self._handle = None
+        self._task = None
+
+    @property
+    def interval(self):
+        """Return the current poll interval in seconds."""
+        return self._interval
+
+    @property
+    def running(self):
+        """Return True if polls are being scheduled."""
+        return self._handle is not None or self._task is not None
+
+    @callback
+    def start(self):
+        """Start polling, if not already started."""
+        if not self.running:
+            self._schedule(uniform(0, self._min))
+
+    @callback
+    def stop(self):
+        """Stop polling."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def record(self, changed):
+        """Adapt the poll interval to whether the state changed."""
+        factor = _SPEED_UP if changed else _SLOW_DOWN
+        self._interval = min(max(self._interval * factor, self._min), self._max)
+
+    def _schedule(self, delay):
+        self._handle = self._hass.loop.call_later(delay, self._run)
+
+    @callback
+    def _run(self):
+        self._handle = None
+        self._task = self._hass.async_create_task(self._async_run())
+
+    async def _async_run(self):
+        try:
+            changed = await self._poll()
+        except Exception as e:
+            _LOGGER.debug("%s: scheduled poll failed: %s", self._name, e)
+            changed = False
+        self.record(changed)
+        self._task = None
+        jitter = uniform(-POLL_JITTER, POLL_JITTER) * self._interval
+        _LOGGER.debug("%s: next poll in %.1fs", self._name, self._interval + jitter)
+        self._schedule(self._interval + jitter)
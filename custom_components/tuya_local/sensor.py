@@ -6,9 +6,15 @@ import logging
 from . import DOMAIN
 from .const import (
     CONF_DEVICE_ID,
+    CONF_DIAGNOSTICS,
     CONF_TYPE,
 )
-from .generic.sensor import TuyaLocalSensor
+from .generic.sensor import (
+    TuyaLocalEnergySensor,
+    TuyaLocalSensor,
+    diagnostic_sensors,
+    integrates_power,
+)
 from .helpers.device_config import get_config
 
 _LOGGER = logging.getLogger(__name__)
@@ -30,6 +36,9 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
         if ecfg.deprecated:
             _LOGGER.warning(ecfg.deprecation_message)
         _LOGGER.debug(f"Adding sensor for {discovery_info[ecfg.config_id]}")
+        if integrates_power(device, ecfg):
+            sensors.append(TuyaLocalEnergySensor(device, ecfg))
+            _LOGGER.debug(f"Adding energy sensor for {ecfg.config_id}")
 
     for ecfg in cfg.secondary_entities():
         if ecfg.entity == "sensor" and discovery_info.get(ecfg.config_id, False):
@@ -38,6 +47,14 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
             if ecfg.deprecated:
                 _LOGGER.warning(ecfg.deprecation_message)
             _LOGGER.debug(f"Adding sensor for {discovery_info[ecfg.config_id]}")
+            if integrates_power(device, ecfg):
+                sensors.append(TuyaLocalEnergySensor(device, ecfg))
+                _LOGGER.debug(f"Adding energy sensor for {ecfg.config_id}")
+
+    if discovery_info.get(CONF_DIAGNOSTICS, False):
+        data[CONF_DIAGNOSTICS] = diagnostic_sensors(device)
+        sensors.extend(data[CONF_DIAGNOSTICS])
+        _LOGGER.debug(f"Adding diagnostic sensors for {device.name}")
 
     if not sensors:
         raise ValueError(f"{device.name} does not support use as a sensor device.")
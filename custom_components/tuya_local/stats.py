@@ -0,0 +1,71 @@
+"""
+Latency and traffic statistics for Tuya Local devices.
+"""
+
+from math import inf
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, inf)
+
+
+class LatencyHistogram:
+    """Counts of how long requests took, in fixed buckets."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @property
+    def mean(self):
+        """Return the mean latency in seconds, or None if nothing recorded."""
+        return self.total / self.count if self.count else None
+
+    def record(self, seconds):
+        """Add a request that took the given number of seconds."""
+        for i, bound in enumerate(self._buckets):
+            if seconds <= bound:
+                self._counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "max": self.max,
+            "buckets": {
+                str(bound): count for bound, count in zip(self._buckets, self._counts)
+            },
+        }
+
+
+class DeviceStats:
+    """
+    Counters kept for a device: how long status queries, refreshes of
+    selected dps and commands take, and how often requests are retried or
+    fail altogether.
+
+    Only counts are kept, so recording a request is cheap enough to do
+    for every one.
+    """
+
+    def __init__(self):
+        self.polls = LatencyHistogram()
+        self.partial_polls = LatencyHistogram()
+        self.commands = LatencyHistogram()
+        self.retries = 0
+        self.failures = 0
+
+    def as_dict(self):
+        return {
+            "polls": self.polls.as_dict(),
+            "partial_polls": self.partial_polls.as_dict(),
+            "commands": self.commands.as_dict(),
+            "retries": self.retries,
+            "failures": self.failures,
+        }
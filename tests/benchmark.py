@@ -0,0 +1,225 @@
+"""
+Benchmark the cost of evaluating device configs.
+
+Every device config is loaded and fed the payload used by its device test
+in tests/devices, then the time taken by get_value, get_values_to_set,
+icon, extra_state_attributes, match_quality and possible_matches is
+measured.  Results are written as JSON, so they can be compared between
+versions:
+
+    python -m tests.benchmark --output before.json
+    python -m tests.benchmark --compare before.json
+
+When comparing, the run fails if any device is slower than the baseline
+by more than the threshold factor.
+"""
+import argparse
+import json
+import platform
+import re
+import sys
+from os import listdir
+from os.path import dirname, join
+from statistics import median
+from time import perf_counter_ns
+
+from custom_components.tuya_local.helpers.device_config import (
+    available_configs,
+    possible_matches,
+    TuyaDeviceConfig,
+)
+
+from . import const
+from .devices.base_device_tests import DEVICE_TYPES
+
+TESTS_DIR = dirname(__file__)
+
+_SETUP_RE = re.compile(r'setUpForConfig\(\s*"([^"]+)",\s*(\w+)')
+
+OPERATIONS = (
+    "get_value",
+    "get_values_to_set",
+    "icon",
+    "extra_state_attributes",
+    "match_quality",
+    "possible_matches",
+)
+
+
+class BenchmarkDevice:
+    """A device that returns state from a payload, and ignores commands."""
+
+    def __init__(self, name, payload):
+        self.name = name
+        self.unique_id = name
+        self.device_info = {}
+        self.has_returned_state = True
+        self.available = True
+        self.push_enabled = False
+        self.dps = payload
+        self._version = 0
+
+    @property
+    def state_version(self):
+        # A new version for every read, so that entity properties are
+        # measured rather than returned from the memo.
+        self._version += 1
+        return self._version
+
+    def get_property(self, dps_id):
+        return self.dps.get(dps_id)
+
+    async def async_set_properties(self, dps_map):
+        pass
+
+
+def device_payloads():
+    """Return a map of config files to the payload used by their tests."""
+    payloads = {}
+    devices_dir = join(TESTS_DIR, "devices")
+    for fname in sorted(listdir(devices_dir)):
+        if not fname.endswith(".py"):
+            continue
+        with open(join(devices_dir, fname), encoding="utf-8") as f:
+            source = f.read()
+        for config_file, payload in _SETUP_RE.findall(source):
+            if hasattr(const, payload):
+                payloads.setdefault(config_file, payload)
+    return payloads
+
+
+def _time(func, iterations):
+    """Return the median time of func in microseconds."""
+    samples = []
+    for _ in range(iterations):
+        start = perf_counter_ns()
+        func()
+        samples.append(perf_counter_ns() - start)
+    return round(median(samples) / 1000, 2)
+
+
+def _set_all(device, entities):
+    for entity in entities:
+        for dps in entity.dps():
+            if dps.readonly:
+                continue
+            try:
+                dps.get_values_to_set(device, dps.get_value(device))
+            except (AttributeError, TypeError, ValueError):
+                # Some values cannot be set back, depending on state.
+                pass
+
+
+def _extra_state_attributes(objects):
+    for entity in objects:
+        entity.extra_state_attributes
+
+
+def benchmark_config(config_file, payload, iterations):
+    """Return the timings for a single device config."""
+    cfg = TuyaDeviceConfig(config_file)
+    device = BenchmarkDevice(cfg.name, dict(payload))
+    entities = [cfg.primary_entity, *cfg.secondary_entities()]
+    objects = []
+    for e in entities:
+        entity_class = DEVICE_TYPES.get(e.entity)
+        if entity_class:
+            objects.append(entity_class(device, e))
+    dps = {**payload, "updated_at": 0}
+
+    def get_values():
+        for e in entities:
+            for d in e.dps():
+                d.get_value(device)
+
+    def icons():
+        for e in entities:
+            e.icon(device)
+
+    return {
+        "get_value": _time(get_values, iterations),
+        "get_values_to_set": _time(lambda: _set_all(device, entities), iterations),
+        "icon": _time(icons, iterations),
+        "extra_state_attributes": _time(
+            lambda: _extra_state_attributes(objects), iterations
+        ),
+        "match_quality": _time(lambda: cfg.match_quality(dps), iterations),
+        "possible_matches": _time(lambda: list(possible_matches(dps)), iterations),
+    }
+
+
+def run(iterations, pattern=None):
+    """Run the benchmark, returning a report."""
+    payloads = device_payloads()
+    devices = {}
+    untested = []
+    for config_file in available_configs():
+        if pattern and not re.search(pattern, config_file):
+            continue
+        payload = payloads.get(config_file)
+        if payload is None:
+            untested.append(config_file)
+            continue
+        timings = benchmark_config(config_file, getattr(const, payload), iterations)
+        devices[config_file] = {"payload": payload, **timings}
+
+    totals = {op: round(sum(d[op] for d in devices.values()), 2) for op in OPERATIONS}
+    return {
+        "python": platform.python_version(),
+        "iterations": iterations,
+        "unit": "us",
+        "devices": devices,
+        "totals": totals,
+        "untested": untested,
+    }
+
+
+def compare(report, baseline, threshold):
+    """Return a list of regressions in report compared to baseline."""
+    regressions = []
+    for config_file, timings in report["devices"].items():
+        base = baseline.get("devices", {}).get(config_file)
+        if base is None:
+            continue
+        for op in OPERATIONS:
+            # Ignore differences in operations too quick to measure reliably
+            if op in base and timings[op] > max(base[op], 1) * threshold:
+                regressions.append(
+                    f"{config_file} {op}: {base[op]}us -> {timings[op]}us"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--filter", help="regex to select config files")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    parser.add_argument("--compare", help="baseline JSON report to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.5,
+        help="slowdown factor counted as a regression (default 1.5)",
+    )
+    args = parser.parse_args(argv)
+
+    report = run(args.iterations, args.filter)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for r in regressions:
+            print(f"Regression: {r}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
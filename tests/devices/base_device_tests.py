@@ -1,3 +1,4 @@
+from itertools import count
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import AsyncMock, patch, PropertyMock
 from uuid import uuid4
@@ -48,9 +49,14 @@ class TuyaDeviceTestCase(IsolatedAsyncioTestCase):
         self.mock_device = device_patcher.start()
         self.dps = payload.copy()
         self.mock_device.get_property.side_effect = lambda id: self.dps[id]
+        self.mock_device.meter.return_value = None
         cfg = TuyaDeviceConfig(config_file)
         self.conf_type = cfg.legacy_type
         type(self.mock_device).has_returned_state = PropertyMock(return_value=True)
+        type(self.mock_device).available = PropertyMock(return_value=True)
+        type(self.mock_device).push_enabled = PropertyMock(return_value=False)
+        # The tests change dps directly, so every read is a new state.
+        type(self.mock_device).state_version = PropertyMock(side_effect=count())
         type(self.mock_device).unique_id = PropertyMock(return_value=str(uuid4()))
         self.mock_device.name = cfg.name
 
@@ -87,7 +93,7 @@ class TuyaDeviceTestCase(IsolatedAsyncioTestCase):
 
     def test_should_poll(self):
         for e in self.entities.values():
-            self.assertTrue(e.should_poll)
+            self.assertFalse(e.should_poll)
 
     def test_available(self):
         for e in self.entities.values():
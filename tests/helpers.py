@@ -1,9 +1,18 @@
 from contextlib import asynccontextmanager
-from unittest.mock import AsyncMock
+from unittest.mock import DEFAULT, AsyncMock
 
 from custom_components.tuya_local.device import TuyaLocalDevice
 
 
+def close_coroutine(coro, *args, **kwargs):
+    """
+    Side effect for a mocked hass.async_create_task, that closes the
+    coroutine instead of running it, so it is not reported as never awaited.
+    """
+    coro.close()
+    return DEFAULT
+
+
 @asynccontextmanager
 async def assert_device_properties_set(device: TuyaLocalDevice, properties: dict):
     results = []
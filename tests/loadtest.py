@@ -0,0 +1,337 @@
+"""
+Load test the integration with a fleet of simulated devices.
+
+A number of simulated devices are started from one device config, and a
+config entry with all of its entities enabled is set up for each of them,
+as a user adding the devices would.  While the devices are polled, bursts
+of commands toggle the primary entity of every device at once, as a scene
+would.  The report gives the rate of status queries and dps refreshes the
+devices received, the latency of commands from the start of a burst until
+each device received it, the lag of the event loop, the use of the
+executor, and the memory used per device:
+
+    python -m tests.loadtest --devices 500 --duration 120 --output 500.json
+
+Runs with different numbers of devices show where the integration stops
+scaling, and runs before and after a change show whether it made that
+worse.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import sys
+import threading
+import tracemalloc
+from statistics import mean, quantiles
+from unittest.mock import patch
+
+from homeassistant import loader
+from homeassistant.const import CONF_HOST
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_test_home_assistant,
+)
+
+from custom_components.tuya_local.config_flow import ConfigFlowHandler
+from custom_components.tuya_local.connection import TuyaConnection
+from custom_components.tuya_local.const import (
+    CONF_DEVICE_ID,
+    CONF_LOCAL_KEY,
+    CONF_PERSIST,
+    CONF_TYPE,
+    DOMAIN,
+)
+from custom_components.tuya_local.helpers.device_config import TuyaDeviceConfig
+from custom_components.tuya_local.protocol import CONTROL, DP_QUERY, UPDATEDPS
+
+from .simulator import LOCAL_KEY, SimulatedDevice
+
+DEFAULT_CONFIG = "smartplugv2_energy.yaml"
+# Seconds to wait for every device to answer after setup, and to receive
+# the commands of a burst.
+SETUP_TIMEOUT = 60
+BURST_TIMEOUT = 10
+# Seconds between checks of the event loop lag.
+LAG_INTERVAL = 0.1
+
+
+def _fleet_connection(ports):
+    """
+    Return a factory for connections to the simulated devices, which all
+    listen on the loopback address, each on its own port.
+    """
+
+    def connect(codec, host, *args):
+        connection = TuyaConnection(codec, host, *args)
+        connection.port = ports[codec.dev_id]
+        return connection
+
+    return connect
+
+
+def _entry(dev_id, cfg, persist):
+    entities = (cfg.primary_entity, *cfg.secondary_entities())
+    return MockConfigEntry(
+        domain=DOMAIN,
+        version=ConfigFlowHandler.VERSION,
+        title=dev_id,
+        unique_id=dev_id,
+        data={
+            CONF_DEVICE_ID: dev_id,
+            CONF_HOST: "127.0.0.1",
+            CONF_LOCAL_KEY: LOCAL_KEY,
+            CONF_TYPE: cfg.config_type,
+        },
+        options={
+            **{e.config_id: True for e in entities},
+            CONF_PERSIST: persist,
+        },
+    )
+
+
+def _milliseconds(samples):
+    """Return percentiles of samples in seconds, in milliseconds."""
+    if len(samples) < 2:
+        samples = samples * 2 or [0, 0]
+    p = quantiles(samples, n=100)
+    return {
+        "mean": round(mean(samples) * 1000, 1),
+        "p50": round(p[49] * 1000, 1),
+        "p95": round(p[94] * 1000, 1),
+        "p99": round(p[98] * 1000, 1),
+        "max": round(max(samples) * 1000, 1),
+    }
+
+
+async def _async_until(condition, timeout):
+    """Wait until condition() is true, or timeout seconds have passed."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition() and loop.time() < deadline:
+        await asyncio.sleep(0.05)
+
+
+async def _async_monitor(lag, threads):
+    """Record how late the event loop wakes up, and the number of threads."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        lag.append(max(loop.time() - start - LAG_INTERVAL, 0))
+        threads.append(threading.active_count())
+
+
+async def async_load_test(
+    hass,
+    config_file=DEFAULT_CONFIG,
+    devices=10,
+    duration=60,
+    burst_interval=10,
+    latency=0,
+    loss=0,
+    persist=False,
+    update_interval=None,
+):
+    """
+    Run a load test against a fleet of simulated devices, returning a report.
+
+    The custom integrations of hass must be loadable, and it must be able
+    to open sockets on the loopback address.
+    """
+    loop = asyncio.get_running_loop()
+    cfg = TuyaDeviceConfig(config_file)
+    bursts = max(int(duration // burst_interval), 1)
+    received = {}
+
+    def request_handler(dev_id):
+        def on_request(cmd, request):
+            # Only the first command of each burst counts
+            if cmd == CONTROL and dev_id in received and received[dev_id] is None:
+                received[dev_id] = loop.time()
+
+        return on_request
+
+    simulators = {}
+    for i in range(devices):
+        dev_id = f"loadtest{i:04d}"
+        simulators[dev_id] = SimulatedDevice(
+            config_file,
+            dev_id,
+            latency=latency,
+            loss=loss,
+            seed=i,
+            on_request=request_handler(dev_id),
+        )
+        await simulators[dev_id].async_start()
+    ports = {dev_id: sim.port for dev_id, sim in simulators.items()}
+
+    executor_jobs = 0
+    add_executor_job = hass.async_add_executor_job
+
+    def count_executor_job(target, *args):
+        nonlocal executor_jobs
+        executor_jobs += 1
+        return add_executor_job(target, *args)
+
+    entries = [_entry(dev_id, cfg, persist) for dev_id in simulators]
+    with patch(
+        "custom_components.tuya_local.device.TuyaConnection",
+        _fleet_connection(ports),
+    ), patch.object(hass, "async_add_executor_job", count_executor_job):
+        try:
+            # Only the setup is traced, as tracing slows everything down.
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+            start = loop.time()
+            for entry in entries:
+                entry.add_to_hass(hass)
+                await hass.config_entries.async_setup(entry.entry_id)
+            await hass.async_block_till_done()
+            tuya_devices = [hass.data[DOMAIN][d]["device"] for d in simulators]
+            await _async_until(
+                lambda: all(d.has_returned_state for d in tuya_devices),
+                SETUP_TIMEOUT,
+            )
+            setup_time = loop.time() - start
+            memory = tracemalloc.get_traced_memory()[0] - baseline
+            tracemalloc.stop()
+
+            before = {d: sim.stats.copy() for d, sim in simulators.items()}
+            setup_executor_jobs = executor_jobs
+            lag = []
+            threads = []
+            monitor = asyncio.create_task(_async_monitor(lag, threads))
+            if update_interval:
+                for sim in simulators.values():
+                    sim.start_updates(update_interval)
+
+            domain = cfg.primary_entity.entity
+            entity_ids = hass.states.async_entity_ids(domain)
+            command_latency = []
+            commands_lost = 0
+            start = loop.time()
+            for _ in range(bursts):
+                burst_start = loop.time()
+                received.clear()
+                received.update({d: None for d in simulators})
+                await hass.services.async_call(
+                    domain, "toggle", {"entity_id": entity_ids}, blocking=True
+                )
+                await _async_until(lambda: None not in received.values(), BURST_TIMEOUT)
+                for at in received.values():
+                    if at is None:
+                        commands_lost += 1
+                    else:
+                        command_latency.append(at - burst_start)
+                await asyncio.sleep(max(burst_start + burst_interval - loop.time(), 0))
+            elapsed = loop.time() - start
+            monitor.cancel()
+            await asyncio.gather(monitor, return_exceptions=True)
+            received.clear()
+
+            stats = [d.stats for d in tuya_devices]
+            report = {
+                "python": platform.python_version(),
+                "config": config_file,
+                "devices": devices,
+                "persistent": persist,
+                "duration": round(elapsed, 1),
+                "setup_time": round(setup_time, 1),
+                "memory_per_device_kb": round(memory / devices / 1024, 1),
+                "status_queries_per_s": _rate(simulators, before, DP_QUERY, elapsed),
+                "dps_refreshes_per_s": _rate(simulators, before, UPDATEDPS, elapsed),
+                "bursts": bursts,
+                "commands": {
+                    "received": len(command_latency),
+                    "lost": commands_lost,
+                    "latency_ms": _milliseconds(command_latency),
+                },
+                "event_loop_lag_ms": _milliseconds(lag),
+                "executor": {
+                    "setup_jobs": setup_executor_jobs,
+                    "jobs": executor_jobs - setup_executor_jobs,
+                    "peak_threads": max(threads, default=threading.active_count()),
+                },
+                "retries": sum(s["retries"] for s in stats),
+                "failures": sum(s["failures"] for s in stats),
+            }
+        finally:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            for entry in entries:
+                await hass.config_entries.async_unload(entry.entry_id)
+            for sim in simulators.values():
+                await sim.async_close()
+    return report
+
+
+def _rate(simulators, before, cmd, elapsed):
+    total = sum(sim.stats[cmd] - before[d][cmd] for d, sim in simulators.items())
+    return round(total / elapsed, 2)
+
+
+async def _async_main(args):
+    hass = await async_test_home_assistant(asyncio.get_running_loop())
+    # Allow the integration to be loaded from custom_components
+    hass.data.pop(loader.DATA_CUSTOM_COMPONENTS, None)
+    try:
+        return await async_load_test(
+            hass,
+            args.config,
+            args.devices,
+            args.duration,
+            args.burst_interval,
+            args.latency,
+            args.loss,
+            args.persist,
+            args.update_interval,
+        )
+    finally:
+        await hass.async_stop(force=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="device config")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument(
+        "--duration", type=float, default=60, help="seconds to measure for"
+    )
+    parser.add_argument(
+        "--burst-interval",
+        type=float,
+        default=10,
+        help="seconds between bursts of commands",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0, help="seconds before each response"
+    )
+    parser.add_argument(
+        "--loss", type=float, default=0, help="probability of ignoring a request"
+    )
+    parser.add_argument(
+        "--persist", action="store_true", help="use persistent connections"
+    )
+    parser.add_argument(
+        "--update-interval",
+        type=float,
+        help="seconds between pushed changes to sensor readings",
+    )
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    report = asyncio.run(_async_main(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
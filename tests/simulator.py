@@ -0,0 +1,389 @@
+"""
+Simulate Tuya devices on the local network.
+
+A simulated device is created from one of the device configs, with dps
+values derived from the mappings and ranges in the config, and answers
+status queries, commands, heartbeats and dps refreshes over the Tuya local
+protocol, version 3.1 or 3.3, as a real device would.  Commands change the
+simulated state, and the device can push unsolicited status updates, so
+that the connection and polling can be exercised without real hardware:
+
+    python -m tests.simulator smartplugv2_energy.yaml --update-interval 5
+
+Latency, lost requests and a limit on concurrent connections can be
+configured, to see how the integration copes with unreliable devices.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import struct
+import sys
+from base64 import b64encode
+from collections import Counter
+from hashlib import md5
+from time import time
+
+from custom_components.tuya_local.connection import MAX_MESSAGE_SIZE, TUYA_PORT
+from custom_components.tuya_local.helpers.device_config import TuyaDeviceConfig
+from custom_components.tuya_local.protocol import (
+    CONTROL,
+    CONTROL_NEW,
+    DP_QUERY,
+    END_SIZE,
+    HEADER_SIZE,
+    HEART_BEAT,
+    PROTOCOL_33_HEADER,
+    PROTOCOL_VERSION_BYTES_31,
+    STATUS,
+    UPDATEDPS,
+    TuyaCodec,
+    TuyaProtocolError,
+    pack_message,
+    parse_header,
+    unpack_message,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+LOCAL_KEY = "0123456789abcdef"
+_RETCODE = struct.pack(">I", 0)
+
+
+class _ConfigState:
+    """Device state as seen by the config, for evaluating ranges."""
+
+    def __init__(self, dps):
+        self.dps = dps
+
+    def get_property(self, dps_id):
+        return self.dps.get(dps_id)
+
+
+def _all_dps(cfg):
+    for entity in (cfg.primary_entity, *cfg.secondary_entities()):
+        yield from entity.dps()
+
+
+def _initial_value(dps, device):
+    for m in dps._config.get("mapping", []):
+        if m.get("dps_val") is not None:
+            return m["dps_val"]
+    if dps.rawtype == "boolean":
+        return False
+    if dps.rawtype in ("integer", "float"):
+        r = dps.range(device, scaled=False)
+        if r is None:
+            return dps.type(0)
+        middle = (r["min"] + r["max"]) / 2
+        if dps.rawtype == "float":
+            return middle
+        step = dps.step(device, scaled=False) or 1
+        return int(r["min"] + (middle - r["min"]) // step * step)
+    if dps.rawtype == "bitfield":
+        return 0
+    if dps.rawtype == "json":
+        return "{}"
+    return ""
+
+
+def initial_dps(cfg):
+    """Return plausible values for the dps of a device config."""
+    dps = {}
+    device = _ConfigState(dps)
+    for d in _all_dps(cfg):
+        if d.id not in dps:
+            dps[d.id] = _initial_value(d, device)
+    return dps
+
+
+class SimulatedDevice:
+    """
+    A device that speaks the Tuya local protocol, with the dps of a device
+    config.
+
+    Each request is answered after latency seconds, unless it is lost,
+    which happens with a probability of loss.  Connections beyond
+    max_connections are closed as soon as they are accepted, as real
+    devices only accept one or a few.  Requests that cannot be decoded,
+    such as those using the wrong protocol version, close the connection.
+
+    The requests received, by command, and the connections accepted and
+    rejected, are counted in stats.
+    """
+
+    def __init__(
+        self,
+        config_file,
+        dev_id="simulated",
+        local_key=LOCAL_KEY,
+        version=3.3,
+        latency=0,
+        loss=0,
+        max_connections=None,
+        seed=None,
+        on_request=None,
+    ):
+        """
+        Args:
+            config_file (str): The device config to simulate.
+            dev_id (str): The device id.
+            local_key (str): The encryption key.
+            version (float): The protocol version, 3.1 or 3.3.
+            latency (float): Seconds to wait before answering a request.
+            loss (float): The probability of a request being ignored.
+            max_connections (int): The most connections accepted at once,
+                or None for no limit.
+            seed: The seed for lost requests and state changes, so that
+                runs can be repeated.
+            on_request (callable): Called with the command and decoded
+                payload of each request received, including lost ones.
+        """
+        self.config = TuyaDeviceConfig(config_file)
+        self.dev_id = dev_id
+        self.latency = latency
+        self.loss = loss
+        self.max_connections = max_connections
+        self.dps = initial_dps(self.config)
+        self.stats = Counter()
+        self._on_request = on_request
+        self._codec = TuyaCodec(dev_id, local_key, version)
+        self._random = random.Random(seed)
+        self._server = None
+        # Writer to the task serving each connection
+        self._clients = {}
+        self._updates = None
+
+    @property
+    def version(self):
+        return self._codec.version
+
+    @property
+    def port(self):
+        """Return the port the device is listening on."""
+        return self._server.sockets[0].getsockname()[1]
+
+    @property
+    def connections(self):
+        """Return the number of open connections."""
+        return len(self._clients)
+
+    async def async_start(self, host="127.0.0.1", port=0):
+        """Start listening, by default on a free port of the loopback address."""
+        self._server = await asyncio.start_server(self._async_serve, host, port)
+
+    def push(self, dps):
+        """Update dps and send the new values to all connected clients."""
+        self.dps.update(dps)
+        message = self._message(0, STATUS, self._status(dps))
+        for writer in self._clients:
+            writer.write(message)
+
+    def vary(self):
+        """
+        Change the numeric dps of sensors and other readonly dps, as a
+        device's readings would, returning the dps changed.  Values stay
+        within the configured range, or without one, wander by up to 10%
+        around their current value.
+        """
+        device = _ConfigState(self.dps)
+        changed = {}
+        for e in (self.config.primary_entity, *self.config.secondary_entities()):
+            for d in e.dps():
+                if d.rawtype in ("integer", "float") and (
+                    d.readonly or e.entity == "sensor"
+                ):
+                    self._vary(d, device, changed)
+        return changed
+
+    def _vary(self, d, device, changed):
+        value = self.dps.get(d.id)
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return
+        r = d.range(device, scaled=False)
+        if r is None:
+            spread = max(abs(value) / 10, 1)
+            r = {"min": max(value - spread, 0), "max": value + spread}
+        value = self._random.uniform(r["min"], r["max"])
+        changed[d.id] = value if d.rawtype == "float" else round(value)
+
+    def start_updates(self, interval):
+        """Push varied dps every interval seconds until closed."""
+
+        async def updates():
+            while True:
+                await asyncio.sleep(interval)
+                self.push(self.vary())
+
+        self._updates = asyncio.create_task(updates())
+
+    async def async_close(self):
+        """Stop listening, and close all connections."""
+        if self._updates is not None:
+            self._updates.cancel()
+            self._updates = None
+        tasks = list(self._clients.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _async_serve(self, reader, writer):
+        if (
+            self.max_connections is not None
+            and len(self._clients) >= self.max_connections
+        ):
+            self.stats["rejected"] += 1
+            writer.close()
+            return
+        self.stats["connections"] += 1
+        self._clients[writer] = asyncio.current_task()
+        try:
+            while True:
+                header = await reader.readexactly(HEADER_SIZE)
+                seqno, cmd, length = parse_header(header)
+                if length < END_SIZE or length > MAX_MESSAGE_SIZE:
+                    raise TuyaProtocolError(f"Bad message length {length}")
+                body = await reader.readexactly(length)
+                unpack_message(header + body)
+                # The whole payload, as requests have no return code.
+                request = self._codec.decode(body[:-END_SIZE]) or {}
+                self.stats[cmd] += 1
+                if self._on_request is not None:
+                    self._on_request(cmd, request)
+                if self.loss and self._random.random() < self.loss:
+                    self.stats["lost"] += 1
+                    continue
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                for message in self._respond(seqno, cmd, request):
+                    writer.write(message)
+                await writer.drain()
+        except (OSError, asyncio.IncompleteReadError, TuyaProtocolError) as e:
+            _LOGGER.debug("%s: connection closed: %s", self.dev_id, e)
+        except asyncio.CancelledError:
+            # Closed by async_close, which waits for the task to finish.
+            pass
+        finally:
+            self._clients.pop(writer, None)
+            writer.close()
+
+    def _respond(self, seqno, cmd, request):
+        cid = request.get("cid")
+        if cmd in (DP_QUERY, CONTROL_NEW):
+            return [self._message(seqno, cmd, self._status(self.dps, cid), False)]
+        if cmd == CONTROL:
+            dps = request.get("dps", {})
+            self.dps.update(dps)
+            ack = self._message(seqno, cmd, None)
+            return [ack, self._message(seqno, STATUS, self._status(dps, cid))]
+        if cmd == UPDATEDPS:
+            ids = [str(i) for i in request.get("dpId", [])]
+            dps = {i: self.dps[i] for i in ids if i in self.dps}
+            ack = self._message(seqno, cmd, None)
+            return [ack, self._message(seqno, STATUS, self._status(dps, cid))]
+        if cmd == HEART_BEAT:
+            return [self._message(seqno, cmd, None)]
+        _LOGGER.debug("%s: ignoring command %d", self.dev_id, cmd)
+        return []
+
+    def _status(self, dps, cid=None):
+        status = {"devId": self.dev_id, "dps": dps, "t": int(time())}
+        if cid is not None:
+            status["cid"] = cid
+        return status
+
+    def _message(self, seqno, cmd, data, header=True):
+        """
+        Frame a message to a client, encrypted as the protocol version
+        requires.  Status messages carry a version header, while responses
+        to status queries do not.
+        """
+        payload = b""
+        if data is not None:
+            payload = json.dumps(data, separators=(",", ":")).encode("utf-8")
+            if self.version == 3.3:
+                payload = self._codec.encrypt(payload)
+                if header:
+                    payload = PROTOCOL_33_HEADER + payload
+            elif header:
+                payload = b64encode(self._codec.encrypt(payload))
+                digest = md5(
+                    b"data="
+                    + payload
+                    + b"||lpv="
+                    + PROTOCOL_VERSION_BYTES_31
+                    + b"||"
+                    + self._codec.local_key
+                ).hexdigest()
+                payload = (
+                    PROTOCOL_VERSION_BYTES_31 + digest[8:24].encode("latin1") + payload
+                )
+        return pack_message(seqno, cmd, _RETCODE + payload)
+
+
+async def _async_run(args):
+    device = SimulatedDevice(
+        args.config,
+        args.device_id,
+        args.local_key,
+        args.protocol_version,
+        args.latency,
+        args.loss,
+        args.max_connections,
+    )
+    await device.async_start(args.host, args.port)
+    print(
+        f"Simulating {device.config.name} as {args.device_id} on "
+        f"{args.host}:{device.port} with local key {args.local_key}"
+    )
+    print(json.dumps(device.dps))
+    if args.update_interval:
+        device.start_updates(args.update_interval)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await device.async_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("config", help="device config file, such as kogan_switch.yaml")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=TUYA_PORT)
+    parser.add_argument("--device-id", default="simulated")
+    parser.add_argument("--local-key", default=LOCAL_KEY)
+    parser.add_argument(
+        "--protocol-version", type=float, choices=(3.1, 3.3), default=3.3
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0, help="seconds before each response"
+    )
+    parser.add_argument(
+        "--loss", type=float, default=0, help="probability of ignoring a request"
+    )
+    parser.add_argument(
+        "--max-connections", type=int, help="connections accepted at once"
+    )
+    parser.add_argument(
+        "--update-interval",
+        type=float,
+        help="seconds between pushed changes to sensor readings",
+    )
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    try:
+        asyncio.run(_async_run(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+"""Check that the config benchmark still runs."""
+from unittest import TestCase
+
+from .benchmark import OPERATIONS, compare, device_payloads, run
+
+
+class TestBenchmark(TestCase):
+    def test_payloads_found_for_device_tests(self):
+        payloads = device_payloads()
+        self.assertEqual(payloads["kogan_kahtp_heater.yaml"], "KOGAN_HEATER_PAYLOAD")
+
+    def test_report(self):
+        report = run(1, "^kogan_kahtp_heater")
+        self.assertEqual(list(report["devices"].keys()), ["kogan_kahtp_heater.yaml"])
+        for op in OPERATIONS:
+            self.assertGreaterEqual(report["devices"]["kogan_kahtp_heater.yaml"][op], 0)
+            self.assertIn(op, report["totals"])
+
+    def test_compare_reports_regressions(self):
+        timings = {op: 10 for op in OPERATIONS}
+        baseline = {"devices": {"a.yaml": timings}}
+        report = {"devices": {"a.yaml": {**timings, "icon": 20}}}
+        self.assertEqual(compare(report, baseline, 1.5), ["a.yaml icon: 10us -> 20us"])
+        self.assertEqual(compare(report, baseline, 2.5), [])
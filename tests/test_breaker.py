@@ -0,0 +1,75 @@
+"""Tests for the circuit breaker for unreachable devices."""
+from datetime import timedelta
+from unittest import TestCase
+from unittest.mock import patch
+
+from custom_components.tuya_local.breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+)
+
+
+class TestCircuitBreaker(TestCase):
+    def setUp(self):
+        self.now = 1000
+        patcher = patch(
+            "custom_components.tuya_local.breaker.monotonic", lambda: self.now
+        )
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        jitter_patcher = patch(
+            "custom_components.tuya_local.breaker.uniform", return_value=0
+        )
+        self.addCleanup(jitter_patcher.stop)
+        self.mock_uniform = jitter_patcher.start()
+        self.subject = CircuitBreaker(
+            "test", timedelta(seconds=10), timedelta(seconds=60)
+        )
+
+    def test_starts_closed(self):
+        self.assertEqual(self.subject.state, CLOSED)
+        self.assertTrue(self.subject.closed)
+        self.assertEqual(self.subject.backoff, 0)
+        self.assertFalse(self.subject.allow_probe())
+
+    def test_failure_opens_breaker(self):
+        self.subject.record_failure()
+        self.assertEqual(self.subject.state, OPEN)
+        self.assertFalse(self.subject.closed)
+        self.assertEqual(self.subject.backoff, 10)
+        self.assertFalse(self.subject.allow_probe())
+
+    def test_allows_one_probe_after_backoff(self):
+        self.subject.record_failure()
+        self.now += 10
+        self.assertTrue(self.subject.allow_probe())
+        self.assertEqual(self.subject.state, HALF_OPEN)
+        self.assertFalse(self.subject.allow_probe())
+
+    def test_backoff_doubles_up_to_max(self):
+        self.subject.record_failure()
+        for expected in (20, 40, 60, 60):
+            self.now += self.subject.backoff
+            self.assertTrue(self.subject.allow_probe())
+            self.subject.record_failure()
+            self.assertEqual(self.subject.backoff, expected)
+
+    def test_success_closes_breaker(self):
+        self.subject.record_failure()
+        self.now += 10
+        self.subject.allow_probe()
+        self.subject.record_success()
+        self.assertTrue(self.subject.closed)
+        self.assertEqual(self.subject.backoff, 0)
+        self.subject.record_failure()
+        self.assertEqual(self.subject.backoff, 10)
+
+    def test_backoff_is_jittered(self):
+        self.mock_uniform.return_value = 0.2
+        self.subject.record_failure()
+        self.now += 11
+        self.assertFalse(self.subject.allow_probe())
+        self.now += 1
+        self.assertTrue(self.subject.allow_probe())
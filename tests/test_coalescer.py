@@ -0,0 +1,66 @@
+"""Tests for the write coalescer."""
+import asyncio
+from datetime import timedelta
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock
+
+from custom_components.tuya_local.coalescer import WriteCoalescer
+
+
+class TestWriteCoalescer(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tasks = []
+        self.hass = MagicMock()
+        self.hass.loop = asyncio.get_running_loop()
+        self.hass.async_create_task.side_effect = self.create_task
+        self.send = AsyncMock(return_value=True)
+        self.subject = WriteCoalescer(
+            self.hass, "test", self.send, timedelta(seconds=0.05)
+        )
+
+    def create_task(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.tasks.append(task)
+        return task
+
+    async def test_commands_are_sent_together(self):
+        futures = [
+            self.subject.add({"1": True}),
+            self.subject.add({"2": 10}),
+            self.subject.add({"1": False}),
+        ]
+        self.assertEqual(self.subject.pending, {"1": False, "2": 10})
+
+        self.assertEqual(await asyncio.gather(*futures), [True, True, True])
+        self.send.assert_awaited_once_with({"1": False, "2": 10})
+        self.assertEqual(self.subject.pending, {})
+
+    async def test_commands_after_a_send_wait_for_the_window(self):
+        await self.subject.add({"1": True})
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        await asyncio.gather(self.subject.add({"1": False}), self.subject.add({"2": 1}))
+
+        self.assertGreaterEqual(loop.time() - start, 0.04)
+        self.assertEqual(self.send.await_count, 2)
+        self.send.assert_awaited_with({"1": False, "2": 1})
+
+    async def test_failed_send_resolves_futures_false(self):
+        self.send.return_value = False
+        self.assertFalse(await self.subject.add({"1": True}))
+
+    async def test_send_exception_resolves_futures_false(self):
+        self.send.side_effect = ConnectionError()
+        future = self.subject.add({"1": True})
+        self.assertFalse(await future)
+        with self.assertRaises(ConnectionError):
+            await self.tasks[0]
+
+    async def test_cancel_drops_pending_commands(self):
+        future = self.subject.add({"1": True})
+        self.subject.cancel()
+        self.assertTrue(future.cancelled())
+        self.assertEqual(self.subject.pending, {})
+        await asyncio.sleep(0.01)
+        self.send.assert_not_awaited()
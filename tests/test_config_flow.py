@@ -13,13 +13,17 @@ from custom_components.tuya_local import (
     async_setup_entry,
 )
 from custom_components.tuya_local.const import (
+    CONF_CID,
     CONF_CLIMATE,
     CONF_DEVICE_ID,
+    CONF_DIAGNOSTICS,
     CONF_FAN,
+    CONF_GATEWAY_ID,
     CONF_HUMIDIFIER,
     CONF_LIGHT,
     CONF_LOCAL_KEY,
     CONF_LOCK,
+    CONF_PERSIST,
     CONF_SWITCH,
     CONF_TYPE,
     DOMAIN,
@@ -31,6 +35,16 @@ def auto_enable_custom_integrations(enable_custom_integrations):
     yield
 
 
+@pytest.fixture(autouse=True)
+def bypass_discovery():
+    """Prevent the discovery listener from binding to UDP ports."""
+    with patch(
+        "custom_components.tuya_local.async_start_discovery",
+        AsyncMock(return_value=None),
+    ):
+        yield
+
+
 @pytest.fixture
 def bypass_setup():
     """Prevent actual setup of the integration after config flow."""
@@ -65,12 +79,21 @@ async def test_init_entry(hass):
     assert hass.states.get("lock.test_child_lock")
 
 
-@patch("custom_components.tuya_local.setup_device")
-async def test_migrate_entry(mock_setup, hass):
+def detected(config_type, dev_id="deviceid"):
+    """Return bulk detection results for a single device."""
+    return {
+        dev_id: {
+            "type": config_type,
+            "matches": [] if config_type is None else [(config_type, 100)],
+            "elapsed": 0,
+        }
+    }
+
+
+@patch("custom_components.tuya_local.async_detect_types")
+async def test_migrate_entry(mock_detect, hass):
     """Test migration from old entry format."""
-    mock_device = MagicMock()
-    mock_device.async_inferred_type = AsyncMock(return_value="goldair_gpph_heater")
-    mock_setup.return_value = mock_device
+    mock_detect.return_value = detected("goldair_gpph_heater")
 
     entry = MockConfigEntry(
         domain=DOMAIN,
@@ -88,8 +111,8 @@ async def test_migrate_entry(mock_setup, hass):
     )
     assert await async_migrate_entry(hass, entry)
 
-    mock_device.async_inferred_type = AsyncMock(return_value=None)
-    mock_device.reset_mock()
+    mock_detect.return_value = detected(None)
+    mock_detect.reset_mock()
 
     entry = MockConfigEntry(
         domain=DOMAIN,
@@ -104,7 +127,7 @@ async def test_migrate_entry(mock_setup, hass):
         },
     )
     assert not await async_migrate_entry(hass, entry)
-    mock_device.reset_mock()
+    mock_detect.reset_mock()
 
     entry = MockConfigEntry(
         domain=DOMAIN,
@@ -122,8 +145,8 @@ async def test_migrate_entry(mock_setup, hass):
     )
     assert not await async_migrate_entry(hass, entry)
 
-    mock_device.async_inferred_type = AsyncMock(return_value="smartplugv1")
-    mock_device.reset_mock()
+    mock_detect.return_value = detected("smartplugv1")
+    mock_detect.reset_mock()
 
     entry = MockConfigEntry(
         domain=DOMAIN,
@@ -141,8 +164,8 @@ async def test_migrate_entry(mock_setup, hass):
     )
     assert await async_migrate_entry(hass, entry)
 
-    mock_device.async_inferred_type = AsyncMock(return_value="smartplugv2")
-    mock_device.reset_mock()
+    mock_detect.return_value = detected("smartplugv2")
+    mock_detect.reset_mock()
 
     entry = MockConfigEntry(
         domain=DOMAIN,
@@ -160,8 +183,8 @@ async def test_migrate_entry(mock_setup, hass):
     )
     assert await async_migrate_entry(hass, entry)
 
-    mock_device.async_inferred_type = AsyncMock(return_value="goldair_dehumidifier")
-    mock_device.reset_mock()
+    mock_detect.return_value = detected("goldair_dehumidifier")
+    mock_detect.reset_mock()
 
     entry = MockConfigEntry(
         domain=DOMAIN,
@@ -183,10 +206,8 @@ async def test_migrate_entry(mock_setup, hass):
     )
     assert await async_migrate_entry(hass, entry)
 
-    mock_device.async_inferred_type = AsyncMock(
-        return_value="grid_connect_usb_double_power_point"
-    )
-    mock_device.reset_mock()
+    mock_detect.return_value = detected("grid_connect_usb_double_power_point")
+    mock_detect.reset_mock()
 
     entry = MockConfigEntry(
         domain=DOMAIN,
@@ -207,6 +228,46 @@ async def test_migrate_entry(mock_setup, hass):
     assert await async_migrate_entry(hass, entry)
 
 
+@patch("custom_components.tuya_local.async_detect_types")
+async def test_migrate_entries_detected_together(mock_detect, hass):
+    """Test that all entries needing detection are polled in one batch."""
+    entries = []
+    for i in range(3):
+        entry = MockConfigEntry(
+            domain=DOMAIN,
+            version=2,
+            title=f"test{i}",
+            data={
+                CONF_DEVICE_ID: f"device{i}",
+                CONF_HOST: f"host{i}",
+                CONF_LOCAL_KEY: "localkey",
+                CONF_TYPE: "auto",
+            },
+        )
+        entry.add_to_hass(hass)
+        entries.append(entry)
+    mock_detect.return_value = {
+        **detected("goldair_gpph_heater", "device0"),
+        **detected("kogan_kahtp_heater", "device1"),
+        **detected(None, "device2"),
+    }
+
+    assert await async_migrate_entry(hass, entries[0])
+    mock_detect.assert_awaited_once()
+    devices = mock_detect.call_args[0][1]
+    assert sorted(devices) == [
+        ("device0", "host0", "localkey"),
+        ("device1", "host1", "localkey"),
+        ("device2", "host2", "localkey"),
+    ]
+
+    assert await async_migrate_entry(hass, entries[1])
+    assert not await async_migrate_entry(hass, entries[2])
+    mock_detect.assert_awaited_once()
+    assert entries[0].data[CONF_TYPE] == "goldair_gpph_heater"
+    assert entries[1].data[CONF_TYPE] == "kogan_kahtp_heater"
+
+
 async def test_flow_user_init(hass):
     """Test the initialisation of the form in the first step of the config flow."""
     result = await hass.config_entries.flow.async_init(
@@ -272,6 +333,49 @@ async def test_async_test_connection_invalid(mock_device, hass):
     assert device is None
 
 
+@patch("custom_components.tuya_local.config_flow.TuyaLocalSubDevice")
+@patch("custom_components.tuya_local.config_flow.TuyaLocalGateway")
+async def test_async_test_connection_sub_device(mock_gateway, mock_device, hass):
+    """Test that sub-devices are tested through their gateway."""
+    mock_instance = AsyncMock()
+    mock_instance.has_returned_state = True
+    mock_device.return_value = mock_instance
+    device = await config_flow.async_test_connection(
+        {
+            CONF_DEVICE_ID: "deviceid",
+            CONF_LOCAL_KEY: "localkey",
+            CONF_HOST: "hostname",
+            CONF_GATEWAY_ID: "gatewayid",
+            CONF_CID: "node",
+        },
+        hass,
+    )
+    assert device == mock_instance
+    mock_gateway.assert_called_once_with(
+        hass, "Test gateway", "gatewayid", "hostname", "localkey", persist=False
+    )
+    mock_device.assert_called_once_with(
+        "Test", "deviceid", mock_gateway.return_value, "node", hass
+    )
+
+
+@patch("custom_components.tuya_local.config_flow.async_test_connection")
+async def test_flow_user_init_sub_device_needs_gateway(mock_test, hass):
+    """Test that a gateway is needed for sub-devices."""
+    flow = await hass.config_entries.flow.async_init(DOMAIN, context={"source": "user"})
+    result = await hass.config_entries.flow.async_configure(
+        flow["flow_id"],
+        user_input={
+            CONF_DEVICE_ID: "deviceid",
+            CONF_HOST: "hostname",
+            CONF_LOCAL_KEY: "localkey",
+            CONF_CID: "node",
+        },
+    )
+    assert {CONF_GATEWAY_ID: "gateway_id"} == result["errors"]
+    mock_test.assert_not_called()
+
+
 @patch("custom_components.tuya_local.config_flow.async_test_connection")
 async def test_flow_user_init_invalid_config(mock_test, hass):
     """Test errors populated when config is invalid."""
@@ -292,10 +396,9 @@ def setup_device_mock(mock, failure=False, type="test"):
     mock_type = MagicMock()
     mock_type.legacy_type = type
     mock_type.config_type = type
-    mock_type.match_quality.return_value = 100
-    mock_iter = MagicMock()
-    mock_iter.__aiter__.return_value = [mock_type] if not failure else []
-    mock.async_possible_types = MagicMock(return_value=mock_iter)
+    mock.async_ranked_types = AsyncMock(
+        return_value=[(mock_type, 100)] if not failure else []
+    )
 
 
 @patch("custom_components.tuya_local.config_flow.async_test_connection")
@@ -452,6 +555,8 @@ async def test_flow_choose_entities_creates_config_entry(hass, bypass_setup):
                 CONF_LOCAL_KEY: "localkey",
                 "lock_child_lock": False,
                 "number_timer": False,
+                CONF_PERSIST: False,
+                CONF_DIAGNOSTICS: False,
                 CONF_TYPE: "kogan_kahtp_heater",
             },
         }
@@ -535,6 +640,8 @@ async def test_options_flow_modifies_config(mock_test, hass):
         CONF_LOCAL_KEY: "new_key",
         "lock_child_lock": False,
         "number_timer": True,
+        CONF_PERSIST: False,
+        CONF_DIAGNOSTICS: False,
     }
     assert "create_entry" == result["type"]
     assert "" == result["title"]
@@ -0,0 +1,225 @@
+"""Tests for the connection to Tuya devices."""
+import asyncio
+import json
+import struct
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from custom_components.tuya_local.connection import TuyaConnection
+from custom_components.tuya_local.protocol import (
+    CONTROL,
+    DP_QUERY,
+    HEART_BEAT,
+    STATUS,
+    UPDATEDPS,
+    TuyaCodec,
+    TuyaProtocolError,
+    pack_message,
+)
+
+LOCAL_KEY = "0123456789abcdef"
+
+
+def device_message(cmd, data=None, seqno=1):
+    """Build a message as sent by a protocol 3.3 device."""
+    payload = b""
+    if data is not None:
+        payload = TuyaCodec("devid", LOCAL_KEY).encrypt(json.dumps(data).encode())
+    return pack_message(seqno, cmd, struct.pack(">I", 0) + payload)
+
+
+class FakeWriter:
+    """The client side of a fake connection, answering requests directly."""
+
+    def __init__(self, device, reader):
+        self.device = device
+        self.reader = reader
+        self.closed = False
+
+    def write(self, data):
+        _, seqno, cmd, _ = struct.unpack(">4I", data[:16])
+        self.device.received.append(cmd)
+        for reply in self.device.handler(cmd, seqno):
+            self.reader.feed_data(reply)
+
+    async def drain(self):
+        pass
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.reader.feed_eof()
+
+
+class FakeDevice:
+    """A minimal device that answers each request using a handler."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.connections = 0
+        self.received = []
+        self.online = True
+
+    async def open_connection(self, host, port):
+        if not self.online:
+            raise ConnectionRefusedError()
+        self.connections += 1
+        reader = asyncio.StreamReader()
+        return reader, FakeWriter(self, reader)
+
+
+def respond(cmd, seqno):
+    if cmd == DP_QUERY:
+        # Some devices send an empty ack before the full response
+        yield device_message(cmd, seqno=seqno)
+        yield device_message(cmd, {"dps": {"1": True}}, seqno)
+    else:
+        yield device_message(cmd, seqno=seqno)
+
+
+class TestPersistentConnection(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.device = FakeDevice(respond)
+        patcher = patch("asyncio.open_connection", self.device.open_connection)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        self.codec = TuyaCodec("devid", LOCAL_KEY)
+        self.subject = TuyaConnection(
+            self.codec, "some.ip.address", "test", persist=True
+        )
+
+    async def asyncTearDown(self):
+        self.subject.close()
+
+    async def test_status_and_control_share_one_connection(self):
+        self.assertEqual(await self.subject.async_status(), {"dps": {"1": True}})
+        await self.subject.async_control({"1": False})
+        self.assertEqual(await self.subject.async_status(), {"dps": {"1": True}})
+        self.assertTrue(self.subject.connected)
+        self.assertEqual(self.device.connections, 1)
+        self.assertEqual(
+            self.device.received,
+            [DP_QUERY, CONTROL, DP_QUERY],
+        )
+
+    async def test_heartbeat(self):
+        self.assertIsNone(await self.subject.async_heartbeat())
+        self.assertEqual(self.device.received, [HEART_BEAT])
+
+    async def test_unanswered_request_drops_connection(self):
+        self.device.handler = lambda cmd, seqno: []
+        with patch("custom_components.tuya_local.connection.RESPONSE_TIMEOUT", 0.1):
+            with self.assertRaises(asyncio.TimeoutError):
+                await self.subject.async_heartbeat()
+        self.assertFalse(self.subject.connected)
+
+    async def test_reconnects_after_connection_lost(self):
+        await self.subject.async_heartbeat()
+        self.subject._writer.close()
+        await asyncio.sleep(0.1)
+        self.assertFalse(self.subject.connected)
+        self.assertEqual(await self.subject.async_status(), {"dps": {"1": True}})
+        self.assertEqual(self.device.connections, 2)
+
+    async def test_backs_off_when_unreachable(self):
+        self.device.online = False
+        with self.assertRaises(ConnectionError):
+            await self.subject.async_heartbeat()
+        self.assertEqual(self.subject._backoff, 1)
+        with self.assertRaises(ConnectionError):
+            await self.subject.async_heartbeat()
+        # The second attempt is refused without trying to connect
+        self.assertEqual(self.subject._backoff, 1)
+
+    async def test_unsolicited_status_is_passed_to_listener(self):
+        pushed = []
+        self.subject._on_status = lambda dps, cid: pushed.append((dps, cid))
+        await self.subject.async_heartbeat()
+        self.subject._reader.feed_data(device_message(STATUS, {"dps": {"2": 25}}))
+        self.subject._reader.feed_data(
+            device_message(STATUS, {"dps": {"1": False}, "cid": "node"})
+        )
+        await asyncio.sleep(0)
+        self.assertEqual(pushed, [({"2": 25}, None), ({"1": False}, "node")])
+
+    async def test_sub_device_responses_are_matched_by_cid(self):
+        def respond_out_of_order(cmd, seqno):
+            yield device_message(cmd, {"dps": {"1": 1}, "cid": "other"}, seqno)
+            yield device_message(cmd, {"dps": {"1": 2}, "cid": "node"}, seqno)
+
+        self.device.handler = respond_out_of_order
+        self.assertEqual(
+            await self.subject.async_status("node"),
+            {"dps": {"1": 2}, "cid": "node"},
+        )
+
+    async def test_closed_connection_refuses_requests(self):
+        self.subject.close()
+        with self.assertRaises(ConnectionError):
+            await self.subject.async_status()
+
+    async def test_corrupt_message_fails_waiting_requests(self):
+        def corrupt(cmd, seqno):
+            message = bytearray(device_message(cmd, seqno=seqno))
+            message[-5] ^= 0xFF
+            yield bytes(message)
+
+        self.device.handler = corrupt
+        with self.assertRaises(TuyaProtocolError):
+            await self.subject.async_heartbeat()
+        self.assertFalse(self.subject.connected)
+
+
+class TestConnectionPerRequest(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.device = FakeDevice(respond)
+        patcher = patch("asyncio.open_connection", self.device.open_connection)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        self.subject = TuyaConnection(
+            TuyaCodec("devid", LOCAL_KEY), "some.ip.address", "test"
+        )
+
+    async def test_connects_for_each_request(self):
+        self.assertFalse(self.subject.persistent)
+        self.assertEqual(await self.subject.async_status(), {"dps": {"1": True}})
+        self.assertFalse(self.subject.connected)
+        await self.subject.async_control({"1": False})
+        self.assertEqual(self.device.connections, 2)
+
+    async def test_selected_dps_are_answered_with_status(self):
+        def respond_with_status(cmd, seqno):
+            yield device_message(cmd, seqno=seqno)
+            yield device_message(STATUS, {"dps": {"19": 125}})
+
+        self.device.handler = respond_with_status
+        self.assertEqual(
+            await self.subject.async_update_dps(["19"]), {"dps": {"19": 125}}
+        )
+        self.assertEqual(self.device.received, [UPDATEDPS])
+
+    async def test_unacknowledged_command_is_not_an_error(self):
+        self.device.handler = lambda cmd, seqno: []
+        with patch("custom_components.tuya_local.connection.RESPONSE_TIMEOUT", 0.1):
+            self.assertIsNone(await self.subject.async_control({"1": False}))
+
+    async def test_probe_connects_without_sending(self):
+        await self.subject.async_probe()
+        self.assertEqual(self.device.connections, 1)
+        self.assertEqual(self.device.received, [])
+        self.assertFalse(self.subject.connected)
+
+    async def test_probe_raises_when_unreachable(self):
+        self.device.online = False
+        with self.assertRaises(ConnectionError):
+            await self.subject.async_probe()
+
+    async def test_no_backoff_between_requests(self):
+        self.device.online = False
+        with self.assertRaises(ConnectionError):
+            await self.subject.async_status()
+        self.device.online = True
+        self.assertEqual(await self.subject.async_status(), {"dps": {"1": True}})
@@ -1,52 +1,70 @@
-import tinytuya
-from datetime import datetime
-from time import sleep, time
+import asyncio
+from datetime import datetime, timedelta
+from time import time
 from unittest import IsolatedAsyncioTestCase
-from unittest.mock import AsyncMock, call, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from homeassistant.const import TEMP_CELSIUS
 
-from custom_components.tuya_local.device import TuyaLocalDevice
+from custom_components.tuya_local.device import TuyaLocalDevice, async_detect_types
+from custom_components.tuya_local.protocol import TuyaProtocolError
 
 from .const import (
     EUROM_600_HEATER_PAYLOAD,
 )
+from .helpers import close_coroutine
 
 
 class TestDevice(IsolatedAsyncioTestCase):
     def setUp(self):
-        device_patcher = patch("tinytuya.Device")
-        self.addCleanup(device_patcher.stop)
-        self.mock_api = device_patcher.start()
+        connection_patcher = patch("custom_components.tuya_local.device.TuyaConnection")
+        self.addCleanup(connection_patcher.stop)
+        self.mock_connection_class = connection_patcher.start()
+        self.mock_connection = self.mock_connection_class.return_value
+        self.mock_connection.async_status = AsyncMock()
+        self.mock_connection.async_control = AsyncMock()
+        self.mock_connection.async_probe = AsyncMock()
+        self.mock_connection.persistent = False
 
         hass_patcher = patch("homeassistant.core.HomeAssistant")
         self.addCleanup(hass_patcher.stop)
         self.hass = hass_patcher.start()
+        self.hass().async_create_task.side_effect = close_coroutine
 
         self.subject = TuyaLocalDevice(
             "Some name", "some_dev_id", "some.ip.address", "some_local_key", self.hass()
         )
 
-    def test_configures_tinytuya_correctly(self):
-        self.mock_api.assert_called_once_with(
-            "some_dev_id", "some.ip.address", "some_local_key"
+    def test_configures_connection_correctly(self):
+        self.mock_connection_class.assert_called_once_with(
+            self.subject._codec,
+            "some.ip.address",
+            "Some name",
+            False,
+            self.subject._handle_pushed_status,
+        )
+        self.assertEqual(self.subject._codec.dev_id, "some_dev_id")
+        self.assertEqual(self.subject._codec.version, 3.3)
+
+    def test_logs_to_a_logger_per_device(self):
+        self.assertEqual(
+            self.subject._log.name, "custom_components.tuya_local.device.some_dev_id"
         )
-        self.assertIs(self.subject._api, self.mock_api())
 
     def test_name(self):
         """Returns the name given at instantiation."""
         self.assertEqual(self.subject.name, "Some name")
 
     def test_unique_id(self):
-        """Returns the unique ID presented by the API class."""
-        self.assertIs(self.subject.unique_id, self.mock_api().id)
+        """Returns the device id given at instantiation."""
+        self.assertEqual(self.subject.unique_id, "some_dev_id")
 
     def test_device_info(self):
         """Returns generic info plus the unique ID for categorisation."""
         self.assertEqual(
             self.subject.device_info,
             {
-                "identifiers": {("tuya_local", self.mock_api().id)},
+                "identifiers": {("tuya_local", "some_dev_id")},
                 "name": "Some name",
                 "manufacturer": "Tuya",
             },
@@ -71,124 +89,345 @@ class TestDevice(IsolatedAsyncioTestCase):
 
         self.subject.async_refresh.assert_awaited()
 
+    async def test_detection_returns_best_match(self):
+        self.subject._cached_state = {**EUROM_600_HEATER_PAYLOAD, "updated_at": 0}
+        self.assertEqual(await self.subject.async_inferred_type(), "eurom_600_heater")
+        ranked = await self.subject.async_ranked_types()
+        self.assertEqual(ranked[0][0].config_type, "eurom_600_heater")
+        self.assertEqual(ranked[0][1], 100)
+
     async def test_detection_returns_none_when_device_type_could_not_be_detected(self):
         self.subject._cached_state = {"2": False, "updated_at": datetime.now()}
         self.assertEqual(await self.subject.async_inferred_type(), None)
 
     async def test_does_not_refresh_more_often_than_cache_timeout(self):
-        refresh_task = AsyncMock()
         self.subject._cached_state = {"updated_at": time() - 19}
-        self.subject._refresh_task = awaitable = refresh_task()
+        self.subject._refresh_task = done = asyncio.get_running_loop().create_future()
+        done.set_result(None)
 
         await self.subject.async_refresh()
 
-        refresh_task.assert_awaited()
-        self.assertIs(self.subject._refresh_task, awaitable)
+        self.subject._hass.async_create_task.assert_not_called()
+        self.assertIs(self.subject._refresh_task, done)
+        self.assertEqual(
+            self.subject.refresh_stats,
+            {"requested": 1, "polled": 0, "coalesced": 1},
+        )
+
+    async def test_concurrent_refreshes_share_one_request(self):
+        self.subject._hass.async_create_task.side_effect = asyncio.ensure_future
+        response = asyncio.get_running_loop().create_future()
+
+        async def status():
+            return await response
+
+        self.mock_connection.async_status.side_effect = status
+
+        refreshes = [
+            asyncio.ensure_future(self.subject.async_refresh()) for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        response.set_result({"dps": {"1": True}})
+        await asyncio.gather(*refreshes)
+
+        self.mock_connection.async_status.assert_awaited_once()
+        self.assertEqual(self.subject.get_property("1"), True)
+        self.assertEqual(
+            self.subject.refresh_stats,
+            {"requested": 5, "polled": 1, "coalesced": 4},
+        )
+
+    async def test_cancelled_caller_does_not_cancel_shared_refresh(self):
+        self.subject._hass.async_create_task.side_effect = asyncio.ensure_future
+        response = asyncio.get_running_loop().create_future()
+
+        async def status():
+            return await response
+
+        self.mock_connection.async_status.side_effect = status
+
+        first = asyncio.ensure_future(self.subject.async_refresh())
+        second = asyncio.ensure_future(self.subject.async_refresh())
+        await asyncio.sleep(0)
+        first.cancel()
+        response.set_result({"dps": {"1": False}})
+        await second
+
+        self.assertEqual(self.subject.get_property("1"), False)
+
+    async def test_refresh_window_is_configurable(self):
+        subject = TuyaLocalDevice(
+            "Some name",
+            "some_dev_id",
+            "some.ip.address",
+            "some_local_key",
+            self.hass(),
+            refresh_window=timedelta(seconds=5),
+        )
+        subject._cached_state = {"updated_at": time() - 6}
+        subject._refresh_task = done = asyncio.get_running_loop().create_future()
+        done.set_result(None)
+        subject._hass.async_create_task.return_value = AsyncMock()()
+
+        with patch.object(subject, "async_refresh_now"):
+            await subject.async_refresh()
+
+        subject._hass.async_create_task.assert_called_once()
 
     async def test_refreshes_when_there_is_no_pending_reset(self):
         async_job = AsyncMock()
         self.subject._cached_state = {"updated_at": time() - 19}
-        self.subject._hass.async_add_executor_job.return_value = awaitable = async_job()
+        self.subject._hass.async_create_task.return_value = awaitable = async_job()
 
-        await self.subject.async_refresh()
+        with patch.object(self.subject, "async_refresh_now") as refresh_now:
+            await self.subject.async_refresh()
+            refresh_now.assert_called_once()
 
-        self.subject._hass.async_add_executor_job.assert_called_once_with(
-            self.subject.refresh
-        )
+        self.subject._hass.async_create_task.assert_called_once()
         self.assertIs(self.subject._refresh_task, awaitable)
         async_job.assert_awaited()
 
     async def test_refreshes_when_there_is_expired_pending_reset(self):
         async_job = AsyncMock()
         self.subject._cached_state = {"updated_at": time() - 20}
-        self.subject._hass.async_add_executor_job.return_value = awaitable = async_job()
-        self.subject._refresh_task = {}
+        self.subject._hass.async_create_task.return_value = awaitable = async_job()
+        self.subject._refresh_task = done = asyncio.get_running_loop().create_future()
+        done.set_result(None)
 
-        await self.subject.async_refresh()
+        with patch.object(self.subject, "async_refresh_now"):
+            await self.subject.async_refresh()
 
-        self.subject._hass.async_add_executor_job.assert_called_once_with(
-            self.subject.refresh
-        )
+        self.subject._hass.async_create_task.assert_called_once()
         self.assertIs(self.subject._refresh_task, awaitable)
         async_job.assert_awaited()
 
-    def test_refresh_reloads_status_from_device(self):
-        self.subject._api.status.return_value = {"dps": {"1": False}}
+    async def test_refresh_reloads_status_from_device(self):
+        self.mock_connection.async_status.return_value = {"dps": {"1": False}}
         self.subject._cached_state = {"1": True}
 
-        self.subject.refresh()
+        await self.subject.async_refresh_now()
 
-        self.subject._api.status.assert_called_once()
+        self.mock_connection.async_status.assert_awaited_once()
         self.assertEqual(self.subject._cached_state["1"], False)
         self.assertTrue(
             time() - 1 <= self.subject._cached_state["updated_at"] <= time()
         )
 
-    def test_refresh_retries_up_to_four_times(self):
-        self.subject._api.status.side_effect = [
+    async def test_refresh_retries_up_to_four_times(self):
+        self.mock_connection.async_status.side_effect = [
             Exception("Error"),
             Exception("Error"),
             Exception("Error"),
             {"dps": {"1": False}},
         ]
 
-        self.subject.refresh()
+        await self.subject.async_refresh_now()
 
-        self.assertEqual(self.subject._api.status.call_count, 4)
+        self.assertEqual(self.mock_connection.async_status.await_count, 4)
         self.assertEqual(self.subject._cached_state["1"], False)
 
-    def test_refresh_clears_cached_state_and_pending_updates_after_failing_four_times(
+    async def test_refresh_clears_cached_state_and_pending_updates_after_failing_four_times(
         self,
     ):
         self.subject._cached_state = {"1": True}
         self.subject._pending_updates = {"1": False}
-        self.subject._api.status.side_effect = [
+        self.mock_connection.async_status.side_effect = [
             Exception("Error"),
             Exception("Error"),
             Exception("Error"),
             Exception("Error"),
         ]
 
-        self.subject.refresh()
+        await self.subject.async_refresh_now()
 
-        self.assertEqual(self.subject._api.status.call_count, 4)
+        self.assertEqual(self.mock_connection.async_status.await_count, 4)
         self.assertEqual(self.subject._cached_state, {"updated_at": 0})
         self.assertEqual(self.subject._pending_updates, {})
 
-    def test_api_protocol_version_is_rotated_with_each_failure(self):
-        self.subject._api.set_version.assert_called_once_with(3.3)
-        self.subject._api.set_version.reset_mock()
+    async def test_api_protocol_version_is_rotated_with_each_failure(self):
+        self.assertEqual(self.subject._codec.version, 3.3)
+        versions = []
 
-        self.subject._api.status.side_effect = [
-            Exception("Error"),
+        async def fail():
+            versions.append(self.subject._codec.version)
+            raise Exception("Error")
+
+        self.mock_connection.async_status.side_effect = fail
+        await self.subject.async_refresh_now()
+
+        self.assertEqual(versions, [3.3, 3.1, 3.3, 3.1])
+
+    async def test_api_protocol_version_is_stable_once_successful(self):
+        versions = []
+        results = [
+            {"dps": {"1": False}},
             Exception("Error"),
             Exception("Error"),
             Exception("Error"),
         ]
-        self.subject.refresh()
 
-        self.subject._api.set_version.assert_has_calls(
-            [call(3.1), call(3.3), call(3.1)]
-        )
+        async def status():
+            versions.append(self.subject._codec.version)
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
 
-    def test_api_protocol_version_is_stable_once_successful(self):
-        self.subject._api.set_version.assert_called_once_with(3.3)
-        self.subject._api.set_version.reset_mock()
+        self.mock_connection.async_status.side_effect = status
+        await self.subject.async_refresh_now()
+        await self.subject.async_refresh_now()
 
-        self.subject._api.status.side_effect = [
+        # Once negotiated, the version is kept through connection failures
+        self.assertEqual(versions, [3.3, 3.3, 3.3, 3.3, 3.3])
+        self.assertEqual(self.subject._codec.version, 3.3)
+
+    async def test_api_protocol_version_is_rotated_on_protocol_errors(self):
+        results = [
             {"dps": {"1": False}},
+            TuyaProtocolError("CRC mismatch"),
+            {"dps": {"1": False}},
+        ]
+        versions = []
+
+        async def status():
+            versions.append(self.subject._codec.version)
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        self.mock_connection.async_status.side_effect = status
+        await self.subject.async_refresh_now()
+        await self.subject.async_refresh_now()
+
+        self.assertEqual(versions, [3.3, 3.3, 3.1])
+
+    async def test_stored_api_protocol_version_is_used_first(self):
+        on_version = MagicMock()
+        subject = TuyaLocalDevice(
+            "Some name",
+            "some_dev_id",
+            "some.ip.address",
+            "some_local_key",
+            self.hass(),
+            protocol_version=3.1,
+            on_protocol_version=on_version,
+        )
+        self.assertEqual(subject.protocol_version, 3.1)
+        self.mock_connection.async_status.side_effect = [
             Exception("Error"),
+            {"dps": {"1": False}},
+        ]
+
+        await subject.async_refresh_now()
+
+        self.assertEqual(subject.protocol_version, 3.1)
+        on_version.assert_not_called()
+
+    async def test_negotiated_api_protocol_version_is_reported(self):
+        on_version = MagicMock()
+        subject = TuyaLocalDevice(
+            "Some name",
+            "some_dev_id",
+            "some.ip.address",
+            "some_local_key",
+            self.hass(),
+            on_protocol_version=on_version,
+        )
+        self.mock_connection.async_status.side_effect = [
             Exception("Error"),
+            {"dps": {"1": False}},
+        ]
+
+        await subject.async_refresh_now()
+
+        on_version.assert_called_once_with(3.1)
+
+    async def test_unreachable_device_is_not_contacted_until_backoff_passes(self):
+        self.mock_connection.async_status.side_effect = Exception("Error")
+        await self.subject.async_refresh_now()
+        self.assertEqual(self.mock_connection.async_status.await_count, 4)
+        self.assertFalse(self.subject._breaker.closed)
+
+        await self.subject.async_refresh_now()
+        self.assertFalse(await self.subject._async_send_properties({"1": True}))
+
+        self.assertEqual(self.mock_connection.async_status.await_count, 4)
+        self.mock_connection.async_control.assert_not_awaited()
+        self.mock_connection.async_probe.assert_not_awaited()
+
+    async def test_unreachable_device_is_probed_after_backoff(self):
+        self.mock_connection.async_status.side_effect = Exception("Error")
+        await self.subject.async_refresh_now()
+        self.mock_connection.async_probe.side_effect = ConnectionError("Down")
+        self.subject._breaker._retry_at = 0
+
+        await self.subject.async_refresh_now()
+
+        self.mock_connection.async_probe.assert_awaited_once()
+        self.assertEqual(self.mock_connection.async_status.await_count, 4)
+        self.assertEqual(self.subject._breaker.backoff, 60)
+
+    async def test_device_recovers_after_successful_probe(self):
+        self.mock_connection.async_status.side_effect = Exception("Error")
+        await self.subject.async_refresh_now()
+        self.subject._breaker._retry_at = 0
+        self.mock_connection.async_status.side_effect = None
+        self.mock_connection.async_status.return_value = {"dps": {"1": True}}
+
+        await self.subject.async_refresh_now()
+
+        self.mock_connection.async_probe.assert_awaited_once()
+        self.assertTrue(self.subject._breaker.closed)
+        self.assertTrue(self.subject.available)
+
+    def test_update_from_discovery_moves_connection(self):
+        self.mock_connection.host = "some.ip.address"
+        self.subject._breaker.record_failure()
+
+        self.subject.update_from_discovery("192.168.1.21", 3.3)
+
+        self.mock_connection.update_host.assert_called_once_with("192.168.1.21")
+        self.assertTrue(self.subject._breaker.allow_probe())
+
+    def test_update_from_discovery_sets_protocol_version(self):
+        self.mock_connection.host = "some.ip.address"
+        on_version = MagicMock()
+        self.subject._on_protocol_version = on_version
+
+        self.subject.update_from_discovery("some.ip.address", 3.1)
+
+        self.mock_connection.update_host.assert_not_called()
+        self.assertEqual(self.subject.protocol_version, 3.1)
+        on_version.assert_called_once_with(3.1)
+
+    async def test_stats_count_latency_retries_and_failures(self):
+        self.mock_connection.async_status.side_effect = [
             Exception("Error"),
-            Exception("Error"),
-            Exception("Error"),
-            Exception("Error"),
+            {"dps": {"1": True}},
         ]
-        self.subject.refresh()
-        self.subject.refresh()
-        self.subject.refresh()
+        self.mock_connection.bytes_sent = 100
+        self.mock_connection.bytes_received = 200
+        await self.subject.async_refresh_now()
+        self.mock_connection.async_control.side_effect = Exception("Error")
+        await self.subject._async_send_properties({"1": False})
+
+        stats = self.subject.stats
+        self.assertEqual(stats["polls"]["count"], 1)
+        self.assertEqual(stats["commands"]["count"], 0)
+        self.assertEqual(stats["retries"], 4)
+        self.assertEqual(stats["failures"], 1)
+        self.assertEqual(stats["bytes_sent"], 100)
+        self.assertEqual(stats["bytes_received"], 200)
+        self.assertEqual(stats["protocol_version"], 3.1)
+        self.assertEqual(stats["circuit"], "open")
+
+    def test_available(self):
+        self.subject._cached_state = {"1": True, "updated_at": time()}
+        self.assertTrue(self.subject.available)
 
-        self.subject._api.set_version.assert_has_calls([call(3.1), call(3.3)])
+        self.subject._breaker.record_failure()
+        self.assertFalse(self.subject.available)
 
     def test_reset_cached_state_clears_cached_state_and_pending_updates(self):
         self.subject._cached_state = {"1": True, "updated_at": time()}
@@ -225,57 +464,386 @@ class TestDevice(IsolatedAsyncioTestCase):
 
         self.assertEqual(self.subject.get_property("1"), True)
 
-    def test_get_property_returns_none_when_value_does_not_exist(self):
+    def test_state_snapshot_is_reused_until_state_changes(self):
+        self.subject._cached_state = {"1": True, "updated_at": 0}
+        snapshot = self.subject._get_cached_state()
+        version = self.subject.state_version
+        self.assertIs(self.subject._get_cached_state(), snapshot)
+        self.assertEqual(self.subject.state_version, version)
+        with self.assertRaises(TypeError):
+            snapshot["1"] = False
+
+        self.subject.anticipate_property_value("1", False)
+        self.assertEqual(self.subject.get_property("1"), False)
+        self.assertGreater(self.subject.state_version, version)
+
+    def test_state_snapshot_is_rebuilt_when_pending_update_expires(self):
         self.subject._cached_state = {"1": True}
-        self.assertIs(self.subject.get_property("2"), None)
+        self.subject._pending_updates = {
+            "1": {"value": False, "updated_at": time() - 9.9}
+        }
+        self.assertEqual(self.subject.get_property("1"), False)
+        version = self.subject.state_version
 
-    async def test_async_set_property_schedules_job(self):
-        async_job = AsyncMock()
-        self.subject._hass.async_add_executor_job.return_value = awaitable = async_job()
+        with patch("custom_components.tuya_local.device.time") as mock_time:
+            mock_time.return_value = time() + 1
+            self.assertEqual(self.subject.get_property("1"), True)
+            self.assertGreater(self.subject.state_version, version)
+        self.assertEqual(self.subject._pending_updates, {})
 
-        await self.subject.async_set_property("1", False)
+    def test_pushed_status_invalidates_snapshot(self):
+        self.subject._cached_state = {"1": True, "updated_at": 0}
+        self.assertEqual(self.subject.get_property("1"), True)
+        self.subject._handle_pushed_status({"1": False})
+        self.assertEqual(self.subject.get_property("1"), False)
 
-        self.subject._hass.async_add_executor_job.assert_called_once_with(
-            self.subject.set_property, "1", False
-        )
-        async_job.assert_awaited()
+    def test_get_property_returns_none_when_value_does_not_exist(self):
+        self.subject._cached_state = {"1": True}
+        self.assertIs(self.subject.get_property("2"), None)
 
-    def test_set_property_immediately_stores_new_value_to_pending_updates(self):
-        self.subject.set_property("1", False)
+    async def test_set_property_immediately_stores_new_value_to_pending_updates(
+        self,
+    ):
+        await self.subject.async_set_property("1", False)
         self.subject._cached_state = {"1": True}
         self.assertEqual(self.subject.get_property("1"), False)
-        # wait for the debounce timer to avoid a teardown error
-        sleep(2)
 
-    def test_debounces_multiple_set_calls_into_one_api_call(self):
-        with patch("custom_components.tuya_local.device.Timer") as mock:
-            self.subject.set_property("1", True)
-            mock.assert_called_once_with(0.001, self.subject._send_pending_updates)
+    async def test_set_properties_notifies_entities_of_the_new_values(self):
+        switch = MagicMock()
+        switch.dps_ids = {"1"}
+        sensor = MagicMock()
+        sensor.dps_ids = {"19"}
+        self.subject.register_entity(switch)
+        self.subject.register_entity(sensor)
+
+        await self.subject.async_set_property("1", True)
+
+        switch.async_write_ha_state.assert_called_once()
+        sensor.async_write_ha_state.assert_not_called()
+
+    async def test_command_acknowledged_but_not_applied_is_reverted(self):
+        entity = MagicMock()
+        entity.dps_ids = {"1"}
+        self.subject._entities.append(entity)
+        self.subject._hass.async_create_task.side_effect = asyncio.ensure_future
+        self.mock_connection.async_status.return_value = {"dps": {"1": False}}
+
+        with patch("custom_components.tuya_local.device.time") as mock_time:
+            mock_time.return_value = 100
+            await self.subject._async_scheduled_poll()
+            await self.subject.async_set_properties({"1": True})
+            await self.subject._async_control({"1": True})
+            self.assertEqual(entity.async_write_ha_state.call_count, 2)
+            self.assertIs(self.subject.get_property("1"), True)
+
+            mock_time.return_value = 101 + self.subject._FAKE_IT_TIL_YOU_MAKE_IT_TIMEOUT
+            await self.subject._async_scheduled_poll()
+            self.assertIs(self.subject.get_property("1"), False)
+            self.assertEqual(entity.async_write_ha_state.call_count, 3)
+
+            await self.subject._async_scheduled_poll()
+            self.assertEqual(entity.async_write_ha_state.call_count, 3)
+
+    async def test_coalesces_multiple_set_calls_into_one_api_call(self):
+        self.subject._hass.loop = asyncio.get_running_loop()
+        self.subject._hass.async_create_task.side_effect = asyncio.ensure_future
+
+        first = await self.subject.async_set_property("1", True)
+        second = await self.subject.async_set_properties({"2": False, "3": 1})
+        self.assertEqual(self.subject._writer.pending, {"1": True, "2": False, "3": 1})
+
+        self.assertTrue(await first)
+        self.assertTrue(await second)
+        self.mock_connection.async_control.assert_awaited_once_with(
+            {"1": True, "2": False, "3": 1}
+        )
 
-            debounce = self.subject._debounce
-            mock.reset_mock()
+    async def test_set_property_future_is_false_when_sending_fails(self):
+        self.subject._hass.loop = asyncio.get_running_loop()
+        self.subject._hass.async_create_task.side_effect = asyncio.ensure_future
+        self.mock_connection.async_control.side_effect = ConnectionError()
 
-            self.subject.set_property("2", False)
-            debounce.cancel.assert_called_once()
-            mock.assert_called_once_with(1, self.subject._send_pending_updates)
+        result = await self.subject.async_set_property("1", True)
 
-            self.subject._api.generate_payload.return_value = "payload"
-            self.subject._send_pending_updates()
-            self.subject._api.generate_payload.assert_called_once_with(
-                tinytuya.CONTROL, {"1": True, "2": False}
-            )
-            self.subject._api._send_receive.assert_called_once_with("payload")
+        self.assertFalse(await result)
+        self.assertEqual(self.mock_connection.async_control.await_count, 4)
 
-    def test_set_properties_takes_no_action_when_no_properties_are_provided(self):
-        with patch("custom_components.tuya_local.device.Timer") as mock:
-            self.subject._set_properties({})
-            mock.assert_not_called()
+    async def test_set_properties_takes_no_action_when_no_properties_are_provided(
+        self,
+    ):
+        await self.subject.async_set_properties({})
+        self.subject._hass.loop.call_later.assert_not_called()
 
     def test_anticipate_property_value_updates_cached_state(self):
         self.subject._cached_state = {"1": True}
         self.subject.anticipate_property_value("1", False)
         self.assertEqual(self.subject._cached_state["1"], False)
 
+    def test_push_enabled_only_with_persistent_connection(self):
+        self.assertFalse(self.subject.push_enabled)
+        self.mock_connection.persistent = True
+        self.assertTrue(self.subject.push_enabled)
+
+    def test_pushed_status_is_merged_and_entities_notified(self):
+        entity = MagicMock()
+        entity.dps_ids = {"2"}
+        self.subject.register_entity(entity)
+        self.subject._cached_state = {"1": True, "2": 20, "updated_at": 0}
+
+        self.subject._handle_pushed_status({"2": 25})
+
+        self.assertEqual(self.subject.get_property("1"), True)
+        self.assertEqual(self.subject.get_property("2"), 25)
+        self.assertTrue(time() - 1 <= self.subject._cached_state["updated_at"])
+        entity.async_write_ha_state.assert_called_once()
+
+        self.subject.unregister_entity(entity)
+        self.subject._handle_pushed_status({"2": 20})
+        entity.async_write_ha_state.assert_called_once()
+
+    def test_registering_first_entity_starts_safety_poll(self):
+        self.mock_connection.persistent = True
+        subject = self.subject
+        with patch(
+            "custom_components.tuya_local.device.async_track_time_interval"
+        ) as mock_track:
+            subject.register_entity(MagicMock())
+            subject.register_entity(MagicMock())
+            mock_track.assert_called_once()
+            subject._hass.async_create_task.assert_called_once()
+            subject.close()
+            mock_track.return_value.assert_called_once()
+
+    def test_registering_entity_starts_scheduled_polls(self):
+        subject = self.subject
+        subject._scheduler = scheduler = MagicMock()
+        entity = MagicMock()
+        subject.register_entity(entity)
+        scheduler.start.assert_called_once()
+
+        subject.unregister_entity(entity)
+        scheduler.stop.assert_called_once()
+
+    def test_poll_interval_is_configurable(self):
+        subject = TuyaLocalDevice(
+            "Some name",
+            "some_dev_id",
+            "some.ip.address",
+            "some_local_key",
+            self.hass(),
+            poll_interval=(timedelta(seconds=40), timedelta(minutes=5)),
+        )
+        self.assertEqual(subject.poll_interval, 40)
+
+    async def test_scheduled_poll_reports_changes(self):
+        entity = MagicMock()
+        entity.dps_ids = {"1"}
+        self.subject._entities.append(entity)
+        self.subject._cached_state = {"1": True, "updated_at": 0}
+        self.subject._hass.async_create_task.side_effect = asyncio.ensure_future
+        self.mock_connection.async_status.return_value = {"dps": {"1": True}}
+
+        self.assertFalse(await self.subject._async_scheduled_poll())
+        entity.async_write_ha_state.assert_not_called()
+
+        self.mock_connection.async_status.return_value = {"dps": {"1": False}}
+        self.assertTrue(await self.subject._async_scheduled_poll())
+        self.assertEqual(self.mock_connection.async_status.await_count, 2)
+        entity.async_write_ha_state.assert_called_once()
+
+    def test_only_entities_depending_on_changed_dps_are_notified(self):
+        heater = MagicMock()
+        heater.dps_ids = {"1", "2"}
+        sensor = MagicMock()
+        sensor.dps_ids = {"3"}
+        diagnostics = MagicMock()
+        diagnostics.dps_ids = None
+        for entity in (heater, sensor, diagnostics):
+            self.subject._entities.append(entity)
+        self.subject._cached_state = {"1": True, "2": 20, "3": 5, "updated_at": 0}
+
+        self.subject._handle_pushed_status({"2": 25, "3": 5})
+
+        heater.async_write_ha_state.assert_called_once()
+        sensor.async_write_ha_state.assert_not_called()
+        diagnostics.async_write_ha_state.assert_called_once()
+
+    async def test_all_entities_are_notified_when_availability_changes(self):
+        entity = MagicMock()
+        entity.dps_ids = {"2"}
+        self.subject._entities.append(entity)
+        self.subject._cached_state = {"1": True, "updated_at": 0}
+        self.subject._hass.async_create_task.side_effect = asyncio.ensure_future
+        self.mock_connection.async_status.side_effect = ConnectionError()
+
+        await self.subject._async_scheduled_poll()
+
+        entity.async_write_ha_state.assert_called_once()
+
+    async def test_failed_scheduled_poll_is_not_a_change(self):
+        self.subject._cached_state = {"1": True, "updated_at": 0}
+        self.subject._hass.async_create_task.side_effect = asyncio.ensure_future
+        self.mock_connection.async_status.side_effect = ConnectionError()
+
+        self.assertFalse(await self.subject._async_scheduled_poll())
+
+    async def test_refresh_dps_merges_into_cached_state(self):
+        self.subject._cached_state = {"1": True, "19": 0, "updated_at": 5}
+        self.mock_connection.async_update_dps = AsyncMock(
+            return_value={"dps": {"19": 125}}
+        )
+
+        await self.subject.async_refresh_dps({"19"})
+
+        self.mock_connection.async_update_dps.assert_awaited_once_with({"19"})
+        self.mock_connection.async_status.assert_not_awaited()
+        self.assertEqual(self.subject.get_property("1"), True)
+        self.assertEqual(self.subject.get_property("19"), 125)
+        self.assertEqual(self.subject._cached_state["updated_at"], 5)
+        self.assertEqual(self.subject.stats["partial_polls"]["count"], 1)
+
+    async def test_refresh_dps_falls_back_to_full_refresh(self):
+        self.subject._cached_state = {"1": True, "19": 0, "updated_at": 5}
+        self.subject._hass.async_create_task.side_effect = asyncio.ensure_future
+        self.mock_connection.async_update_dps = AsyncMock(
+            side_effect=asyncio.TimeoutError()
+        )
+        self.mock_connection.async_status.return_value = {"dps": {"1": True, "19": 125}}
+
+        await self.subject.async_refresh_dps({"19"})
+        self.assertEqual(self.subject.get_property("19"), 125)
+        self.mock_connection.async_status.assert_awaited_once()
+
+        # Once the device has not answered, full refreshes are used.
+        await self.subject.async_refresh_dps({"19"})
+        self.mock_connection.async_update_dps.assert_awaited_once()
+
+    async def test_refresh_dps_is_full_until_state_is_known(self):
+        self.subject._hass.async_create_task.side_effect = asyncio.ensure_future
+        self.mock_connection.async_update_dps = AsyncMock()
+        self.mock_connection.async_status.return_value = {"dps": {"19": 125}}
+
+        await self.subject.async_refresh_dps({"19"})
+
+        self.mock_connection.async_update_dps.assert_not_awaited()
+        self.assertEqual(self.subject.get_property("19"), 125)
+
+    def test_fast_dps_are_polled_while_in_use(self):
+        subject = TuyaLocalDevice(
+            "Some name",
+            "some_dev_id",
+            "some.ip.address",
+            "some_local_key",
+            self.hass(),
+            fast_dps={"18", "19"},
+        )
+        subject._fast_scheduler = scheduler = MagicMock()
+        switch = MagicMock()
+        switch.dps_ids = {"1"}
+        power = MagicMock()
+        power.dps_ids = {"19"}
+
+        subject.register_entity(switch)
+        scheduler.start.assert_not_called()
+        subject.register_entity(power)
+        scheduler.start.assert_called_once()
+        self.assertEqual(subject.fast_dps_in_use, {"19"})
+
+        subject.unregister_entity(power)
+        scheduler.stop.assert_called()
+        self.assertEqual(subject.fast_dps_in_use, set())
+
+    async def test_fast_poll_updates_entities_once_per_window(self):
+        subject = TuyaLocalDevice(
+            "Some name",
+            "some_dev_id",
+            "some.ip.address",
+            "some_local_key",
+            self.hass(),
+            fast_dps={"19"},
+            energy_dps={"19"},
+        )
+        entity = MagicMock()
+        entity.dps_ids = {"19"}
+        subject._entities.append(entity)
+        subject._cached_state = {"1": True, "19": 0, "updated_at": 5}
+        self.mock_connection.async_update_dps = AsyncMock()
+
+        with patch("custom_components.tuya_local.device.time") as mock_time:
+            for at, power in ((100, 0), (110, 1000), (120, 1000), (130, 1000)):
+                mock_time.return_value = at
+                self.mock_connection.async_update_dps.return_value = {
+                    "dps": {"19": power}
+                }
+                changed = await subject._async_fast_poll()
+                self.assertEqual(changed, at == 110)
+                if at < 130:
+                    entity.async_write_ha_state.assert_not_called()
+
+        entity.async_write_ha_state.assert_called_once()
+        meter = subject.meter("19")
+        self.assertEqual(meter.summary, {"min": 0, "mean": 750, "max": 1000})
+        # 500W for 10s, then 1000W for 20s
+        self.assertAlmostEqual(meter.energy, 25000 / 3600)
+        self.assertIsNone(subject.meter("1"))
+
+    async def test_full_polls_are_metered_without_partial_refresh(self):
+        subject = TuyaLocalDevice(
+            "Some name",
+            "some_dev_id",
+            "some.ip.address",
+            "some_local_key",
+            self.hass(),
+            fast_dps={"19"},
+            energy_dps={"19"},
+        )
+        subject._partial_refresh = False
+        subject._hass.async_create_task.side_effect = asyncio.ensure_future
+        entity = MagicMock()
+        entity.dps_ids = {"19"}
+        subject._entities.append(entity)
+        self.mock_connection.async_status.return_value = {
+            "dps": {"1": True, "19": 1000}
+        }
+
+        with patch("custom_components.tuya_local.device.time") as mock_time:
+            for at in (100, 110, 120):
+                mock_time.return_value = at
+                self.assertFalse(await subject._async_fast_poll())
+                await subject._async_scheduled_poll()
+
+        self.mock_connection.async_update_dps.assert_not_called()
+        # 1000W for 20s
+        self.assertAlmostEqual(subject.meter("19").energy, 20000 / 3600)
+
+    def test_pushed_status_is_metered(self):
+        subject = TuyaLocalDevice(
+            "Some name",
+            "some_dev_id",
+            "some.ip.address",
+            "some_local_key",
+            self.hass(),
+            fast_dps={"19"},
+            energy_dps={"19"},
+        )
+        entity = MagicMock()
+        entity.dps_ids = {"19"}
+        subject._entities.append(entity)
+        subject._cached_state = {"1": True, "19": 0, "updated_at": 5}
+
+        with patch("custom_components.tuya_local.device.time") as mock_time:
+            for at in (100, 130):
+                mock_time.return_value = at
+                subject._handle_pushed_status({"19": 1000})
+
+        meter = subject.meter("19")
+        self.assertEqual(meter.summary, {"min": 1000, "mean": 1000, "max": 1000})
+        self.assertAlmostEqual(meter.energy, 30000 / 3600)
+
+    def test_close_closes_connection(self):
+        self.subject.close()
+        self.mock_connection.close.assert_called_once()
+
     def test_get_key_for_value_returns_key_from_object_matching_value(self):
         obj = {"key1": "value1", "key2": "value2"}
 
@@ -287,3 +855,76 @@ class TestDevice(IsolatedAsyncioTestCase):
         self.assertEqual(
             TuyaLocalDevice.get_key_for_value(obj, "value3", fallback="fb"), "fb"
         )
+
+
+class TestBulkDetection(IsolatedAsyncioTestCase):
+    async def test_detects_devices_concurrently_within_limit(self):
+        active = 0
+        peak = 0
+        cfg = MagicMock()
+        cfg.config_type = "kogan_kahtp_heater"
+
+        def make_device(name, dev_id, address, local_key, hass, **kwargs):
+            device = MagicMock()
+
+            async def ranked():
+                nonlocal active, peak
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+                return [(cfg, 100)] if dev_id != "unknown" else []
+
+            device.async_ranked_types = ranked
+            return device
+
+        hass = MagicMock()
+        hass.data = {}
+        hass.async_add_executor_job = AsyncMock()
+        devices = [(f"dev{i}", f"host{i}", "key") for i in range(5)]
+        devices.append(("unknown", "host", "key"))
+        with patch(
+            "custom_components.tuya_local.device.TuyaLocalDevice",
+            side_effect=make_device,
+        ), patch("custom_components.tuya_local.device.Store") as mock_store:
+            mock_store.return_value.async_load = AsyncMock(return_value=None)
+            results = await async_detect_types(hass, devices, concurrency=2)
+
+        self.assertEqual(peak, 2)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(results["dev0"]["type"], "kogan_kahtp_heater")
+        self.assertEqual(results["dev0"]["matches"], [("kogan_kahtp_heater", 100)])
+        self.assertGreater(results["dev0"]["elapsed"], 0)
+        self.assertIsNone(results["unknown"]["type"])
+
+    async def test_failure_of_one_device_does_not_stop_the_others(self):
+        cfg = MagicMock()
+        cfg.config_type = "kogan_kahtp_heater"
+
+        def make_device(name, dev_id, address, local_key, hass, **kwargs):
+            device = MagicMock()
+            if dev_id == "broken":
+                device.async_ranked_types = AsyncMock(side_effect=Exception("Boom"))
+            else:
+                device.async_ranked_types = AsyncMock(return_value=[(cfg, 100)])
+            return device
+
+        hass = MagicMock()
+        hass.data = {}
+        hass.async_add_executor_job = AsyncMock()
+        devices = [("dev0", "host0", "key"), ("broken", "host1", "key")]
+        with patch(
+            "custom_components.tuya_local.device.TuyaLocalDevice",
+            side_effect=make_device,
+        ), patch("custom_components.tuya_local.device.Store") as mock_store:
+            mock_store.return_value.async_load = AsyncMock(return_value=None)
+            with self.assertLogs(
+                "custom_components.tuya_local.device", level="WARNING"
+            ) as logs:
+                results = await async_detect_types(hass, devices)
+
+        self.assertEqual(results["dev0"]["type"], "kogan_kahtp_heater")
+        self.assertEqual(
+            results["broken"], {"type": None, "matches": [], "elapsed": None}
+        )
+        self.assertIn("broken", logs.output[0])
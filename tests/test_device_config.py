@@ -1,13 +1,64 @@
 """Test the config parser"""
+import asyncio
+import os
+from datetime import timedelta
+from tempfile import TemporaryDirectory
 from unittest import IsolatedAsyncioTestCase
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from custom_components.tuya_local.helpers.device_config import (
+    async_load_config_index,
     available_configs,
+    config_index,
     get_config,
+    load_config_index,
+    possible_matches,
+    ranked_matches,
     TuyaDeviceConfig,
 )
 
+from . import const
+
+
+def linear_map_for_dps(dps, value):
+    """The mapping lookup for a dps value, as a scan of the mapping list."""
+    default = None
+    for m in dps._config.get("mapping", {}):
+        if "dps_val" not in m:
+            default = m
+        elif dps.rawtype == "bitfield" and m["dps_val"]:
+            try:
+                if int(value) & int(m["dps_val"]):
+                    return m
+            except (TypeError, ValueError):
+                pass
+        elif str(value) == str(m["dps_val"]):
+            return m
+    return default
+
+
+def linear_map_for_value(dps, value, device):
+    """The mapping lookup for an entity value, as a scan of the mapping list."""
+    default = None
+    for m in dps._config.get("mapping", {}):
+        if "dps_val" not in m:
+            default = m
+        if "value" in m and str(m["value"]) == str(value):
+            return m
+        if "value" not in m and "value_mirror" in m:
+            r_dps = dps._entity.find_dps(m["value_mirror"])
+            if str(r_dps.get_value(device)) == str(value):
+                return m
+        for c in m.get("conditions", {}):
+            if "value" in c and str(c["value"]) == str(value):
+                return m
+            if "value" not in c and "value_mirror" in c:
+                r_dps = dps._entity.find_dps(c["value_mirror"])
+                if str(r_dps.get_value(device)) == str(value):
+                    return m
+    return default
+
+
 from .const import (
     GPPH_HEATER_PAYLOAD,
     KOGAN_HEATER_PAYLOAD,
@@ -78,3 +129,211 @@ class TestDeviceConfig(IsolatedAsyncioTestCase):
         """Test that config file is returned by config"""
         cfg = get_config("kogan_switch")
         self.assertEqual(cfg.config, "smartplugv1.yaml")
+
+    def test_poll_interval(self):
+        """Test that poll interval limits are read from the config."""
+        self.assertEqual(
+            get_config("smartplugv2_energy").poll_interval,
+            (timedelta(seconds=5), timedelta(minutes=2)),
+        )
+        self.assertEqual(
+            get_config("kogan_switch").poll_interval,
+            (timedelta(seconds=10), timedelta(minutes=2)),
+        )
+
+    def test_fast_dps(self):
+        """Test that fast-changing dps and their interval are read."""
+        cfg = get_config("smartplugv2_energy")
+        self.assertEqual(cfg.fast_dps_ids, {"18", "19", "20"})
+        self.assertEqual(cfg.fast_poll_interval, timedelta(seconds=5))
+        self.assertEqual(get_config("goldair_dehumidifier").fast_dps_ids, set())
+
+    def test_energy_dps(self):
+        """Test that metered power dps are found for integration."""
+        self.assertEqual(get_config("smartplugv2_energy").energy_dps_ids, {"19"})
+        self.assertEqual(get_config("goldair_dehumidifier").energy_dps_ids, set())
+
+    def test_entity_and_dps_configs_are_built_once(self):
+        """Test that config objects are reused rather than rebuilt."""
+        cfg = get_config("kogan_switch")
+        self.assertIs(cfg.primary_entity, cfg.primary_entity)
+        entity = cfg.primary_entity
+        self.assertIs(entity.find_dps("switch"), entity.find_dps("switch"))
+        self.assertIs(entity.find_dps("switch"), next(entity.dps()))
+        self.assertFalse(hasattr(entity, "__dict__"))
+        self.assertFalse(hasattr(entity.find_dps("switch"), "__dict__"))
+
+    def test_entity_dps_ids(self):
+        """Test that an entity depends on all of its dps."""
+        cfg = get_config("inkbird_itc308_thermostat")
+        entity = cfg.primary_entity
+        self.assertEqual(entity.dps_ids, {d.id for d in entity.dps()})
+        self.assertIn(entity.find_dps("temperature_unit").id, entity.dps_ids)
+
+    async def test_stringified_values_are_tracked_per_device(self):
+        """Test that devices sharing a config do not share stringify state."""
+        cfg = get_config("deta_fan")
+        speed = cfg.primary_entity.find_dps("speed")
+        str_device = MagicMock()
+        str_device.get_property.return_value = "1"
+        int_device = MagicMock()
+        int_device.get_property.return_value = 1
+        speed.get_value(str_device)
+        speed.get_value(int_device)
+        self.assertEqual(speed.get_values_to_set(str_device, 66.7), {speed.id: "2"})
+        self.assertEqual(speed.get_values_to_set(int_device, 66.7), {speed.id: 2})
+
+    def test_compiled_mappings_agree_with_linear_scan(self):
+        """Test the mapping lookup tables against scanning the mapping list."""
+        device = MagicMock()
+        device.get_property.return_value = "mirrored"
+        mirroring = TuyaDeviceConfig(
+            "mirroring.yaml",
+            {
+                "name": "Mirroring",
+                "primary_entity": {
+                    "entity": "select",
+                    "dps": [
+                        {
+                            "id": 1,
+                            "name": "option",
+                            "type": "string",
+                            "mapping": [
+                                {"dps_val": "a", "value": "A"},
+                                {"dps_val": "m", "value_mirror": "other"},
+                                {"dps_val": "b", "value": "mirrored"},
+                                {
+                                    "dps_val": "c",
+                                    "constraint": "other",
+                                    "conditions": [
+                                        {"dps_val": "x", "value_mirror": "other"},
+                                        {"dps_val": "y", "value": "Y"},
+                                    ],
+                                },
+                                {"value": "D"},
+                            ],
+                        },
+                        {"id": 2, "name": "other", "type": "string"},
+                    ],
+                },
+            },
+        )
+        for cfg in [*config_index().configs, mirroring]:
+            for entity in [cfg.primary_entity, *cfg.secondary_entities()]:
+                for dps in entity.dps():
+                    mappings = dps._config.get("mapping", [])
+                    candidates = [None, 0, 1, 2, 3, 8, "1", "x", True, False]
+                    candidates += [m.get("dps_val") for m in mappings]
+                    candidates += [m.get("value") for m in mappings]
+                    for m in mappings:
+                        candidates += [c.get("value") for c in m.get("conditions", [])]
+                    candidates.append("mirrored")
+                    for v in candidates:
+                        self.assertIs(
+                            dps._find_map_for_dps(v),
+                            linear_map_for_dps(dps, v),
+                            msg=f"{cfg.config} {dps.name} dps_val {v}",
+                        )
+                        self.assertIs(
+                            dps._find_map_for_value(v, device),
+                            linear_map_for_value(dps, v, device),
+                            msg=f"{cfg.config} {dps.name} value {v}",
+                        )
+
+    def test_get_config_uses_index(self):
+        """Test that configs are only parsed once."""
+        self.assertIs(get_config("kogan_switch"), get_config("kogan_switch"))
+        self.assertIs(get_config("smartplugv1"), get_config("kogan_switch"))
+        self.assertIsNone(get_config("not_a_device"))
+
+    def test_possible_matches_in_file_order(self):
+        """Test that indexed matching gives the same results as a file scan."""
+        dps = {**KOGAN_HEATER_PAYLOAD, "updated_at": 0}
+        expected = [
+            cfg for cfg in available_configs() if TuyaDeviceConfig(cfg).matches(dps)
+        ]
+        self.assertEqual([cfg.config for cfg in possible_matches(dps)], expected)
+
+    def test_ranked_matches_agree_with_linear_scan(self):
+        """Test the inverted index against checking every config in turn."""
+        payloads = [
+            getattr(const, name) for name in dir(const) if name.endswith("_PAYLOAD")
+        ]
+        configs = [TuyaDeviceConfig(cfg) for cfg in available_configs()]
+        for dps in payloads:
+            dps = {**dps, "updated_at": 0}
+            expected = [
+                (cfg.config, cfg.match_quality(dps))
+                for cfg in configs
+                if cfg.matches(dps)
+            ]
+            expected.sort(key=lambda m: m[1], reverse=True)
+            self.assertEqual(
+                [(cfg.config, q) for cfg, q in ranked_matches(dps)],
+                expected,
+                msg=f"dps {dps}",
+            )
+
+    def test_configs_with_same_signature_are_grouped(self):
+        """Test that configs are indexed by dps signature."""
+        index = config_index()
+        for cfg in index.configs:
+            self.assertIn(cfg, index.by_signature[cfg.dps_signature])
+
+    def test_config_cache_is_invalidated_by_mtime(self):
+        """Test that the cache file is used for configs that are unchanged."""
+        with TemporaryDirectory() as tmp:
+            cache_file = os.path.join(tmp, "cache")
+            first = load_config_index(cache_file)
+            self.assertTrue(os.path.exists(cache_file))
+
+            with patch(
+                "custom_components.tuya_local.helpers.device_config.load_yaml"
+            ) as mock_load:
+                second = load_config_index(cache_file)
+                mock_load.assert_not_called()
+            self.assertEqual(
+                [cfg._config for cfg in second.configs],
+                [cfg._config for cfg in first.configs],
+            )
+
+            real_stat = os.stat
+
+            def touched(path, *args, **kwargs):
+                result = real_stat(path, *args, **kwargs)
+                if path.endswith("kogan_kahtp_heater.yaml"):
+                    return os.stat_result(result[:8] + (result.st_mtime + 1, 0))
+                return result
+
+            with patch(
+                "custom_components.tuya_local.helpers.device_config.stat", touched
+            ):
+                with patch(
+                    "custom_components.tuya_local.helpers.device_config.load_yaml",
+                    return_value=first.by_config_type["kogan_kahtp_heater"]._config,
+                ) as mock_load:
+                    load_config_index(cache_file)
+                    mock_load.assert_called_once()
+        load_config_index()
+
+    async def test_config_index_is_built_once_for_concurrent_setups(self):
+        """Test that entries set up together share one build of the index."""
+        loop = asyncio.get_running_loop()
+        hass = MagicMock()
+        hass.data = {}
+        hass.async_add_executor_job.side_effect = (
+            lambda func, *args: loop.run_in_executor(None, func, *args)
+        )
+        with TemporaryDirectory() as tmp:
+            hass.config.path.return_value = os.path.join(tmp, "cache")
+            with patch(
+                "custom_components.tuya_local.helpers.device_config._config_index",
+                None,
+            ):
+                await asyncio.gather(
+                    *(async_load_config_index(hass) for _ in range(20))
+                )
+            hass.async_add_executor_job.assert_called_once()
+            # The cache was saved without leaving temporary files behind
+            self.assertEqual(os.listdir(tmp), ["cache"])
+        self.assertEqual(hass.data, {})
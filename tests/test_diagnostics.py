@@ -0,0 +1,33 @@
+"""Tests for the diagnostics download."""
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+from unittest.mock import MagicMock
+
+from custom_components.tuya_local.const import (
+    CONF_DEVICE_ID,
+    CONF_LOCAL_KEY,
+    CONF_TYPE,
+    DOMAIN,
+)
+from custom_components.tuya_local.diagnostics import (
+    async_get_config_entry_diagnostics,
+)
+
+
+async def test_diagnostics_include_device_stats(hass):
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            CONF_TYPE: "kogan_kahtp_heater",
+            CONF_DEVICE_ID: "dummy",
+            CONF_LOCAL_KEY: "secret",
+        },
+    )
+    m_device = MagicMock()
+    m_device.stats = {"retries": 2}
+    hass.data[DOMAIN] = {"dummy": {"device": m_device}}
+
+    result = await async_get_config_entry_diagnostics(hass, entry)
+
+    assert result["config"][CONF_LOCAL_KEY] == "**REDACTED**"
+    assert result["config"][CONF_TYPE] == "kogan_kahtp_heater"
+    assert result["device"] == {"retries": 2}
@@ -0,0 +1,128 @@
+"""Tests for discovery of devices from their UDP broadcasts."""
+import json
+import struct
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import MagicMock
+
+from Crypto.Cipher import AES
+
+from custom_components.tuya_local.discovery import (
+    DATA_DISCOVERY,
+    TuyaDiscovery,
+    async_start_discovery,
+    stop_discovery,
+)
+from custom_components.tuya_local.protocol import (
+    UDP_KEY,
+    TuyaProtocolError,
+    decode_discovery,
+    pack_message,
+)
+
+BROADCAST = 0x13
+
+
+def broadcast(info, encrypt=True):
+    """Build a discovery message as broadcast by a device."""
+    payload = json.dumps(info).encode()
+    if encrypt:
+        padnum = AES.block_size - len(payload) % AES.block_size
+        payload = AES.new(UDP_KEY, AES.MODE_ECB).encrypt(
+            payload + bytes([padnum]) * padnum
+        )
+    return pack_message(0, BROADCAST, struct.pack(">I", 0) + payload)
+
+
+INFO = {"ip": "192.168.1.20", "gwId": "some_dev_id", "version": "3.3"}
+
+
+class TestDecodeDiscovery(TestCase):
+    def test_decode_encrypted(self):
+        self.assertEqual(decode_discovery(broadcast(INFO)), INFO)
+
+    def test_decode_plain(self):
+        self.assertEqual(decode_discovery(broadcast(INFO, encrypt=False)), INFO)
+
+    def test_decode_garbage_fails(self):
+        with self.assertRaises(TuyaProtocolError):
+            decode_discovery(b"garbage")
+        with self.assertRaises(TuyaProtocolError):
+            decode_discovery(pack_message(0, BROADCAST, b"\x01" * 16))
+
+
+class TestDiscovery(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.subject = TuyaDiscovery()
+        self.listener = MagicMock()
+
+    def test_records_broadcasting_devices(self):
+        self.subject.handle_datagram(broadcast(INFO), ("192.168.1.20", 6667))
+        self.assertEqual(self.subject.devices, {"some_dev_id": ("192.168.1.20", 3.3)})
+
+    def test_tells_listener_of_changes(self):
+        self.subject.register("some_dev_id", self.listener)
+        self.subject.handle_datagram(broadcast(INFO), ("192.168.1.20", 6667))
+        self.subject.handle_datagram(broadcast(INFO), ("192.168.1.20", 6667))
+        self.listener.assert_called_once_with("192.168.1.20", 3.3)
+
+        moved = {**INFO, "ip": "192.168.1.21"}
+        self.subject.handle_datagram(broadcast(moved), ("192.168.1.21", 6667))
+        self.listener.assert_called_with("192.168.1.21", 3.3)
+
+    def test_tells_new_listener_of_known_device(self):
+        self.subject.handle_datagram(broadcast(INFO), ("192.168.1.20", 6667))
+        self.subject.register("some_dev_id", self.listener)
+        self.listener.assert_called_once_with("192.168.1.20", 3.3)
+
+    def test_unregistered_listener_is_not_called(self):
+        self.subject.register("some_dev_id", self.listener)
+        self.subject.unregister("some_dev_id")
+        self.subject.handle_datagram(broadcast(INFO), ("192.168.1.20", 6667))
+        self.listener.assert_not_called()
+
+    def test_ignores_undecodable_messages(self):
+        self.subject.handle_datagram(b"garbage", ("192.168.1.20", 6667))
+        self.subject.handle_datagram(
+            broadcast({"ip": "192.168.1.20"}), ("192.168.1.20", 6667)
+        )
+        self.assertEqual(self.subject.devices, {})
+
+    async def test_listens_on_discovery_ports(self):
+        loop = MagicMock()
+        loop.create_datagram_endpoint = MagicMock(
+            side_effect=[self._endpoint(), OSError("In use")]
+        )
+        self.assertTrue(await self.subject.async_start(loop))
+        ports = [
+            c.kwargs["local_addr"][1]
+            for c in loop.create_datagram_endpoint.call_args_list
+        ]
+        self.assertEqual(ports, [6666, 6667])
+
+        self.subject.stop()
+        self.transport.close.assert_called_once()
+
+    async def test_ports_that_cannot_be_bound_are_not_fatal(self):
+        loop = MagicMock()
+        loop.create_datagram_endpoint = MagicMock(
+            side_effect=PermissionError("Permission denied")
+        )
+        with self.assertLogs("custom_components.tuya_local.discovery", level="WARNING"):
+            self.assertFalse(await self.subject.async_start(loop))
+
+    async def test_shared_listener_is_stopped(self):
+        hass = MagicMock()
+        hass.data = {}
+        hass.loop.create_datagram_endpoint = MagicMock(
+            side_effect=[self._endpoint(), self._endpoint()]
+        )
+        discovery = await async_start_discovery(hass)
+        self.assertIs(await async_start_discovery(hass), discovery)
+
+        stop_discovery(hass)
+        self.assertNotIn(DATA_DISCOVERY, hass.data)
+        self.transport.close.assert_called_once()
+
+    async def _endpoint(self):
+        self.transport = MagicMock()
+        return self.transport, None
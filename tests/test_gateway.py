@@ -0,0 +1,194 @@
+"""Tests for sub-devices reached through a Tuya gateway."""
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from custom_components.tuya_local.const import (
+    CONF_CID,
+    CONF_DEVICE_ID,
+    CONF_GATEWAY_ID,
+    CONF_LOCAL_KEY,
+)
+from custom_components.tuya_local.gateway import (
+    DATA_GATEWAYS,
+    TuyaLocalGateway,
+    TuyaLocalSubDevice,
+    get_gateway,
+)
+from custom_components.tuya_local.protocol import TuyaProtocolError
+
+
+class TestGateway(IsolatedAsyncioTestCase):
+    def setUp(self):
+        connection_patcher = patch(
+            "custom_components.tuya_local.gateway.TuyaConnection"
+        )
+        self.addCleanup(connection_patcher.stop)
+        self.mock_connection_class = connection_patcher.start()
+        self.mock_connection = self.mock_connection_class.return_value
+        self.mock_connection.host = "some.ip.address"
+        self.mock_connection.async_status = AsyncMock(
+            side_effect=lambda cid: {"dps": {"1": cid}}
+        )
+        self.mock_connection.async_control = AsyncMock()
+
+        track_patcher = patch(
+            "custom_components.tuya_local.gateway.async_track_time_interval"
+        )
+        self.addCleanup(track_patcher.stop)
+        self.mock_track = track_patcher.start()
+
+        hass_patcher = patch("homeassistant.core.HomeAssistant")
+        self.addCleanup(hass_patcher.stop)
+        self.hass = hass_patcher.start()()
+        self.hass.data = {}
+        self.hass.async_create_task.side_effect = asyncio.ensure_future
+
+        self.on_close = MagicMock()
+        self.subject = TuyaLocalGateway(
+            self.hass,
+            "Gateway",
+            "gateway_id",
+            "some.ip.address",
+            "some_local_key",
+            on_close=self.on_close,
+        )
+        self.child1 = TuyaLocalSubDevice(
+            "Child 1", "child_1", self.subject, "node1", self.hass
+        )
+        self.child2 = TuyaLocalSubDevice(
+            "Child 2", "child_2", self.subject, "node2", self.hass
+        )
+
+    def test_shares_one_persistent_connection(self):
+        self.mock_connection_class.assert_called_once_with(
+            self.subject.codec,
+            "some.ip.address",
+            "Gateway",
+            True,
+            self.subject._handle_pushed_status,
+        )
+        self.assertIs(self.child1._codec, self.subject.codec)
+        self.assertTrue(self.child1.push_enabled)
+        self.assertEqual(
+            self.subject.children, {"node1": self.child1, "node2": self.child2}
+        )
+
+    async def test_status_is_queried_by_cid(self):
+        await self.child2.async_refresh()
+        self.mock_connection.async_status.assert_awaited_once_with("node2")
+        self.assertEqual(self.child2.get_property("1"), "node2")
+
+    async def test_commands_are_sent_by_cid(self):
+        await self.child1._async_send_properties({"1": True})
+        self.mock_connection.async_control.assert_awaited_once_with(
+            {"1": True}, "node1"
+        )
+
+    def test_pushed_status_is_routed_to_sub_device(self):
+        self.subject._handle_pushed_status({"2": 25}, "node1")
+        self.assertEqual(self.child1.get_property("2"), 25)
+        self.assertIsNone(self.child2.get_property("2"))
+
+    def test_pushed_status_for_unknown_sub_device_is_ignored(self):
+        self.subject._handle_pushed_status({"2": 25}, "unknown")
+        self.subject._handle_pushed_status({"2": 25}, None)
+        self.assertIsNone(self.child1.get_property("2"))
+
+    async def test_sub_devices_are_polled_together(self):
+        entity1 = MagicMock()
+        entity1.dps_ids = None
+        entity2 = MagicMock()
+        entity2.dps_ids = None
+        self.child1.register_entity(entity1)
+        self.child2.register_entity(entity2)
+        self.mock_track.assert_called_once()
+
+        await self.subject._async_poll_children()
+        self.assertEqual(self.mock_connection.async_status.await_count, 2)
+        self.assertEqual(self.child1.get_property("1"), "node1")
+        self.assertEqual(self.child2.get_property("1"), "node2")
+
+    def test_polling_stops_with_the_last_entity(self):
+        entity = MagicMock()
+        self.child1.register_entity(entity)
+        self.child2.register_entity(entity)
+        self.child1.unregister_entity(entity)
+        self.mock_track.return_value.assert_not_called()
+        self.child2.unregister_entity(entity)
+        self.mock_track.return_value.assert_called_once()
+
+    def test_closes_after_the_last_sub_device(self):
+        self.child1.close()
+        self.mock_connection.close.assert_not_called()
+        self.child2.close()
+        self.mock_connection.close.assert_called_once()
+        self.on_close.assert_called_once()
+
+    async def test_protocol_version_is_negotiated_with_the_gateway(self):
+        on_protocol_version = MagicMock()
+        self.subject._on_protocol_version = on_protocol_version
+
+        async def status(cid):
+            if self.subject.codec.version != 3.1:
+                raise TuyaProtocolError("Undecodable")
+            return {"dps": {"1": cid}}
+
+        self.mock_connection.async_status.side_effect = status
+        await self.child1.async_refresh()
+
+        self.assertEqual(self.child1.get_property("1"), "node1")
+        self.assertEqual(self.child2.protocol_version, 3.1)
+        on_protocol_version.assert_called_once_with(3.1)
+
+    def test_negotiated_protocol_version_is_only_rotated_on_protocol_errors(self):
+        gateway = TuyaLocalGateway(
+            self.hass,
+            "Gateway",
+            "gateway_id",
+            "some.ip.address",
+            "some_local_key",
+            protocol_version=3.1,
+        )
+        child = TuyaLocalSubDevice("Child", "child", gateway, "node", self.hass)
+        self.assertEqual(child.protocol_version, 3.1)
+        self.assertFalse(child._should_rotate_api_protocol_version(ConnectionError()))
+        self.assertTrue(
+            child._should_rotate_api_protocol_version(TuyaProtocolError("Bad"))
+        )
+
+    def test_protocol_version_is_rotated_once_for_concurrent_failures(self):
+        self.subject.rotate_protocol_version(3.3)
+        self.subject.rotate_protocol_version(3.3)
+        self.assertEqual(self.subject.codec.version, 3.1)
+
+    def test_get_gateway_saves_negotiated_protocol_version(self):
+        config = {
+            "host": "some.ip.address",
+            CONF_DEVICE_ID: "child_3",
+            CONF_LOCAL_KEY: "some_local_key",
+            CONF_GATEWAY_ID: "other_gateway",
+            CONF_CID: "node3",
+        }
+        with patch(
+            "custom_components.tuya_local.gateway._protocol_version_saver"
+        ) as mock_saver:
+            gateway = get_gateway(self.hass, config)
+        mock_saver.assert_called_once_with(self.hass, "other_gateway")
+        gateway.update_from_discovery("some.ip.address", 3.1)
+        mock_saver.return_value.assert_called_once_with(3.1)
+        gateway.close()
+
+    def test_get_gateway_shares_gateways(self):
+        config = {
+            "host": "some.ip.address",
+            CONF_DEVICE_ID: "child_3",
+            CONF_LOCAL_KEY: "some_local_key",
+            CONF_GATEWAY_ID: "other_gateway",
+            CONF_CID: "node3",
+        }
+        gateway = get_gateway(self.hass, config)
+        self.assertIs(get_gateway(self.hass, config), gateway)
+        self.assertIs(self.hass.data[DATA_GATEWAYS]["other_gateway"], gateway)
+        gateway.close()
+        self.assertNotIn("other_gateway", self.hass.data[DATA_GATEWAYS])
@@ -0,0 +1,25 @@
+"""Check that the load test still runs."""
+import os
+
+import pytest
+
+from .loadtest import async_load_test
+
+
+@pytest.mark.skipif(
+    not os.environ.get("TUYA_LOCAL_LOADTEST"),
+    reason="set TUYA_LOCAL_LOADTEST to run the load test",
+)
+@pytest.mark.usefixtures("enable_custom_integrations", "socket_enabled")
+async def test_report(hass):
+    report = await async_load_test(hass, devices=3, duration=1, burst_interval=1)
+    assert report["devices"] == 3
+    assert report["bursts"] == 1
+    assert report["commands"]["received"] == 3
+    assert report["commands"]["lost"] == 0
+    assert report["failures"] == 0
+    assert report["memory_per_device_kb"] > 0
+    for key in ("mean", "p50", "p95", "p99", "max"):
+        assert key in report["commands"]["latency_ms"]
+        assert key in report["event_loop_lag_ms"]
+    assert report["executor"]["peak_threads"] > 0
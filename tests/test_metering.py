@@ -0,0 +1,57 @@
+"""Tests for the aggregation of metering readings."""
+from datetime import timedelta
+from unittest import TestCase
+
+from custom_components.tuya_local.metering import DpsMeter
+
+WINDOW = timedelta(seconds=30)
+MAX_GAP = timedelta(minutes=1)
+
+
+class TestDpsMeter(TestCase):
+    def test_summarises_complete_windows(self):
+        subject = DpsMeter(WINDOW, MAX_GAP)
+        self.assertFalse(subject.add(10, 0))
+        self.assertFalse(subject.add(30, 10))
+        self.assertFalse(subject.add(20, 20))
+        self.assertIsNone(subject.summary)
+
+        self.assertTrue(subject.add(40, 30))
+        self.assertEqual(subject.summary, {"min": 10, "mean": 25, "max": 40})
+
+        # The next window starts afresh
+        self.assertFalse(subject.add(5, 40))
+        self.assertTrue(subject.add(7, 60))
+        self.assertEqual(subject.summary, {"min": 5, "mean": 6, "max": 7})
+
+    def test_only_integrates_power(self):
+        subject = DpsMeter(WINDOW, MAX_GAP)
+        subject.add(100, 0)
+        subject.add(100, 3600)
+        self.assertEqual(subject.energy, 0)
+        self.assertFalse(subject.integrates)
+
+    def test_integrates_power_into_energy(self):
+        subject = DpsMeter(WINDOW, MAX_GAP, integrate=True)
+        self.assertTrue(subject.integrates)
+        subject.add(1000, 0)
+        subject.add(2000, 36)
+        subject.add(2000, 72)
+        # 1500W for 36s, then 2000W for 36s
+        self.assertAlmostEqual(subject.energy, 35)
+
+    def test_does_not_integrate_across_gaps(self):
+        subject = DpsMeter(WINDOW, MAX_GAP, integrate=True)
+        subject.add(1000, 0)
+        subject.add(1000, 3600)
+        self.assertEqual(subject.energy, 0)
+        subject.add(1000, 3636)
+        self.assertAlmostEqual(subject.energy, 10)
+
+    def test_ignores_missing_readings(self):
+        subject = DpsMeter(WINDOW, MAX_GAP, integrate=True)
+        self.assertFalse(subject.add(None, 0))
+        self.assertFalse(subject.add(True, 10))
+        subject.add(10, 20)
+        self.assertTrue(subject.add(20, 50))
+        self.assertEqual(subject.summary, {"min": 10, "mean": 15, "max": 20})
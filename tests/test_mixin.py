@@ -0,0 +1,30 @@
+"""Tests for the entity mixins."""
+from unittest import TestCase
+from unittest.mock import MagicMock, PropertyMock
+
+from custom_components.tuya_local.generic.switch import TuyaLocalSwitch
+from custom_components.tuya_local.helpers.device_config import get_config
+
+
+class TestMemoizedProperties(TestCase):
+    def setUp(self):
+        self.dps = {"1": True}
+        self.version = 1
+        self.device = MagicMock()
+        self.device.get_property.side_effect = lambda id: self.dps.get(id)
+        type(self.device).state_version = PropertyMock(side_effect=lambda: self.version)
+        self.subject = TuyaLocalSwitch(
+            self.device, get_config("kogan_switch").primary_entity
+        )
+
+    def test_property_is_computed_once_per_state_version(self):
+        self.assertTrue(self.subject.is_on)
+        calls = self.device.get_property.call_count
+        self.assertTrue(self.subject.is_on)
+        self.assertEqual(self.device.get_property.call_count, calls)
+
+    def test_property_is_recomputed_when_state_changes(self):
+        self.assertTrue(self.subject.is_on)
+        self.dps["1"] = False
+        self.version = 2
+        self.assertFalse(self.subject.is_on)
@@ -0,0 +1,132 @@
+"""Tests for the Tuya local protocol encoding."""
+import json
+import struct
+from base64 import b64encode
+from unittest import TestCase
+
+from custom_components.tuya_local.protocol import (
+    CONTROL,
+    CONTROL_NEW,
+    DP_QUERY,
+    HEADER_SIZE,
+    PROTOCOL_33_HEADER,
+    UPDATEDPS,
+    TuyaCodec,
+    TuyaProtocolError,
+    pack_message,
+    parse_header,
+    unpack_message,
+)
+
+LOCAL_KEY = "0123456789abcdef"
+
+
+class TestMessageFraming(TestCase):
+    def test_pack_and_unpack_round_trip(self):
+        message = pack_message(5, CONTROL, struct.pack(">I", 0) + b"payload")
+        self.assertEqual(parse_header(message[:HEADER_SIZE]), (5, CONTROL, 19))
+        msg = unpack_message(message)
+        self.assertEqual(msg.seqno, 5)
+        self.assertEqual(msg.cmd, CONTROL)
+        self.assertEqual(msg.retcode, 0)
+        self.assertEqual(msg.payload, b"payload")
+
+    def test_unpack_without_retcode(self):
+        msg = unpack_message(pack_message(1, DP_QUERY, b"3.3\x00payload"))
+        self.assertEqual(msg.payload, b"3.3\x00payload")
+
+    def test_bad_prefix_is_rejected(self):
+        with self.assertRaises(TuyaProtocolError):
+            parse_header(b"\x00" * HEADER_SIZE)
+
+    def test_crc_mismatch_is_rejected(self):
+        message = bytearray(pack_message(1, CONTROL, b"payload"))
+        message[HEADER_SIZE] ^= 0xFF
+        with self.assertRaises(TuyaProtocolError):
+            unpack_message(bytes(message))
+
+
+class TestTuyaCodec(TestCase):
+    def setUp(self):
+        self.subject = TuyaCodec("devid", LOCAL_KEY)
+
+    def request_json(self, message, skip=0):
+        payload = unpack_message(message).payload[skip:]
+        return json.loads(self.subject.decrypt(payload))
+
+    def test_encode_33_control(self):
+        cmd, message = self.subject.encode(CONTROL, {"1": True})
+        self.assertEqual(cmd, CONTROL)
+        self.assertTrue(unpack_message(message).payload.startswith(PROTOCOL_33_HEADER))
+        request = self.request_json(message, len(PROTOCOL_33_HEADER))
+        self.assertEqual(request["devId"], "devid")
+        self.assertEqual(request["dps"], {"1": True})
+
+    def test_encode_33_status_query_has_no_version_header(self):
+        _, message = self.subject.encode(DP_QUERY)
+        self.assertEqual(
+            set(self.request_json(message).keys()), {"gwId", "devId", "uid", "t"}
+        )
+
+    def test_encode_for_sub_device(self):
+        _, message = self.subject.encode(CONTROL, {"1": True}, cid="node")
+        request = self.request_json(message, len(PROTOCOL_33_HEADER))
+        self.assertEqual(request["cid"], "node")
+        self.assertEqual(request["dps"], {"1": True})
+
+    def test_encode_updatedps(self):
+        cmd, message = self.subject.encode(UPDATEDPS, [18, 19])
+        self.assertEqual(cmd, UPDATEDPS)
+        self.assertEqual(self.request_json(message), {"dpId": [18, 19]})
+
+    def test_sequence_numbers_increase(self):
+        _, first = self.subject.encode(DP_QUERY)
+        _, second = self.subject.encode(DP_QUERY)
+        self.assertEqual(unpack_message(second).seqno, unpack_message(first).seqno + 1)
+
+    def test_encode_31_control_is_signed(self):
+        self.subject.version = 3.1
+        _, message = self.subject.encode(CONTROL, {"1": True})
+        payload = unpack_message(message).payload
+        self.assertTrue(payload.startswith(b"3.1"))
+        self.assertEqual(self.subject.decode(payload)["dps"], {"1": True})
+
+    def test_encode_31_status_query_is_plain_json(self):
+        self.subject.version = 3.1
+        _, message = self.subject.encode(DP_QUERY)
+        payload = unpack_message(message).payload
+        self.assertEqual(json.loads(payload)["devId"], "devid")
+
+    def test_decode_33(self):
+        payload = self.subject.encrypt(b'{"dps":{"1":true}}')
+        self.assertEqual(self.subject.decode(payload), {"dps": {"1": True}})
+        self.assertEqual(
+            self.subject.decode(PROTOCOL_33_HEADER + payload), {"dps": {"1": True}}
+        )
+
+    def test_decode_31_plain_json(self):
+        self.subject.version = 3.1
+        self.assertEqual(self.subject.decode(b'{"dps":{"1":1}}'), {"dps": {"1": 1}})
+
+    def test_decode_31_encrypted(self):
+        payload = b64encode(self.subject.encrypt(b'{"dps":{"1":1}}'))
+        self.assertEqual(
+            self.subject.decode(b"3.1" + b"0" * 16 + payload), {"dps": {"1": 1}}
+        )
+
+    def test_decode_empty_payload(self):
+        self.assertIsNone(self.subject.decode(b""))
+
+    def test_decode_with_wrong_key_fails(self):
+        payload = TuyaCodec("devid", "fedcba9876543210").encrypt(b'{"dps":{}}')
+        with self.assertRaises(TuyaProtocolError):
+            self.subject.decode(payload)
+
+    def test_data_unvalid_switches_to_device22(self):
+        self.assertIsNone(self.subject.decode(self.subject.encrypt(b"data unvalid")))
+        self.assertEqual(self.subject.dev_type, "device22")
+
+        cmd, message = self.subject.encode(DP_QUERY)
+        self.assertEqual(cmd, CONTROL_NEW)
+        request = self.request_json(message, len(PROTOCOL_33_HEADER))
+        self.assertEqual(request["dps"], {"1": None})
@@ -0,0 +1,92 @@
+"""Tests for the adaptive poll scheduler."""
+from datetime import timedelta
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from custom_components.tuya_local.scheduler import PollScheduler
+
+from .helpers import close_coroutine
+
+
+class TestPollScheduler(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.hass = MagicMock()
+        self.hass.async_create_task.side_effect = close_coroutine
+        self.poll = AsyncMock(return_value=False)
+        self.subject = PollScheduler(
+            self.hass,
+            "test",
+            self.poll,
+            timedelta(seconds=5),
+            timedelta(seconds=60),
+        )
+
+    def test_initial_interval_is_scan_interval(self):
+        self.assertEqual(self.subject.interval, 30)
+
+    def test_initial_interval_is_limited_by_range(self):
+        subject = PollScheduler(
+            self.hass, "test", self.poll, timedelta(minutes=1), timedelta(minutes=5)
+        )
+        self.assertEqual(subject.interval, 60)
+
+    def test_max_interval_is_at_least_min_interval(self):
+        subject = PollScheduler(
+            self.hass, "test", self.poll, timedelta(seconds=90), timedelta(seconds=60)
+        )
+        subject.record(False)
+        self.assertEqual(subject.interval, 90)
+
+    def test_interval_shortens_while_changing(self):
+        self.subject.record(True)
+        self.assertEqual(self.subject.interval, 15)
+        for _ in range(5):
+            self.subject.record(True)
+        self.assertEqual(self.subject.interval, 5)
+
+    def test_interval_lengthens_while_idle(self):
+        self.subject.record(False)
+        self.assertEqual(self.subject.interval, 45)
+        for _ in range(5):
+            self.subject.record(False)
+        self.assertEqual(self.subject.interval, 60)
+
+    def test_start_is_jittered_within_min_interval(self):
+        with patch(
+            "custom_components.tuya_local.scheduler.uniform", return_value=3.5
+        ) as mock_uniform:
+            self.subject.start()
+            self.subject.start()
+        mock_uniform.assert_called_once_with(0, 5)
+        self.hass.loop.call_later.assert_called_once_with(3.5, self.subject._run)
+        self.assertTrue(self.subject.running)
+
+    def test_stop_cancels_scheduled_poll(self):
+        self.subject.start()
+        self.subject.stop()
+        self.hass.loop.call_later.return_value.cancel.assert_called_once()
+        self.assertFalse(self.subject.running)
+
+    async def test_poll_reschedules_with_adapted_interval(self):
+        self.poll.return_value = True
+        with patch(
+            "custom_components.tuya_local.scheduler.uniform", return_value=0.1
+        ) as mock_uniform:
+            await self.subject._async_run()
+        self.poll.assert_awaited_once()
+        mock_uniform.assert_called_once_with(-0.1, 0.1)
+        self.hass.loop.call_later.assert_called_once_with(16.5, self.subject._run)
+
+    async def test_failed_poll_is_rescheduled(self):
+        self.poll.side_effect = ConnectionError()
+        await self.subject._async_run()
+        self.hass.loop.call_later.assert_called_once()
+        self.assertEqual(self.subject.interval, 45)
+
+    def test_run_creates_poll_task(self):
+        self.subject.start()
+        self.subject._run()
+        self.hass.async_create_task.assert_called_once()
+        self.assertTrue(self.subject.running)
+        self.subject.stop()
+        self.hass.async_create_task.return_value.cancel.assert_called_once()
@@ -1,16 +1,41 @@
 """Tests for the sensor entity."""
+from datetime import timedelta
+
+from homeassistant.components.sensor import SensorDeviceClass
+from homeassistant.helpers.entity import EntityCategory
 from pytest_homeassistant_custom_component.common import MockConfigEntry
-from unittest.mock import AsyncMock, Mock
+from unittest.mock import AsyncMock, MagicMock, Mock
 
 from custom_components.tuya_local.const import (
     CONF_DEVICE_ID,
+    CONF_DIAGNOSTICS,
     CONF_TYPE,
     DOMAIN,
 )
-from custom_components.tuya_local.generic.sensor import TuyaLocalSensor
+from custom_components.tuya_local.generic.sensor import (
+    TuyaLocalDiagnosticSensor,
+    TuyaLocalEnergySensor,
+    TuyaLocalSensor,
+)
+from custom_components.tuya_local.helpers.device_config import get_config
+from custom_components.tuya_local.metering import DpsMeter
 from custom_components.tuya_local.sensor import async_setup_entry
 
 
+def metered_device(summary=None, energy=0):
+    """Return a mock device with a power meter."""
+    meter = DpsMeter(timedelta(seconds=30), timedelta(minutes=1), integrate=True)
+    meter.summary = summary
+    meter.energy = energy
+    device = MagicMock()
+    device.name = "Test"
+    device.unique_id = "dummy"
+    device.state_version = 1
+    device.get_property.return_value = 1234
+    device.meter.side_effect = lambda dps_id: meter if dps_id == "19" else None
+    return device
+
+
 async def test_init_entry(hass):
     """Test the initialisation."""
     entry = MockConfigEntry(
@@ -80,3 +105,87 @@ async def test_init_entry_fails_if_config_is_missing(hass):
     except ValueError:
         pass
     m_add_entities.assert_not_called()
+
+
+async def test_init_entry_adds_diagnostic_sensors(hass):
+    """Test diagnostic sensors are added when enabled."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            CONF_TYPE: "mirabella_genio_usb",
+            CONF_DEVICE_ID: "dummy",
+            CONF_DIAGNOSTICS: True,
+        },
+    )
+    m_add_entities = Mock()
+    m_device = AsyncMock()
+    m_device.name = "Test"
+    m_device.unique_id = "dummy"
+    m_device.stats = {
+        "polls": {"mean": 0.1234},
+        "commands": {"mean": None},
+        "retries": 3,
+        "protocol_version": 3.3,
+    }
+
+    hass.data[DOMAIN] = {
+        "dummy": {"device": m_device},
+    }
+
+    await async_setup_entry(hass, entry, m_add_entities)
+    sensors = {s.unique_id: s for s in hass.data[DOMAIN]["dummy"][CONF_DIAGNOSTICS]}
+    assert all(type(s) == TuyaLocalDiagnosticSensor for s in sensors.values())
+    assert sensors["dummy_poll_latency"].native_value == 123
+    assert sensors["dummy_command_latency"].native_value is None
+    assert sensors["dummy_retries"].native_value == 3
+    assert sensors["dummy_protocol_version"].native_value == 3.3
+    assert sensors["dummy_retries"].entity_category == EntityCategory.DIAGNOSTIC
+    m_add_entities.assert_called_once()
+
+
+async def test_init_entry_adds_energy_sensor_for_metered_power(hass):
+    """Test an energy sensor is added for power sensors that are metered."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            CONF_TYPE: "smartplugv2_energy",
+            CONF_DEVICE_ID: "dummy",
+            "sensor_power": True,
+            "sensor_voltage": True,
+        },
+    )
+    m_add_entities = Mock()
+    hass.data[DOMAIN] = {
+        "dummy": {"device": metered_device()},
+    }
+
+    await async_setup_entry(hass, entry, m_add_entities)
+    sensors = m_add_entities.call_args[0][0]
+    assert [type(s) for s in sensors] == [
+        TuyaLocalSensor,
+        TuyaLocalEnergySensor,
+        TuyaLocalSensor,
+    ]
+
+
+def test_metered_sensor_summarises_readings():
+    """Test the readings over the last window are included as attributes."""
+    cfg = get_config("smartplugv2_energy")
+    power = next(e for e in cfg.secondary_entities() if e.device_class == "power")
+    device = metered_device(summary={"min": 1000, "mean": 1500, "max": 2000})
+    subject = TuyaLocalSensor(device, power)
+    assert subject.native_value == 123.4
+    assert subject.extra_state_attributes == {"min": 100, "mean": 150, "max": 200}
+
+
+def test_energy_sensor_reports_kwh():
+    """Test the integrated power is reported as energy in kWh."""
+    cfg = get_config("smartplugv2_energy")
+    power = next(e for e in cfg.secondary_entities() if e.device_class == "power")
+    # Power is reported in tenths of W, so this is 1.5kWh
+    subject = TuyaLocalEnergySensor(metered_device(energy=15000), power)
+    assert subject.native_value == 1.5
+    assert subject.native_unit_of_measurement == "kWh"
+    assert subject.device_class == SensorDeviceClass.ENERGY
+    assert subject.unique_id == f"{power.unique_id('dummy')}_energy"
+    assert subject.extra_state_attributes == {}
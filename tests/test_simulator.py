@@ -0,0 +1,128 @@
+"""Tests of the connection to devices, against simulated devices."""
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from custom_components.tuya_local.connection import TuyaConnection
+from custom_components.tuya_local.device import TuyaLocalDevice
+from custom_components.tuya_local.protocol import TuyaCodec
+
+from .simulator import LOCAL_KEY, SimulatedDevice
+
+
+async def _async_close(subject):
+    # Closing cancels tasks, so needs the event loop.
+    subject.close()
+
+
+@pytest.mark.usefixtures("socket_enabled")
+class TestSimulator(IsolatedAsyncioTestCase):
+    async def start(self, version=3.3, **kwargs):
+        self.simulator = SimulatedDevice(
+            "smartplugv2_energy.yaml", "plug_id", version=version, seed=1, **kwargs
+        )
+        await self.simulator.async_start()
+        self.addAsyncCleanup(self.simulator.async_close)
+
+    def connect(self, version=3.3, persist=False, on_status=None):
+        codec = TuyaCodec("plug_id", LOCAL_KEY, version)
+        connection = TuyaConnection(codec, "127.0.0.1", "Plug", persist, on_status)
+        connection.port = self.simulator.port
+        self.addAsyncCleanup(_async_close, connection)
+        return connection
+
+    def test_dps_derived_from_config(self):
+        dps = SimulatedDevice("smartplugv2_energy.yaml").dps
+        self.assertIs(dps["1"], False)
+        self.assertEqual(dps["9"], 43200)
+        self.assertEqual(dps["38"], "on")
+        self.assertEqual(dps["41"], "")
+
+    async def test_status(self):
+        for version in (3.1, 3.3):
+            with self.subTest(version=version):
+                await self.start(version)
+                result = await self.connect(version).async_status()
+                self.assertEqual(result["dps"], self.simulator.dps)
+
+    async def test_control(self):
+        for version in (3.1, 3.3):
+            with self.subTest(version=version):
+                await self.start(version)
+                on_status = MagicMock()
+                connection = self.connect(version, True, on_status)
+                await connection.async_control({"1": True})
+                self.assertIs(self.simulator.dps["1"], True)
+                await asyncio.sleep(0.1)
+                on_status.assert_called_once_with({"1": True}, None)
+
+    async def test_update_dps(self):
+        await self.start()
+        result = await self.connect().async_update_dps(["19", "20"])
+        self.assertEqual(result["dps"], {"19": 0, "20": 0})
+
+    async def test_pushes_changes(self):
+        await self.start()
+        on_status = MagicMock()
+        connection = self.connect(persist=True, on_status=on_status)
+        await connection.async_heartbeat()
+        changed = self.simulator.vary()
+        self.assertEqual(set(changed), {"17", "18", "19", "20"})
+        self.simulator.push(changed)
+        await asyncio.sleep(0.1)
+        on_status.assert_called_once_with(changed, None)
+
+    async def test_latency(self):
+        await self.start(latency=0.2)
+        start = asyncio.get_running_loop().time()
+        await self.connect().async_status()
+        self.assertGreaterEqual(asyncio.get_running_loop().time() - start, 0.2)
+
+    @patch("custom_components.tuya_local.connection.RESPONSE_TIMEOUT", 0.1)
+    async def test_lost_requests(self):
+        await self.start(loss=1)
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.connect().async_status()
+        self.assertEqual(self.simulator.stats["lost"], 1)
+
+    async def test_connection_limit(self):
+        await self.start(max_connections=1)
+        await self.connect(persist=True).async_heartbeat()
+        with self.assertRaises(ConnectionError):
+            await self.connect().async_status()
+        self.assertEqual(self.simulator.stats["rejected"], 1)
+
+    async def test_wrong_protocol_version_closes_connection(self):
+        await self.start(3.1)
+        with self.assertRaises(ConnectionError):
+            await self.connect(3.3).async_status()
+
+
+@pytest.mark.usefixtures("socket_enabled")
+class TestDeviceWithSimulator(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.simulator = SimulatedDevice(
+            "smartplugv2_energy.yaml", "plug_id", version=3.1
+        )
+        await self.simulator.async_start()
+        self.addAsyncCleanup(self.simulator.async_close)
+
+        hass_patcher = patch("homeassistant.core.HomeAssistant")
+        self.addCleanup(hass_patcher.stop)
+        self.subject = TuyaLocalDevice(
+            "Plug", "plug_id", "127.0.0.1", LOCAL_KEY, hass_patcher.start()()
+        )
+        self.subject._connection.port = self.simulator.port
+        self.addAsyncCleanup(_async_close, self.subject)
+
+    async def test_negotiates_protocol_version(self):
+        await self.subject.async_refresh_now()
+        self.assertEqual(self.subject.protocol_version, 3.1)
+        self.assertEqual(self.subject.get_property("9"), 43200)
+
+    async def test_sends_commands(self):
+        await self.subject.async_refresh_now()
+        self.assertTrue(await self.subject._async_send_properties({"1": True}))
+        self.assertIs(self.simulator.dps["1"], True)
@@ -0,0 +1,37 @@
+"""Tests for the device statistics."""
+from unittest import TestCase
+
+from custom_components.tuya_local.stats import DeviceStats, LatencyHistogram
+
+
+class TestLatencyHistogram(TestCase):
+    def test_empty(self):
+        subject = LatencyHistogram()
+        self.assertEqual(subject.count, 0)
+        self.assertIsNone(subject.mean)
+
+    def test_records_latencies_in_buckets(self):
+        subject = LatencyHistogram((0.1, 1, float("inf")))
+        for latency in (0.05, 0.1, 0.5, 3):
+            subject.record(latency)
+        self.assertEqual(
+            subject.as_dict(),
+            {
+                "count": 4,
+                "mean": 0.9125,
+                "max": 3,
+                "buckets": {"0.1": 2, "1": 1, "inf": 1},
+            },
+        )
+
+
+class TestDeviceStats(TestCase):
+    def test_as_dict(self):
+        subject = DeviceStats()
+        subject.polls.record(0.2)
+        subject.retries += 1
+        result = subject.as_dict()
+        self.assertEqual(result["polls"]["count"], 1)
+        self.assertEqual(result["commands"]["count"], 0)
+        self.assertEqual(result["retries"], 1)
+        self.assertEqual(result["failures"], 0)
@@ -1,9 +1,11 @@
 """Tests for the switch entity."""
+from homeassistant.const import CONF_HOST, STATE_OFF, STATE_ON
 from pytest_homeassistant_custom_component.common import MockConfigEntry
-from unittest.mock import AsyncMock, Mock
+from unittest.mock import AsyncMock, Mock, patch
 
 from custom_components.tuya_local.const import (
     CONF_DEVICE_ID,
+    CONF_LOCAL_KEY,
     CONF_SWITCH,
     CONF_TYPE,
     DOMAIN,
@@ -98,3 +100,39 @@ async def test_init_entry_fails_if_config_is_missing(hass):
     except ValueError:
         pass
     m_add_entities.assert_not_called()
+
+
+@patch("custom_components.tuya_local.async_start_discovery", AsyncMock())
+@patch("custom_components.tuya_local.device.TuyaConnection")
+async def test_state_is_written_after_turn_on(
+    mock_connection, hass, enable_custom_integrations
+):
+    """Test that the new state is shown as soon as a service call returns."""
+    connection = mock_connection.return_value
+    connection.persistent = False
+    connection.async_status = AsyncMock(return_value={"dps": {"1": False}})
+    connection.async_control = AsyncMock()
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        version=7,
+        title="test",
+        data={
+            CONF_DEVICE_ID: "deviceid",
+            CONF_HOST: "hostname",
+            CONF_LOCAL_KEY: "localkey",
+            CONF_TYPE: "smartplugv1",
+        },
+        options={CONF_SWITCH: True},
+    )
+    entry.add_to_hass(hass)
+    await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    await hass.data[DOMAIN]["deviceid"]["device"]._async_scheduled_poll()
+    assert hass.states.get("switch.test").state == STATE_OFF
+
+    await hass.services.async_call(
+        "switch", "turn_on", {"entity_id": "switch.test"}, blocking=True
+    )
+    assert hass.states.get("switch.test").state == STATE_ON
+
+    await hass.config_entries.async_unload(entry.entry_id)